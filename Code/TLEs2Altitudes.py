@@ -1,15 +1,42 @@
 import ephem
 import datetime
 import csv
+import argparse
+import hashlib
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
 from pathlib import Path
-import matplotlib.dates
+import numpy as np
 from tqdm import tqdm
+from tle_index import get_closest_tle, get_tle_index
+from propagation import group_rows, propagate_altitudes
 
 # Define constants
 G = 6.67408 * 10**-11  # Gravitational constant in m^3 kg^-1 s^-2
 M = 5.972 * 10**24    # Mass of the Earth in kg
 Re = 6.371 * 10**6    # Radius of the Earth in m
 
+# Input and output files
+input_file = "../Data/NewCDMsSet.csv"
+output_file = "../Data/output.csv"
+# Altitudes of earlier runs keyed on CDM, TLE version and propagation method, for --incremental
+cache_file = "../Data/altitude_cache.csv"
+SAT_FIELDS = ["SAT1_OBJECT_DESIGNATOR", "SAT2_OBJECT_DESIGNATOR"]
+ALTITUDE_FIELDS = ["SAT1_ALTITUDE_TCA", "SAT2_ALTITUDE_TCA"]
+TLE_FIELDS = ["SAT1_TLE", "SAT2_TLE"]
+CACHE_FIELDS = ["KEY", "METHOD"] + TLE_FIELDS + ALTITUDE_FIELDS
+
+# Propagation behind a cached altitude; batch (SGP4) and ephem altitudes differ by hundreds of metres
+METHODS = {True: "batch", False: "ephem"}
+
+# Rows propagated together in batch mode, and rows per task in parallel mode
+CHUNK_SIZE = 50000
+
+# Largest acceptable difference (m) between batch and ephem altitudes in --check
+CHECK_TOLERANCE = 1000.0
+
 # Helper functions
 def dms(degrees):
     return float(degrees)
@@ -24,80 +51,289 @@ def compute_altitude(tle_rec, timestamp):
     tle_rec.compute(subsatellitepoint)
     return tle_rec.range
 
-def nearest(items, pivot):
-    """Find the item in `items` closest to `pivot`."""
-    return min(items, key=lambda x: abs(x - pivot))
+def parse_tca(row):
+    return datetime.datetime.strptime(row["TCA"], "%Y-%m-%d %H:%M:%S.%f")
 
-# Create output directory if it does not exist
-Path("../Data/").mkdir(parents=True, exist_ok=True)
+def ephem_altitude(satcat, tca):
+    """Altitude (m) of `satcat` at `tca` from its closest TLE using ephem, or "N/A"."""
+    try:
+        line1, line2 = get_closest_tle(satcat, tca)
+        if line1 and line2:
+            return compute_altitude(ephem.readtle(satcat, line1, line2), tca)
+    except Exception:
+        pass
+    return "N/A"
 
-# Read the input file
-input_file = "../Data/NewCDMsSet.csv"
-output_file = "../Data/output.csv"
+def ephem_altitudes(rows):
+    """Per-row ephem altitudes for SAT1 and SAT2, as [(sat1_alt, sat2_alt), ...]."""
+    altitudes = []
+    for row in rows:
+        tca = parse_tca(row)
+        altitudes.append((ephem_altitude(row["SAT1_OBJECT_DESIGNATOR"], tca),
+                          ephem_altitude(row["SAT2_OBJECT_DESIGNATOR"], tca)))
+    return altitudes
+
+def parse_tcas(tcas):
+    """Parse an array of TCA strings into datetime64[us] in one pass."""
+    return np.array([tca.replace(" ", "T") for tca in tcas], dtype='datetime64[us]')
+
+def format_altitude(altitude):
+    return float(altitude) if np.isfinite(altitude) else "N/A"
+
+def nearest_tles(satcats, tcas):
+    """Closest TLE of satcats[i] to tcas[i], as (line1s, line2s) lists with None where there is none."""
+    line1s = [None] * len(satcats)
+    line2s = [None] * len(satcats)
+    for satcat, group in group_rows(satcats):
+        index = get_tle_index(str(satcat))
+        if not index:
+            continue
+        for i, nearest in zip(group, index.nearest_indices(tcas[group])):
+            line1s[i], line2s[i] = index.pair(nearest)
+    return line1s, line2s
+
+def satellite_altitudes(satcats, tcas):
+    """Altitudes (m) of satcats[i] at tcas[i] from each one's closest TLE; NaN where unavailable."""
+    line1s, line2s = nearest_tles(satcats, tcas)
+    return propagate_altitudes(line1s, line2s, tcas) * 1000
+
+def batch_altitudes(rows):
+    """SAT1 and SAT2 altitudes for a list of CDM rows, propagated in bulk per satellite and TLE."""
+    tcas = parse_tcas([row["TCA"] for row in rows])
+    columns = []
+    for sat_field in SAT_FIELDS:
+        alt = satellite_altitudes([row[sat_field] for row in rows], tcas)
+        columns.append([format_altitude(a) for a in alt])
+    return list(zip(*columns))
+
+def check_against_ephem(rows, tolerance=CHECK_TOLERANCE):
+    """Compare batch altitudes with the ephem ones for `rows` and report the largest difference."""
+    diffs = []
+    for batch, reference in zip(batch_altitudes(rows), ephem_altitudes(rows)):
+        for a, b in zip(batch, reference):
+            if a != "N/A" and b != "N/A":
+                diffs.append(abs(a - b))
+    if not diffs:
+        print("No rows with altitudes from both methods to compare.")
+        return True
+    worst = max(diffs)
+    print(f"Compared {len(diffs)} altitudes: max |batch - ephem| = {worst:.1f} m, "
+          f"mean = {sum(diffs) / len(diffs):.1f} m (tolerance {tolerance:.0f} m)")
+    return worst <= tolerance
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def row_key(row, fieldnames):
+    """Stable identifier of a CDM row: its CDM_ID, or a hash of its contents if it has none."""
+    if row.get("CDM_ID"):
+        return row["CDM_ID"]
+    return hashlib.sha1("\x1f".join(row[field] or "" for field in fieldnames).encode()).hexdigest()
+
+def tle_version(line1):
+    """Identify the TLE used for an altitude by its epoch and element set number."""
+    return f"{line1[18:32].strip()}/{line1[64:68].strip()}" if line1 else ""
+
+def load_cache():
+    """Altitude records of earlier runs, {key: record}; later records supersede earlier ones.
+
+    A cache written before records carried their METHOD is rewritten in the
+    current layout, with those records left to be recomputed.
+    """
+    cache = {}
+    try:
+        with open(cache_file, "r", newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                cache[record["KEY"]] = record
+            outdated = reader.fieldnames is not None and reader.fieldnames != CACHE_FIELDS
+    except FileNotFoundError:
+        return cache
+    if outdated:
+        compact_cache(cache, cache)
+    return cache
+
+def incremental_altitudes(rows, fieldnames, cache, batch, cache_writer):
+    """SAT1 and SAT2 altitudes for `rows`, reusing cached ones whose key, TLE versions and method still match.
+
+    Only new rows, rows whose closest TLE has changed since they were cached,
+    and rows cached by the other propagation method are computed; their records
+    are appended to the cache through `cache_writer`.
+    """
+    tcas = parse_tcas([row["TCA"] for row in rows])
+    keys = [row_key(row, fieldnames) for row in rows]
+    tles = [nearest_tles([row[sat_field] for row in rows], tcas) for sat_field in SAT_FIELDS]
+    versions = [[tle_version(line1) for line1 in line1s] for line1s, _ in tles]
+
+    method = METHODS[batch]
+    stale = []
+    for i, key in enumerate(keys):
+        record = cache.get(key)
+        if (record is None or record.get("METHOD") != method
+                or record["SAT1_TLE"] != versions[0][i] or record["SAT2_TLE"] != versions[1][i]):
+            stale.append(i)
+    if stale:
+        if batch:
+            columns = []
+            for line1s, line2s in tles:
+                alt = propagate_altitudes([line1s[i] for i in stale], [line2s[i] for i in stale], tcas[stale]) * 1000
+                columns.append([format_altitude(a) for a in alt])
+            altitudes = list(zip(*columns))
+        else:
+            altitudes = ephem_altitudes([rows[i] for i in stale])
+        for i, (sat1_alt, sat2_alt) in zip(stale, altitudes):
+            record = {"KEY": keys[i], "METHOD": method, "SAT1_TLE": versions[0][i], "SAT2_TLE": versions[1][i],
+                      "SAT1_ALTITUDE_TCA": str(sat1_alt), "SAT2_ALTITUDE_TCA": str(sat2_alt)}
+            cache[keys[i]] = record
+            cache_writer.writerow(record)
+    return [(cache[key]["SAT1_ALTITUDE_TCA"], cache[key]["SAT2_ALTITUDE_TCA"]) for key in keys]
+
+def compact_cache(cache, keys):
+    """Rewrite the cache with one record per key still in the input, dropping superseded ones."""
+    with open(cache_file + ".part", "w", newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CACHE_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for key in keys:
+            writer.writerow(cache[key])
+    os.replace(cache_file + ".part", cache_file)
+
+def main(batch=False, chunk_size=CHUNK_SIZE, incremental=False):
+    """Append altitudes to every CDM, one row at a time with ephem or in chunks with --batch.
+
+    With `incremental`, altitudes are reused from the cache of earlier runs and
+    new records are flushed to it after every chunk, so an interrupted run picks
+    up from its last checkpoint. The output is written beside output.csv and
+    only renamed into place once complete.
+    """
+    # Create output directory if it does not exist
+    Path("../Data/").mkdir(parents=True, exist_ok=True)
+
+    cache = load_cache() if incremental else None
+    seen = {}
+    cache_out = open(cache_file, "a", newline='', encoding='utf-8') if incremental else None
+    try:
+        if incremental:
+            cache_writer = csv.DictWriter(cache_out, fieldnames=CACHE_FIELDS)
+            if cache_out.tell() == 0:
+                cache_writer.writeheader()
+
+        with open(input_file, "r", encoding='utf-8-sig') as infile, open(output_file + ".part", "w", newline='', encoding='utf-8') as outfile:
+            reader = csv.DictReader(infile)
+            fieldnames = reader.fieldnames + ALTITUDE_FIELDS
+            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+            writer.writeheader()
+
+            altitude_fn = batch_altitudes if batch else ephem_altitudes
+            with tqdm(desc="Processing rows", unit="row") as progress:
+                for rows in chunks(reader, chunk_size if batch or incremental else 1):
+                    if incremental:
+                        altitudes = incremental_altitudes(rows, reader.fieldnames, cache, batch, cache_writer)
+                        # Checkpoint: everything computed so far survives a crash
+                        cache_out.flush()
+                        os.fsync(cache_out.fileno())
+                        seen.update(dict.fromkeys(row_key(row, reader.fieldnames) for row in rows))
+                    else:
+                        altitudes = altitude_fn(rows)
+                    for row, (sat1_alt, sat2_alt) in zip(rows, altitudes):
+                        # Append calculated altitudes to the row
+                        row["SAT1_ALTITUDE_TCA"] = sat1_alt
+                        row["SAT2_ALTITUDE_TCA"] = sat2_alt
+                        # Write updated row to output
+                        writer.writerow(row)
+                    progress.update(len(rows))
+        os.replace(output_file + ".part", output_file)
+    finally:
+        if cache_out is not None:
+            cache_out.close()
+
+    if incremental:
+        compact_cache(cache, seen)
+    print(f"Processed data written to {output_file}")
+
+def altitude_chunk(task):
+    """Worker: SAT1/SAT2 altitudes (m, NaN where unavailable) for one chunk of rows."""
+    rows, sat1s, sat2s, tcas, batch = task
+    if batch:
+        tcas = parse_tcas(tcas)
+        return rows, satellite_altitudes(sat1s, tcas), satellite_altitudes(sat2s, tcas)
+    alt1 = np.full(len(rows), np.nan)
+    alt2 = np.full(len(rows), np.nan)
+    for i, (sat1, sat2, tca) in enumerate(zip(sat1s, sat2s, tcas)):
+        tca = datetime.datetime.strptime(tca, "%Y-%m-%d %H:%M:%S.%f")
+        for alt, satcat in ((alt1, sat1), (alt2, sat2)):
+            value = ephem_altitude(satcat, tca)
+            if value != "N/A":
+                alt[i] = value
+    return rows, alt1, alt2
+
+def main_parallel(workers, batch=False, chunk_size=CHUNK_SIZE):
+    """Compute altitudes in a process pool and write them back in input order.
+
+    Rows are partitioned by SAT1 so each worker's TLE index cache stays warm
+    across the rows of a chunk; results are scattered back by row number, then
+    the input is streamed a second time to write the output in its original order.
+    """
+    Path("../Data/").mkdir(parents=True, exist_ok=True)
+
+    with open(input_file, "r", encoding='utf-8-sig') as infile:
+        sat1s, sat2s, tcas = [], [], []
+        for row in csv.DictReader(infile):
+            sat1s.append(row["SAT1_OBJECT_DESIGNATOR"])
+            sat2s.append(row["SAT2_OBJECT_DESIGNATOR"])
+            tcas.append(row["TCA"])
+    sat1s, sat2s, tcas = np.array(sat1s), np.array(sat2s), np.array(tcas)
+
+    order = np.argsort(sat1s, kind='stable')
+    tasks = [(rows, sat1s[rows], sat2s[rows], tcas[rows], batch)
+             for rows in (order[i:i + chunk_size] for i in range(0, len(order), chunk_size))]
+    alt1 = np.full(len(order), np.nan)
+    alt2 = np.full(len(order), np.nan)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(altitude_chunk, task) for task in tasks]
+        with tqdm(total=len(order), desc="Processing rows", unit="row") as progress:
+            for future in as_completed(futures):
+                rows, chunk_alt1, chunk_alt2 = future.result()
+                alt1[rows] = chunk_alt1
+                alt2[rows] = chunk_alt2
+                progress.update(len(rows))
+
+    with open(input_file, "r", encoding='utf-8-sig') as infile, open(output_file, "w", newline='', encoding='utf-8') as outfile:
+        reader = csv.DictReader(infile)
+        writer = csv.DictWriter(outfile, fieldnames=reader.fieldnames + ALTITUDE_FIELDS)
+        writer.writeheader()
+        for row, sat1_alt, sat2_alt in zip(reader, alt1, alt2):
+            row["SAT1_ALTITUDE_TCA"] = format_altitude(sat1_alt)
+            row["SAT2_ALTITUDE_TCA"] = format_altitude(sat2_alt)
+            writer.writerow(row)
+
+    print(f"Processed data written to {output_file}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append SAT1/SAT2 altitudes at TCA to the CDM set.")
+    parser.add_argument("--batch", action="store_true",
+                        help="propagate rows in bulk with vectorised SGP4 instead of one at a time with ephem")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows per batch in --batch mode and per task with --workers")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"worker processes; more than 1 enables parallel mode (this machine has {os.cpu_count()} cores)")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"reuse altitudes from {cache_file} and only compute new or changed rows, checkpointing every chunk")
+    parser.add_argument("--check", type=int, metavar="N",
+                        help="compare batch and ephem altitudes on N random rows and exit")
+    args = parser.parse_args()
 
-with open(input_file, "r", encoding='utf-8-sig') as infile, open(output_file, "w", newline='', encoding='utf-8') as outfile:
-    reader = csv.DictReader(infile)
-    fieldnames = reader.fieldnames + ["SAT1_ALTITUDE_TCA", "SAT2_ALTITUDE_TCA"]
-    writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-    writer.writeheader()
-
-
-    for row in tqdm(reader, desc="Processing rows", unit="row"):
-        sat1 = row["SAT1_OBJECT_DESIGNATOR"]
-        sat2 = row["SAT2_OBJECT_DESIGNATOR"]
-        tca = datetime.datetime.strptime(row["TCA"], "%Y-%m-%d %H:%M:%S.%f")
-
-        def get_closest_tle(satcat, tca):
-            """Get the TLE lines closest to the TCA for a given satellite."""
-            try:
-                with open(f'../Data/TLEs/{satcat}.txt', 'r') as tle_file:
-                    tle_lines = tle_file.readlines()
-                    epochs = []
-                    tle_pairs = []
-
-                    for i in range(0, len(tle_lines), 2):
-                        line1, line2 = tle_lines[i].strip(), tle_lines[i + 1].strip()
-                        year = int("20" + line1[18:20]) if int(line1[18:20]) < 57 else int("19" + line1[18:20])
-                        day_of_year = float(line1[20:32])
-                        epoch = datetime.datetime(year, 1, 1) + datetime.timedelta(days=day_of_year - 1)
-                        epochs.append(epoch)
-                        tle_pairs.append((line1, line2))
-
-                    closest_epoch = nearest(epochs, tca)
-                    closest_index = epochs.index(closest_epoch)
-                    return tle_pairs[closest_index]
-            except (FileNotFoundError, IndexError):
-                return None, None
-
-        try:
-            # Find TLE closest to TCA for SAT1
-            line1, line2 = get_closest_tle(sat1, tca)
-            if line1 and line2:
-                sat1_rec = ephem.readtle(sat1, line1, line2)
-                sat1_rec.compute(matplotlib.dates.num2date(matplotlib.dates.date2num(tca)))
-                sat1_alt = compute_altitude(sat1_rec, tca)
-            else:
-                sat1_alt = "N/A"
-        except Exception:
-            sat1_alt = "N/A"
-
-        try:
-            # Find TLE closest to TCA for SAT2
-            line1, line2 = get_closest_tle(sat2, tca)
-            if line1 and line2:
-                sat2_rec = ephem.readtle(sat2, line1, line2)
-                sat2_rec.compute(matplotlib.dates.num2date(matplotlib.dates.date2num(tca)))
-                sat2_alt = compute_altitude(sat2_rec, tca)
-            else:
-                sat2_alt = "N/A"
-        except Exception:
-            sat2_alt = "N/A"
-
-        # Append calculated altitudes to the row
-        row["SAT1_ALTITUDE_TCA"] = sat1_alt
-        row["SAT2_ALTITUDE_TCA"] = sat2_alt
-
-        # Write updated row to output
-        writer.writerow(row)
-
-print(f"Processed data written to {output_file}")
\ No newline at end of file
+    if args.check:
+        with open(input_file, "r", encoding='utf-8-sig') as infile:
+            sample = random.sample(list(csv.DictReader(infile)), args.check)
+        raise SystemExit(0 if check_against_ephem(sample) else 1)
+    if args.workers > 1 and args.incremental:
+        parser.error("--incremental runs in a single process; drop --workers")
+    if args.workers > 1:
+        main_parallel(args.workers, batch=args.batch, chunk_size=args.chunk_size)
+    else:
+        main(batch=args.batch, chunk_size=args.chunk_size, incremental=args.incremental)
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+ALTITUDE_COLUMNS = ['SAT1_ALTITUDE_TCA', 'SAT2_ALTITUDE_TCA']
+
+# CDM values aggregated per altitude shell; columns missing from the data are skipped
+VALUE_COLUMNS = ['COLLISION_PROBABILITY', 'MISS_DISTANCE']
+
+# Quantiles kept for every shell
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def altitude_bins(alt1, alt2, bin_width):
+    """Shell edges spanning every altitude, `bin_width` km apart, as plotting_histogram always used."""
+    return np.arange(min(np.nanmin(alt1), np.nanmin(alt2)), max(np.nanmax(alt1), np.nanmax(alt2)) + bin_width,
+                     bin_width)
+
+
+def group_quantiles(groups, values, n_groups, quantiles):
+    """Linear-interpolated quantiles of `values` per group: an array of shape (len(quantiles), n_groups)."""
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    result = np.full((len(quantiles), n_groups), np.nan)
+    has = counts > 0
+    for i, q in enumerate(quantiles):
+        position = q * (counts[has] - 1)
+        lo = np.floor(position).astype(int)
+        hi = np.ceil(position).astype(int)
+        low = values[starts[has] + lo]
+        result[i, has] = low + (values[starts[has] + hi] - low) * (position - lo)
+    return result
+
+
+class ShellCube:
+    """Year × altitude-shell aggregates of a CDM dataset for one set of shell edges.
+
+    Arrays have one row per year in `years` plus a last row for the whole study
+    period. `counts` follow np.histogram over both satellites' altitudes; the
+    per-value statistics count each CDM once per distinct shell either
+    satellite is in, with shells half-open [lo, hi).
+    """
+
+    def __init__(self, bins, years, slots, alt1, alt2, values, quantiles=QUANTILES):
+        self.bins = bins
+        self.years = years
+        self.quantiles = tuple(quantiles)
+        n_bins = len(bins) - 1
+        # Slots 0..Y-1 are years, Y holds CDMs without a TCA year, Y+1 is the whole period
+        total = len(years) + 1
+        n_slots = total + 1
+
+        counts = np.zeros((n_slots, n_bins), dtype=np.int64)
+        members = []
+        for alt in (alt1, alt2):
+            shell = np.searchsorted(bins, alt, side='right') - 1
+            # np.histogram closes the last shell on the right
+            histogram_shell = np.where(alt == bins[-1], n_bins - 1, shell)
+            ok = (histogram_shell >= 0) & (histogram_shell < n_bins)
+            counts[:total] += np.bincount(slots[ok] * n_bins + histogram_shell[ok],
+                                          minlength=total * n_bins).reshape(total, n_bins)
+            members.append(np.where((shell >= 0) & (shell < n_bins), shell, -1))
+        counts[total] = counts[:total].sum(axis=0)
+        self.counts = counts
+
+        # (slot, shell, CDM) memberships: a CDM with both satellites in one shell counts once
+        shell1, shell2 = members
+        rows = np.arange(len(shell1))
+        take1 = shell1 >= 0
+        take2 = (shell2 >= 0) & (shell2 != shell1)
+        cdms = np.concatenate([rows[take1], rows[take2]])
+        shells = np.concatenate([shell1[take1], shell2[take2]])
+        # Each membership goes once into its year's slot and once into the study period's
+        member_rows = np.concatenate([cdms, cdms])
+        member_groups = np.concatenate([slots[cdms] * n_bins + shells, total * n_bins + shells])
+
+        n_groups = n_slots * n_bins
+        self.rows = np.bincount(member_groups, minlength=n_groups).reshape(n_slots, n_bins)
+        self.n = {}
+        self.sums = {}
+        self.means = {}
+        self.quantile_values = {}
+        for name, value in values.items():
+            v = value[member_rows]
+            ok = ~np.isnan(v)
+            n = np.bincount(member_groups[ok], minlength=n_groups)
+            sums = np.bincount(member_groups[ok], weights=v[ok], minlength=n_groups)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums / n
+            self.n[name] = n.reshape(n_slots, n_bins)
+            self.sums[name] = sums.reshape(n_slots, n_bins)
+            self.means[name] = means.reshape(n_slots, n_bins)
+            self.quantile_values[name] = group_quantiles(member_groups[ok], v[ok], n_groups,
+                                                         self.quantiles).reshape(len(self.quantiles), n_slots, n_bins)
+
+    def _slot(self, year):
+        if year is None:
+            return -1
+        i = np.searchsorted(self.years, year)
+        return i if i < len(self.years) and self.years[i] == year else None
+
+    def _select(self, array, year, empty):
+        slot = self._slot(year)
+        return np.full(array.shape[-1], empty, dtype=array.dtype) if slot is None else array[..., slot, :]
+
+    def histogram(self, year=None):
+        """CDM altitude counts per shell in `year`, or over the study period for None."""
+        return self._select(self.counts, year, 0)
+
+    def shell_rows(self, year=None):
+        """Number of CDMs with either satellite in each shell."""
+        return self._select(self.rows, year, 0)
+
+    def mean(self, column, year=None, empty=np.nan):
+        """Mean of `column` over the CDMs in each shell; `empty` where a shell has none."""
+        means = self._select(self.means[column], year, empty)
+        return np.where(self.shell_rows(year) > 0, means, empty)
+
+    def quantile(self, column, q, year=None):
+        """Stored quantile `q` of `column` over the CDMs in each shell (NaN where there are none)."""
+        values = self.quantile_values[column][self.quantiles.index(q)]
+        return self._select(values, year, np.nan)
+
+
+class AltitudeCube:
+    """Assigns every CDM its altitudes, TCA year and values once; shells of any width come from there.
+
+    A ShellCube is computed on first use of each bin width and reused after.
+    """
+
+    def __init__(self, alt1, alt2, years, values):
+        self.alt1 = np.asarray(alt1, dtype=float)
+        self.alt2 = np.asarray(alt2, dtype=float)
+        years = np.asarray(years, dtype=float)
+        self.years = np.unique(years[~np.isnan(years)]).astype(int)
+        self.slots = np.where(np.isnan(years), len(self.years),
+                              np.searchsorted(self.years, np.nan_to_num(years, nan=0)))
+        self.values = {name: np.asarray(value, dtype=float) for name, value in values.items()}
+        self._shells = {}
+
+    @classmethod
+    def from_frame(cls, data):
+        """Build from a DataFrame with km altitudes, a 'Year' column and numeric value columns."""
+        return cls(data[ALTITUDE_COLUMNS[0]], data[ALTITUDE_COLUMNS[1]], data['Year'],
+                   {name: pd.to_numeric(data[name], errors='coerce') for name in VALUE_COLUMNS if name in data})
+
+    def shells(self, bin_width):
+        """The ShellCube for shells `bin_width` km wide (memoized)."""
+        if bin_width not in self._shells:
+            bins = altitude_bins(self.alt1, self.alt2, bin_width)
+            self._shells[bin_width] = ShellCube(bins, self.years, self.slots, self.alt1, self.alt2, self.values)
+        return self._shells[bin_width]
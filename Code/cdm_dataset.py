@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+CDM_FILE = "../Data/output.csv"
+DATASET_DIR = "../Data/cdm_dataset"  # Parquet files partitioned by TCA year: year=2021/...
+SATELLITE_FILE = "../Data/space_track_satellites_filtered.csv"
+SATELLITE_TABLE = "../Data/space_track_satellites_filtered.parquet"
+
+SOURCE_FILE = "_source.json"  # Stamp of the CSV a dataset directory was built from
+
+# Rows converted per chunk while building
+CHUNK_ROWS = 500000
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+# Typed CDM columns; any other column is kept as a string
+CDM_TYPES = {
+    'CDM_ID': pa.int64(),
+    'CREATION_DATE': pa.timestamp('us'),
+    'TCA': pa.timestamp('us'),
+    'SAT1_OBJECT_DESIGNATOR': pa.int32(),
+    'SAT2_OBJECT_DESIGNATOR': pa.int32(),
+    'SAT1_OBJECT_TYPE': CATEGORY,
+    'SAT2_OBJECT_TYPE': CATEGORY,
+    'COLLISION_PROBABILITY': pa.float64(),
+    'MIN_RNG': pa.float64(),
+    'MISS_DISTANCE': pa.float64(),
+    'SAT1_ALTITUDE_TCA': pa.float32(),  # m, as in output.csv
+    'SAT2_ALTITUDE_TCA': pa.float32(),
+}
+
+SATELLITE_TYPES = {
+    'NORAD_CAT_ID': pa.int32(),
+    'OBJECT_TYPE': CATEGORY,
+    'COUNTRY': CATEGORY,
+    'ALTITUDE': pa.float32(),
+    'DECAY': pa.timestamp('us'),
+    'LAUNCH': pa.timestamp('us'),
+}
+
+
+def source_stamp(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def stamp_path(built):
+    """Where the source stamp of a dataset directory or Parquet file lives."""
+    return os.path.join(built, SOURCE_FILE) if os.path.isdir(built) else built + ".json"
+
+
+def schema_for(columns, types):
+    return pa.schema([(name, types.get(name, pa.string())) for name in columns])
+
+
+def convert_chunk(chunk, types, coerced=None):
+    """Convert a chunk read as strings to the pandas dtypes matching `types`.
+
+    Integer columns (IDs and designators, which rows are joined on) must parse
+    in full: a malformed value raises ValueError. Any other malformed value is
+    left empty and counted per column in `coerced`.
+    """
+    for name in chunk.columns:
+        kind = types.get(name)
+        if kind is None:
+            continue
+        if kind == CATEGORY:
+            chunk[name] = chunk[name].astype('category')
+            continue
+        if pa.types.is_timestamp(kind):
+            values = pd.to_datetime(chunk[name], format=DATE_FORMAT if name in ('TCA', 'CREATION_DATE') else None,
+                                    errors='coerce')
+        else:
+            values = pd.to_numeric(chunk[name], errors='coerce')
+        # Blank fields are read as missing already; anything else that came out missing did not parse
+        bad = values.isna() & chunk[name].notna()
+        if pa.types.is_integer(kind):
+            whole = values.notna() & (values % 1 == 0)
+            bad |= values.notna() & ~whole
+            if bad.any():
+                row = bad.idxmax()
+                raise ValueError(f"Malformed {name} {chunk[name][row]!r} on data row {row + 1}")
+            values = values.astype('Int64')
+        elif bad.any() and coerced is not None:
+            coerced[name] = coerced.get(name, 0) + int(bad.sum())
+        chunk[name] = values
+    return chunk
+
+
+def read_typed(csv_file, types, chunk_rows=CHUNK_ROWS, coerced=None):
+    """Yield Arrow tables of a CSV converted chunk by chunk to `types` (see convert_chunk)."""
+    chunks = pd.read_csv(csv_file, dtype=str, keep_default_na=False, na_values=[''], chunksize=chunk_rows)
+    for chunk in chunks:
+        chunk = convert_chunk(chunk, types, coerced)
+        schema = schema_for(chunk.columns, types)
+        yield pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def report_coerced(csv_file, coerced):
+    if coerced:
+        counts = ", ".join(f"{name}: {count}" for name, count in sorted(coerced.items()))
+        print(f"Warning: unparseable values in {csv_file} were left empty ({counts})")
+
+
+def build_cdm_dataset(csv_file=CDM_FILE, dataset_dir=DATASET_DIR, chunk_rows=CHUNK_ROWS):
+    """Convert the enriched CDM CSV into a typed Parquet dataset partitioned by TCA year."""
+    tmp_dir = dataset_dir + ".part"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    stamp = source_stamp(csv_file)
+    schema = None
+    coerced = {}
+    for i, table in enumerate(read_typed(csv_file, CDM_TYPES, chunk_rows, coerced)):
+        table = table.append_column('year', pc.year(table['TCA']).cast(pa.int16()))
+        schema = schema or table.schema
+        ds.write_dataset(table.cast(schema), tmp_dir, format='parquet', partitioning=['year'],
+                         partitioning_flavor='hive', basename_template=f'part-{i}-{{i}}.parquet',
+                         existing_data_behavior='overwrite_or_ignore')
+    os.makedirs(tmp_dir, exist_ok=True)
+    with open(os.path.join(tmp_dir, SOURCE_FILE), 'w') as f:
+        json.dump(stamp, f)
+    # Swap the finished dataset in whole so readers never see a partial one
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    os.replace(tmp_dir, dataset_dir)
+    report_coerced(csv_file, coerced)
+    print(f"Typed CDM dataset written to {dataset_dir}")
+
+
+def is_current(csv_file, built):
+    """Whether `built` (a dataset directory or Parquet file) was built from `csv_file` as it is now."""
+    try:
+        with open(stamp_path(built)) as f:
+            return json.load(f) == source_stamp(csv_file)
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def load_cdms(columns=None, years=None, csv_file=CDM_FILE, dataset_dir=DATASET_DIR):
+    """Load the typed CDM dataset as a DataFrame, reading only `columns` and the partitions of `years`.
+
+    The dataset is (re)built first if `csv_file` has changed since it was
+    built. Requested columns the CDMs do not have are skipped; the TCA year is
+    available as the 'year' column.
+    """
+    if not is_current(csv_file, dataset_dir):
+        build_cdm_dataset(csv_file, dataset_dir)
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive')
+    if columns is not None:
+        columns = [name for name in columns if name in dataset.schema.names]
+    filter = ds.field('year').isin(list(years)) if years is not None else None
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
+
+
+def build_satellite_table(csv_file=SATELLITE_FILE, table_file=SATELLITE_TABLE):
+    """Convert the satellite catalog CSV into one typed Parquet file."""
+    stamp = source_stamp(csv_file)
+    coerced = {}
+    tables = list(read_typed(csv_file, SATELLITE_TYPES, coerced=coerced))
+    table = pa.concat_tables([t.cast(tables[0].schema) for t in tables]) if tables else pa.table({})
+    pq.write_table(table, table_file + ".part")
+    os.replace(table_file + ".part", table_file)
+    with open(stamp_path(table_file), 'w') as f:
+        json.dump(stamp, f)
+    report_coerced(csv_file, coerced)
+    print(f"Typed satellite table written to {table_file}")
+
+
+def load_satellites(columns=None, csv_file=SATELLITE_FILE, table_file=SATELLITE_TABLE):
+    """Load the typed satellite catalog, reading only `columns`; rebuilt first if `csv_file` changed."""
+    if not is_current(csv_file, table_file):
+        build_satellite_table(csv_file, table_file)
+    return pq.read_table(table_file, columns=columns).to_pandas()
+
+
+if __name__ == "__main__":
+    build_cdm_dataset()
+    build_satellite_table()
@@ -0,0 +1,323 @@
+import csv
+import heapq
+import pickle
+import tempfile
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Columns needed to pick the best CDM of each conjunction; the rest are only read on output
+KEY_COLUMNS = ['SAT1_OBJECT_DESIGNATOR', 'SAT2_OBJECT_DESIGNATOR', 'SAT1_OBJECT_TYPE', 'SAT2_OBJECT_TYPE',
+               'COLLISION_PROBABILITY', 'CREATION_DATE', 'TCA']
+
+# Rows parsed per pandas chunk
+CHUNK_ROWS = 500000
+
+# Bytes of full CDM rows held in memory by the output sort before a sorted run is spilled to disk
+MAX_ROW_BYTES = 64 << 20
+
+# Bytes of conjunction key records held in memory before a sorted run is spilled to disk
+MAX_KEY_BYTES = 64 << 20
+
+# Records pickled together in, or read at a time from, a spilled run
+RUN_BLOCK = 10000
+
+# One record per candidate CDM: conjunction key, first row of its conjunction, row, and TCA and
+# creation date in ns. The key packs the two satellite codes and the TCA day in KEY_BITS each
+KEY_DTYPE = np.dtype([('key', 'i8'), ('first', 'i8'), ('row', 'i8'), ('tca', 'i8'), ('created', 'i8')])
+KEY_BITS = 21
+NAT = np.datetime64('NaT').astype(np.int64)
+
+# Best row of each conjunction with the conjunction's first row, which fixes its output order
+WINNER_DTYPE = np.dtype([('row', 'i8'), ('first', 'i8')])
+
+
+def _spill(records):
+    run = tempfile.TemporaryFile()
+    for i in range(0, len(records), RUN_BLOCK):
+        pickle.dump(records[i:i + RUN_BLOCK], run, protocol=pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    while True:
+        try:
+            yield from pickle.load(run)
+        except EOFError:
+            return
+
+
+def external_sort(records, key, size, max_bytes=MAX_ROW_BYTES):
+    """Yield `records` sorted (stably) by `key`.
+
+    Records are sorted in memory until their `size` (bytes) adds up to
+    `max_bytes`; past that, sorted runs are spilled to temporary files and
+    combined with a k-way merge.
+    """
+    runs = []
+    buffer = []
+    held = 0
+    try:
+        for record in records:
+            buffer.append(record)
+            held += size(record)
+            if held >= max_bytes:
+                buffer.sort(key=key)
+                runs.append(_spill(buffer))
+                buffer = []
+                held = 0
+        buffer.sort(key=key)
+        if not runs:
+            yield from buffer
+            return
+        yield from heapq.merge(*[_read_run(run) for run in runs], buffer, key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def candidate_chunks(cdm_filename, satellite_codes, chunk_rows=CHUNK_ROWS):
+    """Yield a KEY_DTYPE record array per chunk with one record per CDM that passes the filters.
+
+    Only the key columns are parsed, as strings; dates are converted per chunk
+    to integer nanoseconds (NaT for an unparseable creation date).
+    `satellite_codes` maps each satellite ID seen so far to the integer code
+    it has in the conjunction keys, and is extended with the IDs of every kept CDM.
+    """
+    row = 0
+    chunks = pd.read_csv(cdm_filename, usecols=KEY_COLUMNS, dtype=str, keep_default_na=False,
+                         chunksize=chunk_rows, encoding='utf-8')
+    for chunk in chunks:
+        sat1 = chunk['SAT1_OBJECT_DESIGNATOR'].to_numpy()
+        sat2 = chunk['SAT2_OBJECT_DESIGNATOR'].to_numpy()
+        type1 = chunk['SAT1_OBJECT_TYPE'].to_numpy()
+        type2 = chunk['SAT2_OBJECT_TYPE'].to_numpy()
+        rows = row + np.arange(len(chunk))
+        row += len(chunk)
+
+        # Ensure valid data and relevant payload information
+        keep = (((type1 == 'PAYLOAD') | (type2 == 'PAYLOAD')) & (type1 != 'UNKNOWN') & (type2 != 'UNKNOWN')
+                & (chunk['COLLISION_PROBABILITY'].to_numpy() != 'NULL'))
+        if not keep.any():
+            continue
+        sat1, sat2, rows = sat1[keep], sat2[keep], rows[keep]
+        tca = pd.to_datetime(chunk['TCA'][keep], format=DATE_FORMAT, errors='coerce').to_numpy()
+        if np.isnat(tca).any():
+            raise ValueError(f"Unparseable TCA on data row {rows[np.isnat(tca)][0] + 1}")
+        created = pd.to_datetime(chunk['CREATION_DATE'][keep], format=DATE_FORMAT, errors='coerce').to_numpy()
+        days = tca.astype('datetime64[D]').astype(np.int64)
+
+        for satellite_id in pd.unique(np.concatenate([sat1, sat2])):
+            satellite_codes.setdefault(satellite_id, len(satellite_codes))
+        if len(satellite_codes) > 1 << KEY_BITS or days.min() < 0 or days.max() >= 1 << KEY_BITS:
+            raise ValueError("Too many satellites or a TCA out of range for the conjunction keys")
+        codes = pd.Index(list(satellite_codes))
+        code1, code2 = codes.get_indexer(sat1), codes.get_indexer(sat2)
+        # A conjunction is the unordered satellite pair plus the TCA's day, packed into one integer
+        records = np.zeros(len(rows), dtype=KEY_DTYPE)
+        records['key'] = (np.minimum(code1, code2) << 2 * KEY_BITS) | (np.maximum(code1, code2) << KEY_BITS) | days
+        records['first'] = rows
+        records['row'] = rows
+        records['tca'] = tca.astype(np.int64)
+        records['created'] = created.astype(np.int64)
+        yield records
+
+
+def _distance(tca, created):
+    # |TCA - creation date| in ns; an unknown creation date is farthest from everything
+    return np.where(created == NAT, np.iinfo(np.int64).max, np.abs(tca - created))
+
+
+def reduce_records(records):
+    """Sort KEY_DTYPE `records` by conjunction and file order, collapsing each stretch of consecutive
+    records of one conjunction that share a TCA into a single record.
+
+    A stretch with one TCA acts on the conjunction's incumbent exactly like its
+    own first CDM created closest to that TCA, so it is kept as that CDM (with
+    the stretch's first row). The closest-to-TCA rule compares both creation
+    dates against the challenger's TCA, so stretches with different TCAs are
+    not order-independent and are left for `fold_conjunctions`.
+    """
+    records = records[np.lexsort((records['row'], records['key']))]
+    if len(records) == 0:
+        return records
+    key, tca = records['key'], records['tca']
+    starts = np.flatnonzero(np.r_[True, (key[1:] != key[:-1]) | (tca[1:] != tca[:-1])])
+    stretch = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(records)]))
+    # First record of least distance in each stretch
+    order = np.lexsort((np.arange(len(records)), _distance(tca, records['created']), stretch))
+    reduced = records[order[starts]]
+    reduced['first'] = np.minimum.reduceat(records['first'], starts)
+    return reduced
+
+
+def fold_conjunctions(records):
+    """Pick the best CDM of each conjunction in `records`, which hold all of its (reduced) records
+    sorted by conjunction and file order: a WINNER_DTYPE array, one entry per conjunction.
+
+    CDMs are folded into their conjunction's incumbent in file order: a CDM
+    replaces the incumbent when it was created closer to its own TCA than the
+    incumbent was created, which is exactly the rule of the original
+    single-pass dictionary scan. Step k of the fold runs over the k-th record
+    of every conjunction at once.
+    """
+    key = records['key']
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(records) else np.zeros(0, dtype=np.int64)
+    lengths = np.diff(np.r_[starts, len(records)])
+    best = starts.copy()
+    # Conjunctions by decreasing record count, so those still folding at step k are a prefix
+    longest = np.argsort(-lengths, kind='stable')
+    remaining = np.searchsorted(-lengths[longest], -np.arange(lengths.max(initial=0)), side='left')
+    distance = _distance(records['tca'], records['created'])
+    for k in range(1, len(remaining)):
+        groups = longest[:remaining[k]]
+        challengers = starts[groups] + k
+        better = distance[challengers] < _distance(records['tca'][challengers], records['created'][best[groups]])
+        best[groups[better]] = challengers[better]
+
+    winners = np.zeros(len(starts), dtype=WINNER_DTYPE)
+    winners['first'] = np.minimum.reduceat(records['first'], starts) if len(starts) else []
+    winners['row'] = records['row'][best]
+    return winners
+
+
+def _spill_records(records):
+    run = tempfile.TemporaryFile()
+    run.write(records.tobytes())
+    run.seek(0)
+    return run
+
+
+def _read_records(run, dtype):
+    return np.frombuffer(run.read(RUN_BLOCK * dtype.itemsize), dtype=dtype)
+
+
+def merge_runs(runs, dtype, field):
+    """Yield the records of `runs` (files of `dtype` records, each sorted by `field`) in blocks.
+
+    Blocks come in increasing `field` order and all records sharing a `field`
+    value are in the same block; records are not sorted within a block. Each
+    run is read RUN_BLOCK records at a time.
+    """
+    buffers = [_read_records(run, dtype) for run in runs]
+    more = [len(buffer) == RUN_BLOCK for buffer in buffers]
+    while True:
+        ends = [buffer[field][-1] for buffer, unread in zip(buffers, more) if unread]
+        if not ends:
+            block = np.concatenate(buffers)
+            if len(block):
+                yield block
+            return
+        # Every record below the smallest last value of a partly read run is in memory
+        bound = min(ends)
+        block = []
+        for i, buffer in enumerate(buffers):
+            cut = np.searchsorted(buffer[field], bound, side='left')
+            block.append(buffer[:cut])
+            buffers[i] = buffer[cut:]
+        block = np.concatenate(block)
+        if len(block):
+            yield block
+        for i, run in enumerate(runs):
+            if more[i] and buffers[i][field][-1] == bound:
+                records = _read_records(run, dtype)
+                buffers[i] = np.concatenate([buffers[i], records])
+                more[i] = len(records) == RUN_BLOCK
+
+
+def grouped_blocks(blocks, dtype, field, compact, max_bytes):
+    """Yield the records of record array `blocks` in blocks grouped by `field`, as `merge_runs` does.
+
+    Arrays are held until they add up to `max_bytes`, then reduced by
+    `compact` (which must sort by `field`) and spilled to disk as a sorted run.
+    Without a spill, everything comes back as one compacted block.
+    """
+    runs = []
+    buffer = []
+    held = 0
+    try:
+        for records in blocks:
+            buffer.append(records)
+            held += records.nbytes
+            if held >= max_bytes:
+                runs.append(_spill_records(compact(np.concatenate(buffer))))
+                buffer = []
+                held = 0
+        records = compact(np.concatenate(buffer + [np.zeros(0, dtype=dtype)]))
+        if not runs:
+            yield records
+            return
+        runs.append(_spill_records(records))
+        yield from merge_runs(runs, dtype, field)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def best_per_conjunction(chunks, max_bytes=MAX_KEY_BYTES):
+    """Yield WINNER_DTYPE arrays of (best row, first row) per conjunction, sorted by best row.
+
+    Key records are reduced per chunk and spilled as sorted runs once they
+    take up `max_bytes`; the runs are merged a range of conjunctions at a time,
+    so memory stays bounded however many conjunctions there are. The winners
+    are spilled and merged the same way to put them in file order.
+    """
+    keys = grouped_blocks((reduce_records(records) for records in chunks), KEY_DTYPE, 'key', reduce_records,
+                          max_bytes)
+    winners = (fold_conjunctions(reduce_records(records)) for records in keys)
+    for records in grouped_blocks(winners, WINNER_DTYPE, 'row', np.sort, max_bytes):
+        yield np.sort(records)
+
+
+def _row_values(row, width):
+    # Mirrors DictReader: short rows are padded, surplus fields are kept together as one value
+    if len(row) > width:
+        return row[:width] + [str(row[width:])]
+    return row + [''] * (width - len(row))
+
+
+def _row_size(record):
+    return sum(len(value) for value in record[1]) + 64 * len(record[1])
+
+
+def dedupe_cdms(cdm_filename, output_filename, satcats_filename, max_row_bytes=MAX_ROW_BYTES,
+                max_key_bytes=MAX_KEY_BYTES, chunk_rows=CHUNK_ROWS):
+    """Keep the CDM created closest to TCA for each conjunction of a private CDM export.
+
+    Writes the kept CDMs, in order of each conjunction's first appearance, to
+    `output_filename` and the sorted IDs of every satellite involved to
+    `satcats_filename`. Memory holds up to `max_key_bytes` of conjunction
+    records and up to `max_row_bytes` of kept rows; past that, both spill to disk.
+    """
+    satellite_codes = {}
+    # Winners come sorted by row, so the full rows can be picked up in one sequential pass
+    winners = best_per_conjunction(candidate_chunks(cdm_filename, satellite_codes, chunk_rows), max_key_bytes)
+
+    with open(cdm_filename, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        headers = next(reader)
+
+        def winning_rows():
+            rows = (row for row in reader if row)
+            row_number = 0
+            row = next(rows, None)
+            for best_row, first_row in ((int(row), int(first)) for block in winners for row, first in block):
+                while row_number < best_row:
+                    row = next(rows)
+                    row_number += 1
+                yield first_row, _row_values(row, len(headers))
+
+        ordered = external_sort(winning_rows(), key=itemgetter(0), size=_row_size, max_bytes=max_row_bytes)
+        with open(output_filename, 'w', newline='', encoding='utf-8') as f:
+            csv_writer = csv.writer(f)
+            csv_writer.writerow(headers)
+            for _, row in ordered:
+                csv_writer.writerow(row)
+
+    with open(satcats_filename, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for satellite_id in sorted(satellite_codes):  # Ensuring sorted order for consistency
+            writer.writerow([satellite_id])
@@ -0,0 +1,113 @@
+import os
+import csv
+import json
+from datetime import datetime
+from cdm_dedupe import DATE_FORMAT
+from spacetrack_api import CacheMiss
+
+# Every public CDM fetched so far, in the column layout of a private CDM export
+RAW_FILE = "../Data/cdm_public.csv"
+
+# CDMs requested per page; pages are fetched in CDM_ID order after the last one saved
+PAGE_SIZE = 10000
+
+# cdm_public field -> private CDM export column
+PUBLIC_COLUMNS = {
+    'CDM_ID': 'CDM_ID',
+    'CREATED': 'CREATION_DATE',
+    'EMERGENCY_REPORTABLE': 'EMERGENCY_REPORTABLE',
+    'TCA': 'TCA',
+    'MIN_RNG': 'MIN_RNG',
+    'PC': 'COLLISION_PROBABILITY',
+    'SAT_1_ID': 'SAT1_OBJECT_DESIGNATOR',
+    'SAT_1_NAME': 'SAT1_OBJECT_NAME',
+    'SAT1_OBJECT_TYPE': 'SAT1_OBJECT_TYPE',
+    'SAT1_RCS': 'SAT1_RCS',
+    'SAT_1_EXCL_VOL': 'SAT1_EXCL_VOL',
+    'SAT_2_ID': 'SAT2_OBJECT_DESIGNATOR',
+    'SAT_2_NAME': 'SAT2_OBJECT_NAME',
+    'SAT2_OBJECT_TYPE': 'SAT2_OBJECT_TYPE',
+    'SAT2_RCS': 'SAT2_RCS',
+    'SAT_2_EXCL_VOL': 'SAT2_EXCL_VOL',
+}
+# The public minimum range is the miss distance at TCA (m)
+COLUMNS = list(PUBLIC_COLUMNS.values()) + ['MISS_DISTANCE']
+
+
+def private_date(value):
+    """A public CDM date ('2023-09-25 03:13:06', 'T' or not) in the private export's format."""
+    try:
+        return datetime.fromisoformat(value.strip()).strftime(DATE_FORMAT)
+    except (AttributeError, ValueError):
+        return value
+
+
+def private_row(record):
+    """A cdm_public record as a row of the private CDM export's columns."""
+    row = {private: record.get(public) or '' for public, private in PUBLIC_COLUMNS.items()}
+    row['CREATION_DATE'] = private_date(row['CREATION_DATE'])
+    row['TCA'] = private_date(row['TCA'])
+    # Private exports write a missing probability as NULL, and dedupe_cdms skips those
+    row['COLLISION_PROBABILITY'] = row['COLLISION_PROBABILITY'] or 'NULL'
+    row['MISS_DISTANCE'] = row['MIN_RNG']
+    return [row[name] for name in COLUMNS]
+
+
+def cursor_path(raw_file):
+    return raw_file + ".json"
+
+
+def load_cursor(raw_file):
+    """(last CDM_ID saved, size of raw_file when it was saved), or (None, 0) before the first page."""
+    try:
+        with open(cursor_path(raw_file)) as f:
+            cursor = json.load(f)
+        return cursor['last_cdm_id'], cursor['size']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None, 0
+
+
+def save_cursor(raw_file, last_cdm_id, size):
+    tmp = cursor_path(raw_file) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'last_cdm_id': last_cdm_id, 'size': size}, f)
+    os.replace(tmp, cursor_path(raw_file))
+
+
+def fetch_public_cdms(session, raw_file=RAW_FILE, page_size=PAGE_SIZE):
+    """Append every cdm_public CDM newer than the last one saved to `raw_file`; returns how many were added.
+
+    Pages are requested by CDM_ID cursor and streamed as CSV straight into
+    `raw_file`, so memory stays bounded by one record whatever the page size.
+    The cursor is saved only after a page is on disk; a page cut short by an
+    error is truncated away on the next run and fetched again. Replaying
+    offline, the first page missing from the cache ends the data.
+    """
+    last_cdm_id, size = load_cursor(raw_file)
+    added = 0
+    with open(raw_file, 'a+', newline='', encoding='utf-8') as f:
+        f.truncate(size)
+        writer = csv.writer(f)
+        if size == 0:
+            writer.writerow(COLUMNS)
+        while True:
+            predicates = {'CDM_ID': f">{last_cdm_id}"} if last_cdm_id is not None else {}
+            lines = session.query_lines('cdm_public', fmt='csv', **predicates, orderby='CDM_ID asc',
+                                        limit=page_size)
+            count = 0
+            try:
+                for record in csv.DictReader(lines):
+                    writer.writerow(private_row(record))
+                    last_cdm_id = int(record['CDM_ID'])
+                    count += 1
+            except CacheMiss:
+                # Raised before the first record: the online runs stopped at this page
+                pass
+            f.flush()
+            os.fsync(f.fileno())
+            save_cursor(raw_file, last_cdm_id, f.tell())
+            added += count
+            if count:
+                print(f"Fetched {added} CDMs (up to CDM_ID {last_cdm_id})")
+            if count < page_size:
+                return added
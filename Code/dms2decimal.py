@@ -1,3 +1,129 @@
+import numpy as np
+import pandas as pd
+
+
+def sexagesimal_to_decimal(values, delim=':'):
+    """Convert many sexagesimal values (degrees or hours) to decimals at once.
+
+    EXAMPLES:
+
+    sexagesimal_to_decimal(np.array(['150:15:32.8', '-00:30:00']))
+    sexagesimal_to_decimal(pd.Series(['7 49', '-7 49 12']))
+    sexagesimal_to_decimal(np.array([[7, 49, 0], [-0., 30, 0]]))
+
+    `values` is an array or Series of strings split on `delim` (or on
+    whitespace where there is no `delim`), or a numeric array of components,
+    shaped (n, k<=3) or (n,) for whole degrees/hours only. The sign of the
+    first component applies to the whole value, so '-00:30:00' is -0.5.
+    """
+    if len(values) == 0:
+        return np.zeros(0)
+    if np.asarray(values).dtype.kind in 'OUS':
+        # Each value is split where it stands, so blanks and NaN stay in line with the input as NaN
+        text = pd.Series(np.asarray(values, dtype=object))
+        text = text.where(text.notna(), '').astype(str).str.strip()
+        spaced = ~text.str.contains(delim, regex=False)
+        if spaced.any():
+            text[spaced] = text[spaced].str.split().str.join(delim)
+        parts = text.where(text != '').str.split(delim, expand=True)
+        parts = parts.reindex(columns=range(3)).iloc[:, :3]
+        # '-00' parses as -0.0, keeping its sign
+        components = parts.astype(float).to_numpy()
+        components[:, 1:] = np.nan_to_num(components[:, 1:])
+    else:
+        components = np.asarray(values, dtype=float)
+        if components.ndim == 1:
+            components = components[:, None]
+        if components.ndim != 2 or components.shape[1] > 3:
+            raise ValueError(f"Expected components shaped (n,) or (n, k<=3), got {np.shape(values)}")
+        components = np.pad(components, ((0, 0), (0, 3 - components.shape[1])))
+    if len(components) != len(values):
+        raise ValueError(f"Converted {len(components)} values from {len(values)} inputs")
+    first = components[:, 0]
+    negative = np.signbit(first) | ((first == 0) & (components[:, 1] < 0)) | \
+               ((first == 0) & (components[:, 1] == 0) & (components[:, 2] < 0))
+    magnitude = np.abs(components[:, 0]) + np.abs(components[:, 1]) / 60.0 + np.abs(components[:, 2]) / 3600.0
+    return np.where(negative, -magnitude, magnitude)
+
+
+def decimal_to_sexagesimal(values, output_string=False, plus_sign=True):
+    """Convert many decimal values (degrees or hours) to sexagesimal at once.
+
+    EXAMPLES:
+
+    decimal_to_sexagesimal(np.array([18.235097, -0.5]))
+    decimal_to_sexagesimal(pd.Series([18.235097, -0.5]), output_string=True)
+
+    Returns (whole, minutes, seconds) arrays, with the sign carried by the first
+    non-zero component so -0.5 comes back as (0, -30, 0.0); or, with
+    `output_string`, an array of '+DD:MM:SS.SS' strings ('-00:30:0.00' for -0.5).
+    """
+    values = np.asarray(values, dtype=float)
+    negative = values < 0
+    magnitude = np.abs(values)
+    whole = np.floor(magnitude)
+    minutes = np.floor((magnitude - whole) * 60.0)
+    seconds = (magnitude - whole - minutes / 60.0) * 3600.0
+    if output_string:
+        return _format(negative, whole, minutes, seconds, plus_sign)
+    sign = np.where(negative, -1, 1)
+    on_whole = whole != 0
+    on_minutes = ~on_whole & (minutes != 0)
+    on_seconds = ~on_whole & ~on_minutes
+    return (np.where(on_whole, sign * whole, whole),
+            np.where(on_minutes, sign * minutes, minutes),
+            np.where(on_seconds, sign * seconds, seconds))
+
+
+def _format(negative, whole, minutes, seconds, plus_sign):
+    """'[+-]DD:MM:S.SS' strings ('%+03i:%02i:%04.2f'), built as one character matrix."""
+    n = len(whole)
+    whole = whole.astype(np.int64)
+    minutes = minutes.astype(np.int64)
+    centiseconds = np.round(seconds * 100).astype(np.int64)
+
+    def digit(value, place, optional=False):
+        # Leading digits past the fixed width are blank (0) where the value is too short
+        chars = (ord('0') + value // place % 10).astype(np.uint8)
+        return np.where(value >= place, chars, 0).astype(np.uint8) if optional else chars
+
+    def char(c):
+        return np.full(n, ord(c), dtype=np.uint8)
+
+    places = 10 ** np.arange(max(2, len(str(whole.max(initial=0)))) - 1, -1, -1)
+    columns = [np.where(negative, ord('-'), ord('+') if plus_sign else 0).astype(np.uint8)]
+    columns += [digit(whole, place, optional=place >= 100) for place in places]
+    columns += [char(':'), digit(minutes, 10), digit(minutes, 1), char(':'),
+                digit(centiseconds, 1000, optional=True), digit(centiseconds, 100), char('.'),
+                digit(centiseconds, 10), digit(centiseconds, 1)]
+    chars = np.stack(columns, axis=1)
+    # Squeeze out the blanks, then read each row as one byte string
+    chars = np.take_along_axis(chars, np.argsort(chars == 0, axis=1, kind='stable'), axis=1)
+    return np.ascontiguousarray(chars).view(f'S{chars.shape[1]}').ravel().astype(str)
+
+
+def _convert(value, delim, output_string, plus_sign):
+    # Arrays and Series of strings, and 2-D component arrays, are converted to decimals in bulk
+    if isinstance(value, (np.ndarray, pd.Series)):
+        if np.asarray(value).dtype.kind in 'OUS' or np.ndim(value) == 2:
+            return sexagesimal_to_decimal(value, delim)
+        # A 1-D numeric array holds the components of one value, like a list
+    if isinstance(value, str) or hasattr(value, '__iter__'):   # must be sexagesimal
+        if isinstance(value, str):
+            parts = value.split(delim)
+            if len(parts) == 1:
+                parts = parts[0].split()
+            # float('-00') is -0.0, so the sign survives into the numeric components
+            value = [float(part) for part in parts[:3]]
+        return float(sexagesimal_to_decimal(np.array([list(value)], dtype=float))[0])
+    # must be a decimal
+    ret = decimal_to_sexagesimal(np.array([value]), output_string, plus_sign)
+    if output_string:
+        return str(ret[0])
+    whole, minutes, seconds = (component[0] for component in ret)
+    return (int(whole), int(minutes), float(seconds))
+
+
 def dms(d, delim=':', output_string=False):
     """Convert degrees, minutes, seconds to decimal degrees, and back.
 
@@ -7,39 +133,33 @@ def dms(d, delim=':', output_string=False):
     dms([7, 49])
     dms(18.235097)
     dms(18.235097, output_string=True)
-    
-    Also works for negative values.
+    dms(np.array(['150:15:32.8', '-00:30:00']))
+    dms(np.array([[7, 49, 0], [-0., 30, 0]]))
+
+    Also works for negative values. Arrays and Series of strings, and 2-D
+    arrays of components, are converted to decimals in bulk (see
+    :func:`sexagesimal_to_decimal`; :func:`decimal_to_sexagesimal` goes the
+    other way for arrays); a 1-D numeric array is one value's components.
 
     SEE ALSO:  :func:`hms`
     """
     # 2008-12-22 00:40 IJC: Created
     # 2009-02-16 14:07 IJC: Works with spaced or colon-ed delimiters
     # 2015-03-19 21:29 IJMC: Copied from phot.py. Added output_string.
-    from numpy import sign
-
-    if d.__class__==str or hasattr(d, '__iter__'):   # must be HMS
-        if d.__class__==str:
-            d = d.split(delim)
-            if len(d)==1:
-                d = d[0].split(' ')
-        s = sign(float(d[0]))
-        if s==0:  s=1
-        degval = float(d[0])
-        if len(d)>=2:
-            degval = degval + s*float(d[1])/60.0
-        if len(d)==3:
-            degval = degval + s*float(d[2])/3600.0
-        return degval
-    else:    # must be decimal degrees
-        if d<0:  
-            sgn = -1
-        else:
-            sgn = +1
-        d = abs(d)
-        deg = int(d)
-        min = int((d-deg)*60.0)
-        sec = (d-deg-min/60.0)*3600.0
-        ret = (sgn*deg, min, sec)
-        if output_string:
-            ret = '%+03i:%02i:%04.2f' % ret
-        return ret
\ No newline at end of file
+    return _convert(d, delim, output_string, plus_sign=True)
+
+
+def hms(h, delim=':', output_string=False):
+    """Convert hours, minutes, seconds to decimal hours, and back.
+
+    EXAMPLES:
+
+    hms('10:01:03.5')
+    hms(10.0176389, output_string=True)
+    hms(pd.Series(['10:01:03.5', '-00:30:00']))
+
+    Works like :func:`dms`, except that string output has no '+' sign.
+
+    SEE ALSO:  :func:`dms`
+    """
+    return _convert(h, delim, output_string, plus_sign=False)
@@ -1,28 +1,30 @@
-import spacetrack.operators as op
-from spacetrack import SpaceTrackClient
 import datetime as dt
-from time import sleep
 import csv
 from pathlib import Path
-import pandas as pd
-import os
+from spacetrack_api import ResponseCache, SpaceTrackSession
+from tle_downloader import download_histories, load_manifest, plan_downloads, plan_windows
+from tle_archive import build_archive
 
 # Ensure output directory exists. If not, make it.
 output_dir = "../Data/TCA_SATCATS"
 Path(output_dir).mkdir(parents=True, exist_ok=True)
 
 # Check whether ./Data/TLEs/ exists. If not, make it.
-path = '../../Data/TLEs/'
+path = '../Data/TLEs/'
 Path(path).mkdir(parents=True, exist_ok=True)
 
 
-# Prompt user for Space-Track log-in credentials
-print("Log in to using your Space-Track.org account credentials.\n")
-st_email = input("Email: ") # UNCOMMENT THESE
-st_pass = input("Password: ") # UNCOMMENT THESE
+# Responses are shared with fetchCDMs.py; with SPACETRACK_OFFLINE=1 they are replayed without logging in
+cache = ResponseCache()
+st_email = st_pass = None
+if not cache.offline:
+    # Prompt user for Space-Track log-in credentials
+    print("Log in to using your Space-Track.org account credentials.\n")
+    st_email = input("Email: ") # UNCOMMENT THESE
+    st_pass = input("Password: ") # UNCOMMENT THESE
 
 # Log in to Space-Track using your email and password
-st = SpaceTrackClient(identity=st_email, password=st_pass)
+st = SpaceTrackSession(identity=st_email, password=st_pass, cache=cache)
 
 
 # Make a list of all the satcats in Data/satcats.csv
@@ -33,7 +35,8 @@ with open("../Data/satcats.csv", encoding='utf-8-sig') as f:
     for row in reader:
         satcats.append(row[0])
 
-# determine TCA start date and end date
+# Collect the TCA dates of each satcat's conjunctions
+tcas = {satcat: set() for satcat in satcats}
 earliest_tca = None
 latest_tca = None
 filename = input('Add the file path for the full data file:')
@@ -42,6 +45,9 @@ with open(filename, encoding='utf-8-sig') as f:
     for row in reader:
         # Parse the TCA date from the row
         tca_datetime = dt.datetime.fromisoformat(row['TCA'])
+        for satcat in (row['SAT1_OBJECT_DESIGNATOR'], row['SAT2_OBJECT_DESIGNATOR']):
+            if satcat in tcas:
+                tcas[satcat].add(tca_datetime.date())
 
         # Update earliest and latest TCA
         if earliest_tca is None or tca_datetime < earliest_tca:
@@ -49,39 +55,16 @@ with open(filename, encoding='utf-8-sig') as f:
         if latest_tca is None or tca_datetime > latest_tca:
             latest_tca = tca_datetime
 
-study_start = earliest_tca.date()
-study_end = latest_tca.date()
-date_range = pd.date_range(start=study_start, end=study_end)
-tca_dates = [(date - dt.timedelta(days=14), date + dt.timedelta(days=14)) for date in date_range]
-
 # Print the results
-print(f"Earliest TCA: {study_start}")
-print(f"Latest TCA: {study_end}")
-
-drange = op.inclusive_range(study_start, study_end)
+print(f"Earliest TCA: {earliest_tca.date()}")
+print(f"Latest TCA: {latest_tca.date()}")
 
-i = 0
-while i < len(satcats):
-    try:
-        if os.path.exists('../Data/TLEs/'+str(satcats[i])+'.txt'):
-            print('Skipping' + str(satcats[i]))
-        else:
-            print('Downloading' + str(satcats[i]))
-            with open('../Data/TLEs/'+str(satcats[i])+'.txt','w') as f:
-                f.write(st.tle(norad_cat_id=satcats[i], epoch=drange, orderby='epoch desc', format='gp_history'))
-                f.close()
-            print("Printed file: " + str(satcats[i]) + ".txt.")
-            for j in range(26):
-                if j < 13:
-                    print("*"*(j+1))
-                    sleep(0.5)
-                else:
-                    print("*"*(26-j))
-                    sleep(0.5)
-        i+=1
-    except:
-        print('Lowkey Failed')
-        os.remove('../Data/TLEs/'+str(satcats[i])+'.txt')
-        sleep(15)
+# Only fetch the epochs around each object's own TCAs that are not already on disk
+windows = plan_windows(tcas)
+plan = plan_downloads(windows, path, load_manifest(path))
 
+# Download several objects at once within Space-Track's rate limits; rerunning resumes where this stopped
+download_histories(st, plan, path)
 
+# Pack the downloaded histories into the memory-mapped archive read by TLEs2Altitudes and histories
+build_archive('../Data/TLEs')
@@ -0,0 +1,89 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Value columns of an "OEs and LLAs/<satcat>.csv" file, after its time and TLE epoch columns
+VALUE_COLUMNS = ['ecc', 'a', 'inc', 'raan', 'argp', 'nu', 'fa', 'lat', 'lon', 'alt']
+
+# One record per ephemeris row; times are naive UTC
+EPHEMERIS_DTYPE = np.dtype([('time', 'datetime64[us]'), ('epoch', 'datetime64[us]')]
+                           + [(name, 'f8') for name in VALUE_COLUMNS])
+
+# Where histories.history reads "<satcat>.csv" ephemerides from, relative to the working directory
+EPHEMERIS_DIR = os.path.join("arclab", "GEOToolbox", "Data", "OEs and LLAs")
+
+CACHE_DIR = "cache"
+
+# Bumped whenever the parse changes, so caches built by an older version are rebuilt
+CACHE_VERSION = 2
+
+
+def cache_paths(csv_filename):
+    """Binary cache and its sidecar for an ephemeris CSV: <dir>/cache/<satcat>.npy and .json."""
+    directory, name = os.path.split(csv_filename)
+    stem = os.path.join(directory, CACHE_DIR, os.path.splitext(name)[0])
+    return stem + ".npy", stem + ".json"
+
+
+def source_stamp(csv_filename):
+    """What the cache was built from: any rewrite of the CSV changes its size or mtime."""
+    stat = os.stat(csv_filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'version': CACHE_VERSION}
+
+
+def tle_epochs(epochs):
+    """Convert YYDDD.DDDDDDDD TLE epoch strings to datetime64[us]; day 1.0 is 00:00 on January 1st, as in tle_index."""
+    epochs = pd.Series(epochs, dtype=str).str.strip()
+    year = epochs.str[0:2].astype(int).to_numpy()
+    year = np.where(year < 57, 2000 + year, 1900 + year)
+    days = epochs.str[2:].astype(float).to_numpy() - 1
+    start = (year - 1970).astype('datetime64[Y]').astype('datetime64[us]')
+    return start + np.round(days * 86400e6).astype('timedelta64[us]')
+
+
+def read_ephemeris_csv(csv_filename):
+    """Parse a whole ephemeris CSV in bulk into a structured EPHEMERIS_DTYPE array, in file order."""
+    # Epochs stay strings so no digits are lost; round_trip parses floats exactly like float()
+    frame = pd.read_csv(csv_filename, encoding='utf-8-sig', header=0, dtype={1: str}, float_precision='round_trip',
+                        names=['time', 'epoch'] + VALUE_COLUMNS, usecols=range(2 + len(VALUE_COLUMNS)))
+    records = np.zeros(len(frame), dtype=EPHEMERIS_DTYPE)
+    times = pd.to_datetime(frame['time'], utc=True, format='ISO8601')
+    records['time'] = times.dt.tz_localize(None).to_numpy().astype('datetime64[us]')
+    records['epoch'] = tle_epochs(frame['epoch'])
+    for name in VALUE_COLUMNS:
+        records[name] = frame[name].to_numpy(dtype=float)
+    return records
+
+
+def load_ephemeris(csv_filename):
+    """Return the ephemeris of `csv_filename` as a memory-mapped structured array.
+
+    The CSV is parsed once and saved as a binary cache beside it; later loads
+    just map the cache, and a changed CSV (size or mtime) is parsed again.
+    """
+    cache_filename, stamp_filename = cache_paths(csv_filename)
+    stamp = source_stamp(csv_filename)
+    try:
+        with open(stamp_filename) as f:
+            if json.load(f) == stamp:
+                return np.load(cache_filename, mmap_mode='r')
+    except (FileNotFoundError, ValueError):
+        pass
+
+    save_cache(csv_filename, read_ephemeris_csv(csv_filename))
+    return np.load(cache_filename, mmap_mode='r')
+
+
+def save_cache(csv_filename, records):
+    """Save `records`, the parsed contents of `csv_filename` as it is now, as its binary cache."""
+    cache_filename, stamp_filename = cache_paths(csv_filename)
+    stamp = source_stamp(csv_filename)
+    os.makedirs(os.path.dirname(cache_filename), exist_ok=True)
+    # Array first, then the stamp vouching for it, each swapped in whole
+    with open(cache_filename + ".tmp", 'wb') as f:
+        np.save(f, records)
+    os.replace(cache_filename + ".tmp", cache_filename)
+    with open(stamp_filename + ".tmp", 'w') as f:
+        json.dump(stamp, f)
+    os.replace(stamp_filename + ".tmp", stamp_filename)
@@ -0,0 +1,197 @@
+import os
+import csv
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+from sgp4.api import Satrec
+from ephemeris_cache import EPHEMERIS_DIR, EPHEMERIS_DTYPE, VALUE_COLUMNS, save_cache, tle_epochs
+from propagation import geodetic_coordinates, gmst, julian_dates
+from tle_index import TLE_DIR, get_tle_index
+
+SATCAT_FILE = "../Data/satcats.csv"
+
+# Default spacing of the time grid
+STEP = np.timedelta64(60, 's')
+
+# WGS-72, the gravity model sgp4 propagates TLEs with
+MU = 398600.8  # km^3 s^-2
+
+
+def to_utc64(t):
+    """A datetime (naive UTC or timezone-aware), datetime64 or ISO string as naive UTC datetime64[us]."""
+    t = pd.Timestamp(t)
+    if t.tzinfo is not None:
+        t = t.tz_convert('UTC').tz_localize(None)
+    return t.to_datetime64().astype('datetime64[us]')
+
+
+def time_grid(t1, t2, step=STEP):
+    """Times from t1 to t2 inclusive, `step` apart, as datetime64[us]."""
+    t1, t2 = to_utc64(t1), to_utc64(t2)
+    step = np.timedelta64(step, 'us')
+    return t1 + np.arange((t2 - t1) // step + 1) * step
+
+
+def governing_tles(epochs, times):
+    """Index of the newest TLE with epoch at or before each time; the first TLE before its epoch.
+
+    `epochs` must be sorted; among duplicate epochs the last one wins.
+    """
+    return np.maximum(np.searchsorted(epochs, times, side='right') - 1, 0)
+
+
+def propagate_segments(index, times):
+    """TEME positions and velocities (km, km/s) at sorted `times`, and which TLE each came from.
+
+    Times governed by the same TLE form one contiguous segment, propagated in
+    a single vectorised sgp4 call. Rows where SGP4 fails are NaN.
+    """
+    n = len(times)
+    r = np.full((n, 3), np.nan)
+    v = np.full((n, 3), np.nan)
+    which = governing_tles(index.epochs, times)
+    jd, fr = julian_dates(times)
+    bounds = np.flatnonzero(np.diff(which)) + 1
+    for start, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [n]])):
+        sat = Satrec.twoline2rv(*index.pair(which[start]))
+        e, pos, vel = sat.sgp4_array(jd[start:stop], fr[start:stop])
+        ok = e == 0
+        r[start:stop][ok] = pos[ok]
+        v[start:stop][ok] = vel[ok]
+    return r, v, which
+
+
+def orbital_elements(r, v, mu=MU):
+    """Osculating elements of state vectors with shape (n, 3): {name: array} in km and degrees.
+
+    'ecc', 'a', 'inc', 'raan', 'argp', 'nu' (true anomaly) and 'fa' (flight path
+    angle, positive while climbing), the OE columns histories.history reads.
+    """
+    rn = np.linalg.norm(r, axis=1)
+    vn = np.linalg.norm(v, axis=1)
+    rv = np.einsum('ij,ij->i', r, v)
+    h = np.cross(r, v)
+    hn = np.linalg.norm(h, axis=1)
+    node = np.stack([-h[:, 1], h[:, 0], np.zeros(len(h))], axis=1)  # z x h
+    e = ((vn**2 - mu / rn)[:, None] * r - rv[:, None] * v) / mu
+
+    def angle(a, b):
+        # Angle from a to b measured about h, in [0, 360)
+        sin = np.einsum('ij,ij->i', np.cross(a, b), h) / hn
+        return np.degrees(np.mod(np.arctan2(sin, np.einsum('ij,ij->i', a, b)), 2 * np.pi))
+
+    return {
+        'ecc': np.linalg.norm(e, axis=1),
+        'a': 1 / (2 / rn - vn**2 / mu),
+        'inc': np.degrees(np.arccos(np.clip(h[:, 2] / hn, -1, 1))),
+        'raan': np.degrees(np.mod(np.arctan2(node[:, 1], node[:, 0]), 2 * np.pi)),
+        'argp': angle(node, e),
+        'nu': angle(e, r),
+        'fa': np.degrees(np.arctan2(rv, hn)),
+    }
+
+
+def geodetic(r, times):
+    """WGS-84 latitude and longitude (degrees, longitude in [-180, 180)) and altitude (km) of TEME positions."""
+    lat, alt = geodetic_coordinates(r)
+    lon = np.arctan2(r[:, 1], r[:, 0]) - gmst(*julian_dates(times))
+    lon = np.mod(np.degrees(lon) + 180, 360) - 180
+    return np.degrees(lat), lon, alt
+
+
+def ephemeris(satcat, t1, t2, step=STEP, tle_dir=TLE_DIR):
+    """The ephemeris of `satcat` on the grid from t1 to t2, as (EPHEMERIS_DTYPE records, TLE epoch strings).
+
+    Returns None if the satellite has no TLEs. Times where SGP4 fails (after
+    decay, say) are left out.
+    """
+    index = get_tle_index(str(satcat), tle_dir)
+    if not index:
+        return None
+    times = time_grid(t1, t2, step)
+    r, v, which = propagate_segments(index, times)
+    ok = np.isfinite(r).all(axis=1)
+    times, r, v, which = times[ok], r[ok], v[ok], which[ok]
+
+    # The epoch column holds each row's TLE epoch as written in the TLE, YYDDD.DDDDDDDD
+    line1s = np.ascontiguousarray(index.lines[which, 0]).view(np.uint8).reshape(len(which), -1)
+    epochs = np.ascontiguousarray(line1s[:, 18:32]).view('S14').ravel().astype(str)
+    records = np.zeros(len(times), dtype=EPHEMERIS_DTYPE)
+    records['time'] = times
+    records['epoch'] = tle_epochs(epochs)
+    for name, values in orbital_elements(r, v).items():
+        records[name] = values
+    records['lat'], records['lon'], records['alt'] = geodetic(r, times)
+    return records, epochs
+
+
+def write_ephemeris(filename, records, epochs):
+    """Write an ephemeris CSV in the layout histories.history reads, and prime its binary cache.
+
+    Arrow writes each float as its shortest round-trip repr, so the CSV parses
+    back to exactly `records` and they can be saved as the cache as they are.
+    """
+    times = records['time']
+    whole_seconds = (times.astype('datetime64[s]') == times).all()
+    columns = {'time': np.char.add(np.datetime_as_string(times, unit='s' if whole_seconds else 'us'), '+00:00'),
+               'epoch': epochs}
+    columns.update((name, records[name]) for name in VALUE_COLUMNS)
+    tmp = filename + ".tmp"
+    with open(tmp, 'w', encoding='utf-8-sig', newline='') as f:
+        f.write(",".join(columns) + "\n")
+    with open(tmp, 'ab') as f:
+        pcsv.write_csv(pa.table(columns), f, pcsv.WriteOptions(include_header=False, quoting_style='none'))
+    os.replace(tmp, filename)
+    save_cache(filename, records)
+
+
+def generate_satellite(satcat, t1, t2, step, tle_dir, out_dir):
+    """Worker: generate and write one satellite's ephemeris; returns its row count, or None without TLEs."""
+    generated = ephemeris(satcat, t1, t2, step, tle_dir)
+    if generated is None:
+        return None
+    records, epochs = generated
+    write_ephemeris(os.path.join(out_dir, f"{satcat}.csv"), records, epochs)
+    return len(records)
+
+
+def generate(satcats, t1, t2, step=STEP, tle_dir=TLE_DIR, out_dir=EPHEMERIS_DIR, workers=None):
+    """Generate the ephemerides of `satcats` from their stored TLE histories, one worker process per satellite."""
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(generate_satellite, str(satcat), t1, t2, step, tle_dir, out_dir): satcat
+                   for satcat in satcats}
+        for future in as_completed(futures):
+            satcat = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Failed {satcat}: {e}")
+                continue
+            if rows is None:
+                print(f"No TLEs for {satcat}")
+            else:
+                print(f"Wrote {rows} rows for {satcat}")
+
+
+def read_satcats(filename=SATCAT_FILE):
+    with open(filename, encoding='utf-8-sig') as f:
+        return [row[0] for row in csv.reader(f) if row]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Propagate stored TLE histories into the ephemeris CSVs "
+                                                 "histories.history reads.")
+    parser.add_argument("satcats", nargs="*", help=f"NORAD IDs (default: every one in {SATCAT_FILE})")
+    parser.add_argument("--start", required=True, help="first grid time, ISO format (UTC)")
+    parser.add_argument("--end", required=True, help="last grid time, ISO format (UTC)")
+    parser.add_argument("--step", type=float, default=STEP / np.timedelta64(1, 's'), help="grid step in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--tle-dir", default=TLE_DIR)
+    parser.add_argument("--out-dir", default=EPHEMERIS_DIR)
+    args = parser.parse_args()
+    step = np.timedelta64(int(round(args.step * 1e6)), 'us')
+    generate(args.satcats or read_satcats(), args.start, args.end, step, args.tle_dir, args.out_dir, args.workers)
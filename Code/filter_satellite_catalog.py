@@ -1,19 +1,17 @@
-import pandas as pd
-
-# Load the CSV file
-file_path = '../Data/space_track_satellites.csv'
-df = pd.read_csv(file_path)
-
-# Ensure the "DECAY" column is treated as datetime, treating invalid values as NaT
-df['DECAY'] = pd.to_datetime(df['DECAY'], errors='coerce')
+from satellite_catalog import SatelliteCatalog
 
 # Define the cutoff date
-cutoff_date = pd.Timestamp('2020-09-01')
+cutoff_date = '2020-09-01'
+
+with SatelliteCatalog() as catalog:
+    # Apply the latest SATCAT export; only new or changed objects are written
+    inserted, updated, unchanged = catalog.apply_csv('../Data/space_track_satellites.csv')
+    print(f"Catalog: {inserted} new, {updated} changed, {unchanged} unchanged objects")
 
-# Filter rows where "DECAY" is on or after the cutoff date OR is null/empty
-filtered_df = df[(df['DECAY'].isna()) | (df['DECAY'] >= cutoff_date)]
+    # Objects whose "DECAY" is on or after the cutoff date OR is null/empty
+    filtered_df = catalog.frame(catalog.snapshot(cutoff_date))
 
-# Save the filtered data back to a CSV file
+# Save the filtered data to a CSV file for the scripts that read it
 filtered_df.to_csv('../Data/space_track_satellites_filtered.csv', index=False)
 
-print("Rows with 'DECAY' before 2020-09-01 have been removed, null/empty values are retained.")
\ No newline at end of file
+print("Rows with 'DECAY' before 2020-09-01 have been removed, null/empty values are retained.")
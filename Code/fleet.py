@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+from histories import ephemeris_window, utc64, utc64s
+from unwrap import unwrap_degrees
+
+# Columns loaded per satellite unless asked otherwise; 'cleanlon' is the unwrapped longitude
+DEFAULT_COLUMNS = ('lon', 'lat', 'alt', 'cleanlon')
+
+
+def load_satellite(satcat, t1, t2, columns):
+    """Worker: the (times, {column: values}) of one satellite's ephemeris within [t1, t2]."""
+    records = ephemeris_window(satcat, t1, t2)
+    values = {}
+    for name in columns:
+        values[name] = unwrap_degrees(records['lon'])[0] if name == 'cleanlon' else np.array(records[name])
+    return np.array(records['time']), values
+
+
+class Fleet:
+    """Ephemerides of many satellites resampled onto one common time axis.
+
+    The axis is a regular grid from t1 to t2, by default at the finest
+    sampling step of any satellite. Each column is a (satellites, times)
+    float64 array with one row per NORAD ID, in `satcats` order, holding the
+    satellite's own sample nearest each grid time; a satellite with no sample
+    within one of its steps (or half a grid step) holds NaN there. Satellites
+    are loaded in parallel worker processes.
+    """
+
+    def __init__(self, satcats, t1: datetime, t2: datetime, columns=DEFAULT_COLUMNS, workers=None, step=None):
+        self.satcats = np.array([str(satcat) for satcat in satcats])
+        self.rows = {satcat: i for i, satcat in enumerate(self.satcats)}
+        self.firsttime = t1
+        self.lasttime = t2
+        columns = tuple(columns)
+        n = len(self.satcats)
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            loaded = list(pool.map(load_satellite, self.satcats, [t1] * n, [t2] * n, [columns] * n))
+
+        # Each satellite's sampling step: the median of its positive time differences
+        self.steps = np.zeros(n, dtype='timedelta64[us]')
+        for row, (times, _) in enumerate(loaded):
+            steps = np.diff(times)
+            steps = steps[steps > np.timedelta64(0)]
+            if len(steps):
+                self.steps[row] = np.median(steps.astype(np.int64)).astype('timedelta64[us]')
+        positive = self.steps[self.steps > np.timedelta64(0)]
+        if step is not None:
+            self.step = np.timedelta64(step).astype('timedelta64[us]')
+        else:
+            self.step = positive.min() if len(positive) else np.timedelta64(0, 'us')
+
+        samples = np.concatenate([times for times, _ in loaded] + [np.zeros(0, 'datetime64[us]')])
+        if self.step > np.timedelta64(0):
+            self.times = np.arange(utc64(t1), utc64(t2) + np.timedelta64(1, 'us'), self.step)
+        else:
+            self.times = np.unique(samples)
+        self.columns = {name: np.full((n, len(self.times)), np.nan) for name in columns}
+        if len(samples) == 0 or len(self.times) == 0:
+            return
+
+        # Shift each satellite's samples and grid into a time range of its own, so one sorted
+        # search finds every satellite's nearest sample to every grid time at once
+        origin = min(samples.min(), self.times[0])
+        span = (max(samples.max(), self.times[-1]) - origin).astype(np.int64) + 1
+        counts = np.array([len(times) for times, _ in loaded])
+        offsets = np.arange(n, dtype=np.int64)[:, None] * span
+        keys = np.repeat(offsets[:, 0], counts) + (samples - origin).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        grid = offsets + (self.times - origin).astype(np.int64)
+
+        # Each row's samples are keys[first:last + 1]; rows without samples are masked out below
+        bounds = np.r_[0, np.cumsum(counts)]
+        first, last = bounds[:-1, None], bounds[1:, None] - 1
+        found = np.searchsorted(keys, grid)
+        before = np.clip(found - 1, first, last)
+        after = np.clip(found, first, last)
+        nearest = np.where(grid - keys[before] <= keys[after] - grid, before, after)
+        tolerance = np.maximum(self.steps, self.step // 2).astype(np.int64)[:, None]
+        close = (counts[:, None] > 0) & (np.abs(keys[nearest] - grid) <= tolerance)
+        for name in columns:
+            column = np.concatenate([values[name] for _, values in loaded])[order]
+            self.columns[name] = np.where(close, column[nearest], np.nan)
+
+    def __len__(self):
+        return len(self.satcats)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def time_index(self, t):
+        """Index of the axis time nearest to `t` (a datetime or datetime64, or an array of them); -1 on an empty axis."""
+        t = utc64(t) if isinstance(t, datetime) else utc64s(t)
+        if len(self.times) < 2:
+            return np.full(np.shape(t), len(self.times) - 1)
+        after = np.clip(np.searchsorted(self.times, t), 1, len(self.times) - 1)
+        before = after - 1
+        return np.where(t - self.times[before] <= self.times[after] - t, before, after)
+
+    def window(self, t1: datetime = None, t2: datetime = None):
+        """Slice of the time axis covering t1 <= time <= t2 (the whole fleet timeframe by default)."""
+        t1 = self.firsttime if t1 is None else t1
+        t2 = self.lasttime if t2 is None else t2
+        i = np.searchsorted(self.times, utc64(t1), side='left')
+        j = np.searchsorted(self.times, utc64(t2), side='right')
+        return slice(int(i), int(max(i, j)))
+
+    def satellite(self, satcat, name):
+        """The `name` column of one satellite over the common time axis (a view)."""
+        return self.columns[name][self.rows[str(satcat)]]
+
+    def at(self, t, name='lon'):
+        """Value of column `name` for every satellite at the axis time nearest `t`, NaN where that is
+        more than half a grid step away; shape (satellites,) + shape of `t`.
+        """
+        t = utc64(t) if isinstance(t, datetime) else utc64s(t)
+        index = self.time_index(t)
+        if len(self.times) == 0:
+            return np.full((len(self),) + np.shape(t), np.nan)
+        on_axis = np.abs(self.times[index] - t) <= self.step // 2
+        return np.where(on_axis, self.columns[name][:, index], np.nan)
+
+    def in_slot(self, lon_min, lon_max, t1: datetime, t2: datetime = None):
+        """NORAD IDs of the satellites inside the longitude slot [lon_min, lon_max] at t1,
+        or at any time in [t1, t2] when t2 is given. Slots may cross ±180° (lon_min > lon_max).
+        """
+        lon = self.at(t1)[:, None] if t2 is None else self.columns['lon'][:, self.window(t1, t2)]
+        lon = (lon + 180) % 360 - 180
+        with np.errstate(invalid='ignore'):
+            if lon_min <= lon_max:
+                inside = (lon >= lon_min) & (lon <= lon_max)
+            else:
+                inside = (lon >= lon_min) | (lon <= lon_max)
+        return self.satcats[inside.any(axis=1)]
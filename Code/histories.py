@@ -1,10 +1,47 @@
 import os
 path = os.path.abspath("./arclab/GEOToolbox")
 import numpy as np
-from datetime import datetime, timedelta, timezone
-import csv
+from datetime import datetime, timezone
+import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap, BoundaryNorm
+from tle_index import get_tle_index
+from ephemeris_cache import EPHEMERIS_DIR, VALUE_COLUMNS, load_ephemeris
+from unwrap import unwrap_degrees
+from maneuvers import detect_maneuvers, noise_scales, switch_deltas
+
+def utc64(t: datetime):
+    '''
+    Converts a timezone-aware datetime to a naive UTC numpy datetime64\n
+    '''
+    return np.datetime64(t.astimezone(timezone.utc).replace(tzinfo=None),'us')
+
+def utc64s(ts):
+    '''
+    Converts a sequence of timezone-aware datetimes (or datetime64s) to naive UTC datetime64[us]\n
+    '''
+    ts = np.asarray(ts)
+    if np.issubdtype(ts.dtype, np.datetime64):
+        return ts.astype('datetime64[us]')
+    return np.array([utc64(t) for t in ts.ravel()],dtype='datetime64[us]').reshape(ts.shape)
+
+def ephemeris_window(satcat,t1: datetime,t2: datetime):
+    '''
+    Returns the typed ephemeris records of a satcat with t1 <= time <= t2, sorted by time\n
+    with repeated timestamps dropped (see ephemeris_cache.EPHEMERIS_DTYPE)\n
+    '''
+    records = load_ephemeris(os.path.join(EPHEMERIS_DIR, str(satcat) + ".csv"))
+    t = records['time']
+    keep = (t >= utc64(t1))&(t <= utc64(t2))
+    records = records[keep]
+    # history window queries binary-search the time axis, so it must be ascending
+    if np.any(records['time'][1:] < records['time'][:-1]):
+        records = records[np.argsort(records['time'],kind='stable')]
+    # Drop rows repeating the previous kept timestamp
+    if len(records) > 1:
+        records = records[np.concatenate([[True], records['time'][1:] != records['time'][:-1]])]
+    return records
+
 class history:
     def __init__(self,satcat: int,t1: datetime,t2: datetime):
         '''
@@ -12,11 +49,6 @@ class history:
         t1 -> first timestamp\n
         t2 -> last timestamp\n
         '''
-        
-        print()
-        print(path)
-        print()
-
         self.satcat = str(satcat)
         self.firsttime = t1
         self.lasttime = t2
@@ -24,104 +56,33 @@ class history:
         self.LLA_arr = None
         self.CleanLLA_arr = None
         self.datetimes = None
+        self.times = None
+        self.epochs = None
+        self.columns = None
         self.timestep = 0
         self.scEpoch = None
 
     def OE_LLA(self):
         '''
         Retrieves the OE_LLA data for the satcat over the pre-initialized timeframe\n
+        Typed columns are kept in self.times (datetime64, UTC) and self.columns\n
         '''
-        times = []
-        scEpoch = []
-        ecc = []
-        a = []
-        inc = []
-        raan = []
-        argp = []
-        nu = []
-        fa = []
-        lat = []
-        lon = []
-        alt = []
-        Cleanlon = []
-        Cleanlat = []
-        with open(path+"/Data/OEs and LLAs/" + self.satcat + ".csv", encoding='utf-8-sig') as f:
-            reader = csv.reader(f, delimiter=",")
-            header = next(reader)
-            # for i in range(len(header)):
-            #     print("col "+str(i)+": "+header[i])
-            for row in reader:
-                time = datetime.fromisoformat(row[0])
-                epoch = row[1]
-                if int(epoch[0:2])<57:
-                    year = int("20"+epoch[0:2])
-                else:
-                    year = int("19"+epoch[0:2])
-                day_snippet = epoch[2:12]
-                epoch = datetime(year,1,1,0,0,0,tzinfo=timezone.utc)+timedelta(days=float(day_snippet))
-                if (time >= self.firsttime)&(time <= self.lasttime):
-                    if (len(times) > 0):
-                        if (time != times[-1]):
-                            times.append(time)
-                            scEpoch.append(float((time-epoch).total_seconds()/(60*60)))
-                            ecc.append(float(row[2]))
-                            a.append(float(row[3]))
-                            inc.append(float(row[4]))
-                            raan.append(float(row[5]))
-                            argp.append(float(row[6]))
-                            nu.append(float(row[7]))
-                            fa.append(float(row[8]))
-                            lat.append(float(row[9]))
-                            lon.append(float(row[10]))
-                            alt.append(float(row[11]))
-                    else:
-                            times.append(time)
-                            scEpoch.append(float((time-epoch).total_seconds()/(60*60)))
-                            ecc.append(float(row[2]))
-                            a.append(float(row[3]))
-                            inc.append(float(row[4]))
-                            raan.append(float(row[5]))
-                            argp.append(float(row[6]))
-                            nu.append(float(row[7]))
-                            fa.append(float(row[8]))
-                            lat.append(float(row[9]))
-                            lon.append(float(row[10]))
-                            alt.append(float(row[11]))
-        self.scEpoch = np.array(scEpoch)
-        self.datetimes = np.array(times)
-        self.OE_arr = np.vstack([
-            np.array(times),
-            np.array(ecc),
-            np.array(a),
-            np.array(inc),
-            np.array(raan),
-            np.array(argp),
-            np.array(nu),
-            np.array(fa)
-        ])
-        self.LLA_arr = np.vstack([
-            np.array(times),
-            np.array(lon),
-            np.array(lat),
-            np.array(alt)
-        ])
-        Cleanlon = np.array(lon)
+        records = ephemeris_window(self.satcat,self.firsttime,self.lasttime)
+        self.times = records['time']
+        self.epochs = records['epoch']
+        self.columns = {name: records[name] for name in VALUE_COLUMNS}
+        self.scEpoch = (self.times - records['epoch']) / np.timedelta64(1,'h')
+        times = pd.DatetimeIndex(self.times).tz_localize(timezone.utc).to_pydatetime()
+        lon = self.columns['lon']
+        lat = self.columns['lat']
+        alt = self.columns['alt']
+        self.datetimes = times
+        self.OE_arr = np.vstack([times]+[self.columns[name] for name in ['ecc','a','inc','raan','argp','nu','fa']])
+        self.LLA_arr = np.vstack([times,lon,lat,alt])
+        # Longitudes are unwrapped cumulatively so multi-revolution drifts stay continuous;
+        # latitudes lie within +/-90 and never wrap
+        Cleanlon,_ = unwrap_degrees(lon)
         Cleanlat = np.array(lat)
-        for i in range(1,len(lon)):
-            lon0 = Cleanlon[i-1]
-            lon1 = Cleanlon[i]
-            lat0 = Cleanlat[i-1]
-            lat1 = Cleanlat[i]
-        
-            if (lon0>=179)&(np.abs(lon0-lon1)>=179):
-                Cleanlon[i] = 360 + lon1
-            elif (lon0<=-179)&(np.abs(lon0-lon1)>=179):
-                Cleanlon[i] = -360 + lon1
-                
-            if (lat0>179)&(np.abs(lat0-lat1)>=179):
-                Cleanlat[i] = 360 + lat1
-            elif (lat0<-179)&(np.abs(lat0-lat1)>=179):
-                Cleanlat[i] = -360 + lat1
 
         self.CleanLLA_arr = np.vstack([
             np.array(times),
@@ -129,154 +90,117 @@ class history:
             np.array(Cleanlat),
             np.array(alt)
         ])
-                # Find the data's timestep
-        i = 1
-        while self.timestep == 0:
-            self.timestep = (times[i]-times[0]).total_seconds()
-            i += 1
+        # Find the data's timestep
+        steps = self.times[1:] - self.times[0]
+        self.timestep = (steps[steps != np.timedelta64(0)][0] / np.timedelta64(1,'s')).item()
 
 
+    def window(self,t1: datetime = None,t2: datetime = None):
+        '''
+        Returns the slice of the data arrays covering t1 <= time <= t2\n
+        Uses the pre-initialized timeframe for whichever date is not given\n
+        '''
+        if self.times is None:
+            self.OE_LLA()
+        t1 = self.firsttime if t1 is None else t1
+        t2 = self.lasttime if t2 is None else t2
+        i = np.searchsorted(self.times,utc64(t1),side='left')
+        j = np.searchsorted(self.times,utc64(t2),side='right')
+        return slice(int(i),int(max(i,j)))
+
+    def windows(self,t1s,t2s):
+        '''
+        Returns the (start, stop) indexes of many [t1, t2] windows at once\n
+        Row k of the data arrays is in window w when start[w] <= k < stop[w]\n
+        '''
+        if self.times is None:
+            self.OE_LLA()
+        i = np.searchsorted(self.times,utc64s(t1s),side='left')
+        j = np.searchsorted(self.times,utc64s(t2s),side='right')
+        return i,np.maximum(i,j)
+
+    def sliced(self,arr,t1s,t2s):
+        '''
+        Returns views of arr (e.g. self.OE_arr) for each [t1, t2] window\n
+        '''
+        return [arr[:,i:j] for i,j in zip(*self.windows(t1s,t2s))]
+
     def OE(self,t1: datetime = None,t2: datetime = None):
         '''
         Returns an array of the orbital elements over the specified timeframe\n
         Uses the pre-initialized timeframe if no dates are given\n
+        Windows are views into OE_arr, not copies\n
         '''
         if self.OE_arr is None:
             self.OE_LLA()
         if ((t1 is None)&(t2 is None)):
             return self.OE_arr
-        t1 = self.firsttime if t1 is None else t1
-        t2 = self.lasttime if t2 is None else t2
-        t = []
-        ecc = []
-        a = []
-        inc = []
-        raan = []
-        argp = []
-        nu = []
-        fa = []
-        for step in self.OE_arr:
-            if (step[0]>=t1)&(step[0]<=t2):
-                t.append(self.OE_arr[0])
-                ecc.append(self.OE_arr[1])
-                a.append(self.OE_arr[2])
-                inc.append(self.OE_arr[3])
-                raan.append(self.OE_arr[4])
-                argp.append(self.OE_arr[5])
-                nu.append(self.OE_arr[6])
-                fa.append(self.OE_arr[7])
-        OE_trimmed = np.vstack([
-            np.array(t),
-            np.array(ecc),
-            np.array(a),
-            np.array(inc),
-            np.array(raan),
-            np.array(argp),
-            np.array(nu),
-            np.array(fa)
-        ])
-        return OE_trimmed
-        
+        return self.OE_arr[:,self.window(t1,t2)]
 
     def LLA(self,t1: datetime = None,t2: datetime = None):
         '''
         Returns an array of the geographic coordinates over the specified timeframe\n
         Uses the pre-initialized timeframe if no dates are given\n
+        Windows are views into LLA_arr, not copies\n
         '''
         if self.LLA_arr is None:
             self.OE_LLA()
         if ((t1 is None)&(t2 is None)):
             return self.LLA_arr
-        t1 = self.firsttime if t1 is None else t1
-        t2 = self.lasttime if t2 is None else t2
-        t = []
-        lon = []
-        lat = []
-        alt = []
-        for step in self.LLA_arr:
-            if (step[0]>=t1)&(step[0]<=t2):
-                t.append(self.LLA_arr[0])
-                lon.append(self.LLA_arr[1])
-                lat.append(self.LLA_arr[2])
-                alt.append(self.LLA_arr[3])
-        LLA_trimmed = np.vstack([
-            np.array(t),
-            np.array(lon),
-            np.array(lat),
-            np.array(alt)
-        ])
-        return LLA_trimmed
-    
+        return self.LLA_arr[:,self.window(t1,t2)]
+
     def CleanLLA(self,t1: datetime = None,t2: datetime = None):
         '''
         Returns an array of the geographic coordinates over the specified\n
         timeframe with continuous latitudes and longitudes in units of degrees\n
         Uses the pre-initialized timeframe if no dates are given\n
+        Windows are views into CleanLLA_arr, not copies\n
         '''
         if self.CleanLLA_arr is None:
             self.OE_LLA()
         if ((t1 is None)&(t2 is None)):
             return self.CleanLLA_arr
-        t1 = self.firsttime if t1 is None else t1
-        t2 = self.lasttime if t2 is None else t2
-        t = []
-        lon = []
-        lat = []
-        alt = []
-        for step in self.CleanLLA_arr:
-            if (step[0]>=t1)&(step[0]<=t2):
-                t.append(self.CleanLLA_arr[0])
-                lon.append(self.CleanLLA_arr[1])
-                lat.append(self.CleanLLA_arr[2])
-                alt.append(self.CleanLLA_arr[3])
-        CleanLLA_trimmed = np.vstack([
-            np.array(t),
-            np.array(lon),
-            np.array(lat),
-            np.array(alt)
-        ])
-        return CleanLLA_trimmed
+        return self.CleanLLA_arr[:,self.window(t1,t2)]
 
-    def getTLEepochs(self,start: datetime,end: datetime):
-        def file_len(fname):
-            with open(fname) as f:
-                lines = len(f.readlines())
-            return lines
-        index = []
-        for a in np.arange(0,file_len(path+'/Data/TLEs/'+str(self.satcat)+'.txt'),2):
-            index.append(a)
-        l1 = []
-        l2 = []
-        dates = []
-        with open(path+'/Data/TLEs/'+str(self.satcat)+'.txt') as g: 
-            lines = g.readlines()
-            for x in index:
-                line1 = str(lines[x].strip())
-                line2 = str(lines[x+1].strip())
-                year_snippet = line1[18:20]
-                if int(year_snippet)<57:
-                    year = int("20"+year_snippet)
-                else:
-                    year = int("19"+year_snippet)
-                day_snippet = line1[20:32]
-                t = datetime(year,1,1,0,0,0,tzinfo=timezone.utc)+timedelta(days=float(day_snippet))
-                if (t >= start)&(t <= end):
-                    l1.append(line1)
-                    l2.append(line2)
-                    dates.append(t)
-        dates = np.flip(np.array(dates))
-        lon = []
-        
-        for i in range(len(dates)):
-            index = len(self.datetimes)-1
-            min = 48*60*60
-            for j in range(len(self.datetimes)):
-                diff = (self.datetimes[j] - dates[i]).total_seconds()
-                if diff < min:
-                    min = diff
-                    index = j
-            lon.append(self.CleanLLA_arr[index][1])
-        return np.array(dates),np.array(lon)
+    def sample_indices(self,ts):
+        '''
+        Returns the indexes of the ephemeris samples bracketing and nearest to each time\n
+        as (before, after, nearest); before/after are -1 past either end of the data\n
+        '''
+        if self.times is None:
+            self.OE_LLA()
+        ts = utc64s(ts)
+        if len(self.times) == 0:
+            empty = np.full(ts.shape,-1)
+            return empty,empty,empty
+        after = np.searchsorted(self.times,ts,side='left')
+        before = np.where((after < len(self.times))&(self.times[np.minimum(after,len(self.times)-1)] == ts),after,after-1)
+        after = np.where(after < len(self.times),after,-1)
+        use_before = (after < 0)|((before >= 0)&(ts - self.times[before] <= self.times[after] - ts))
+        return before,after,np.where(use_before,before,after)
+
+    def getTLEepochs(self,start: datetime = None,end: datetime = None):
+        '''
+        Returns the TLE epochs within [start, end] (the pre-initialized timeframe by default)\n
+        and the continuous longitude of the ephemeris interpolated to each epoch\n
+        (NaN for epochs outside the ephemeris)\n
+        '''
+        if self.CleanLLA_arr is None:
+            self.OE_LLA()
+        start = self.firsttime if start is None else start
+        end = self.lasttime if end is None else end
+        index = get_tle_index(self.satcat, path+'/Data/TLEs')
+        if index is None:
+            raise FileNotFoundError(path+'/Data/TLEs/'+str(self.satcat)+'.txt')
+        # Epochs come back sorted ascending, naive UTC, from the archive or the text file
+        epochs = np.asarray(index.epochs)
+        epochs = epochs[np.searchsorted(epochs,utc64(start),side='left'):np.searchsorted(epochs,utc64(end),side='right')]
+        dates = pd.DatetimeIndex(epochs).tz_localize(timezone.utc).to_pydatetime()
+        if len(self.times) == 0:
+            return dates,np.full(len(epochs),np.nan)
+        x = (self.times - self.times[0]) / np.timedelta64(1,'s')
+        lon = np.interp((epochs - self.times[0]) / np.timedelta64(1,'s'),x,self.CleanLLA_arr[1].astype(float),left=np.nan,right=np.nan)
+        return dates,lon
 
     def PlotEpochColors(self,datetimes,data,t1: datetime = None,t2: datetime = None, title: str = None):
         '''
@@ -306,7 +230,7 @@ class history:
         fig = plt.figure()
         ax = fig.add_subplot(111)
         ephems = ax.scatter(t, y, s=1, c=scEpoch, cmap=cmap, norm=norm, marker='.')
-        # tles = ax.scatter(epochs,lonTLE, s=2, marker='<') # TODO
+        ax.scatter(epochs,lonTLE, s=2, marker='<', label="TLE epochs")
         fig.colorbar(ephems,label="Hours From Nearest Epoch")
         if title is not None:
             fig.suptitle(title)
@@ -328,18 +252,15 @@ class history:
     #     else:
     #         return self.rv_arr
 
-    # def dv(self,t1: datetime = None,t2: datetime = None):
-    #     '''
-    #     Returns the changes in velocity over the specified timeframe\n
-    #     Uses the pre-initialized timeframe if no dates are given\n
-    #     '''
-    #     if self.dv_arr == None:
-    #         # calculate self.dv_arr
-    #         pass
-        
-    #     if (t1 != None) or (t2 != None):
-    #         #TODO: cut array to timeframe
-    #         dv_trimmed = self.dv_arr
-    #         return dv_trimmed
-    #     else:
-    #         return self.dv_arr
+    def dv(self,t1: datetime = None,t2: datetime = None):
+        '''
+        Returns the maneuvers detected over the specified timeframe as an event table\n
+        with the along-track and cross-track changes in velocity of each (m/s)\n
+        Uses the pre-initialized timeframe if no dates are given\n
+        The TLE noise maneuvers must stand out from is measured over the whole loaded history\n
+        See maneuvers.detect_maneuvers; maneuvers.fleet_maneuvers runs many satellites at once\n
+        '''
+        w = self.window(t1,t2)
+        a,inc,raan = self.columns['a'],self.columns['inc'],self.columns['raan']
+        scales = noise_scales(*switch_deltas(self.epochs,a,inc,raan)[2:])
+        return detect_maneuvers(self.satcat,self.times[w],self.epochs[w],a[w],inc[w],raan[w],scales=scales)
@@ -0,0 +1,198 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from ephemeris_cache import EPHEMERIS_DIR, load_ephemeris
+
+EVENTS_FILE = "../Data/maneuvers.parquet"
+
+# Ephemeris rows examined per pass when streaming a history
+CHUNK_ROWS = 262144
+
+# A jump is a maneuver when its delta-v is this many robust standard deviations above
+# the TLE-to-TLE noise of the chunk, and at least MIN_DV
+SIGMA = 5.0
+MIN_DV = 0.1  # m/s
+
+MU = 398600.8  # km^3 s^-2, WGS-72 as used by SGP4
+
+# One row per detected maneuver; times are naive UTC
+EVENT_COLUMNS = ['NORAD_CAT_ID', 'TIME', 'EPOCH_BEFORE', 'EPOCH_AFTER', 'KIND',
+                 'DA', 'DINC', 'DRAAN', 'DV_ALONG', 'DV_CROSS', 'DV']
+KINDS = ['along-track', 'cross-track', 'both']
+
+
+def orbit_normals(inc, raan):
+    """Unit angular momentum vectors, shape (n, 3), of orbits with inclination and RAAN in degrees."""
+    inc, raan = np.radians(inc), np.radians(raan)
+    return np.stack([np.sin(inc) * np.sin(raan), -np.sin(inc) * np.cos(raan), np.cos(inc)], axis=1)
+
+
+def robust_scale(values):
+    """Standard deviation of `values` estimated from their median absolute deviation."""
+    if len(values) == 0:
+        return 0.0
+    return 1.4826 * np.median(np.abs(values - np.median(values)))
+
+
+def empty_events():
+    events = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in [
+        ('NORAD_CAT_ID', 'int32'), ('TIME', 'datetime64[us]'), ('EPOCH_BEFORE', 'datetime64[us]'),
+        ('EPOCH_AFTER', 'datetime64[us]')]})
+    events['KIND'] = pd.Categorical([], categories=KINDS)
+    for name in EVENT_COLUMNS[5:]:
+        events[name] = pd.Series(dtype='float32')
+    return events
+
+
+def switch_deltas(epochs, a, inc, raan):
+    """Rows where the ephemeris switches to a newer TLE, with the along-track and cross-track delta-v (m/s)
+    of each switch, as (switch rows, da in km, dv_along, dv_cross).
+
+    The jump in semi-major axis across a switch gives the along-track delta-v
+    and the rotation of the orbit plane the cross-track one, both for a
+    near-circular orbit.
+    """
+    switch = np.flatnonzero(epochs[1:] != epochs[:-1]) + 1
+    before = switch - 1
+    v = np.sqrt(MU / a[before]) * 1000
+    da = a[switch] - a[before]
+    dv_along = v * da / (2 * a[before])
+    normals = orbit_normals(inc, raan)
+    cos_angle = np.clip(np.einsum('ij,ij->i', normals[before], normals[switch]), -1, 1)
+    dv_cross = 2 * v * np.sin(np.arccos(cos_angle) / 2)
+    return switch, da, dv_along, dv_cross
+
+
+def noise_scales(dv_along, dv_cross):
+    """Robust spread of the TLE-to-TLE delta-v of every switch of a satellite, as (along, cross) in m/s."""
+    # Plane changes are unsigned, so their noise is measured from zero
+    cross_scale = 1.4826 * np.median(dv_cross) if len(dv_cross) else 0.0
+    return robust_scale(dv_along), cross_scale
+
+
+def detect_maneuvers(satcat, times, epochs, a, inc, raan, sigma=SIGMA, min_dv=MIN_DV, scales=None):
+    """Maneuvers of one satellite as an event table (see EVENT_COLUMNS).
+
+    Candidates are the switches to a newer TLE (see switch_deltas). A switch
+    is flagged when its delta-v stands out from the satellite's TLE fit noise:
+    `scales` as returned by noise_scales over all of its switches. Without
+    them the noise is measured over the switches passed in, which is only
+    sound when that is the satellite's whole history; a short slice with few
+    switches would measure next to no noise. Inputs are sorted by time; a in
+    km, angles in degrees; delta-v in m/s.
+    """
+    switch, da, dv_along, dv_cross = switch_deltas(epochs, a, inc, raan)
+    along_scale, cross_scale = noise_scales(dv_along, dv_cross) if scales is None else scales
+    along = np.abs(dv_along) > max(min_dv, sigma * along_scale)
+    cross = dv_cross > max(min_dv, sigma * cross_scale)
+    found = along | cross
+    rows = switch[found]
+
+    events = empty_events().reindex(range(len(rows)))
+    events['NORAD_CAT_ID'] = np.full(len(rows), int(satcat), dtype=np.int32)
+    events['TIME'] = times[rows]
+    events['EPOCH_BEFORE'] = epochs[rows - 1]
+    events['EPOCH_AFTER'] = epochs[rows]
+    events['KIND'] = pd.Categorical.from_codes(np.where(along[found] & cross[found], 2, np.where(along[found], 0, 1)),
+                                               categories=KINDS)
+    events['DA'] = da[found].astype(np.float32)
+    events['DINC'] = (inc[rows] - inc[rows - 1]).astype(np.float32)
+    events['DRAAN'] = (np.mod(raan[rows] - raan[rows - 1] + 180, 360) - 180).astype(np.float32)
+    events['DV_ALONG'] = dv_along[found].astype(np.float32)
+    events['DV_CROSS'] = dv_cross[found].astype(np.float32)
+    events['DV'] = np.hypot(dv_along[found], dv_cross[found]).astype(np.float32)
+    return events
+
+
+def ephemeris_rows(records, t1=None, t2=None):
+    """Row range [start, stop) of `records` (sorted by time) between t1 and t2."""
+    times = records['time']
+    start = 0 if t1 is None else np.searchsorted(times, np.datetime64(t1, 'us'), side='left')
+    stop = len(times) if t2 is None else np.searchsorted(times, np.datetime64(t2, 'us'), side='right')
+    return int(start), int(max(start, stop))
+
+
+def chunks_of(records, start, stop, chunk_rows):
+    """Views of records[start:stop], chunk_rows at a time, each starting one row early
+    so a TLE switch on a chunk boundary is still seen."""
+    return [records[max(first - 1, start):min(first + chunk_rows, stop)] for first in range(start, stop, chunk_rows)]
+
+
+def satellite_scales(records, chunk_rows=CHUNK_ROWS):
+    """noise_scales over every TLE switch in a satellite's whole ephemeris, streamed chunk_rows at a time."""
+    along, cross = [np.zeros(0)], [np.zeros(0)]
+    for chunk in chunks_of(records, 0, len(records), chunk_rows):
+        _, _, dv_along, dv_cross = switch_deltas(chunk['epoch'], chunk['a'], chunk['inc'], chunk['raan'])
+        along.append(dv_along)
+        cross.append(dv_cross)
+    return noise_scales(np.concatenate(along), np.concatenate(cross))
+
+
+def satellite_maneuvers(satcat, t1=None, t2=None, chunk_rows=CHUNK_ROWS, ephemeris_dir=EPHEMERIS_DIR,
+                        sigma=SIGMA, min_dv=MIN_DV):
+    """Worker: the maneuvers of one satellite between t1 and t2 (naive UTC), from its ephemeris.
+
+    The memory-mapped ephemeris is streamed chunk_rows at a time. The TLE
+    noise is measured once over the satellite's whole ephemeris, so what is
+    detected does not depend on the window or on where the chunks fall.
+    """
+    records = load_ephemeris(os.path.join(ephemeris_dir, f"{satcat}.csv"))
+    if np.any(records['time'][1:] < records['time'][:-1]):
+        records = np.sort(records, order='time', kind='stable')
+    scales = satellite_scales(records, chunk_rows)
+    start, stop = ephemeris_rows(records, t1, t2)
+    events = [empty_events()]
+    for chunk in chunks_of(records, start, stop, chunk_rows):
+        events.append(detect_maneuvers(satcat, chunk['time'], chunk['epoch'], chunk['a'], chunk['inc'],
+                                       chunk['raan'], sigma, min_dv, scales))
+    return pd.concat(events, ignore_index=True)
+
+
+def fleet_maneuvers(satcats, t1=None, t2=None, workers=None, chunk_rows=CHUNK_ROWS, ephemeris_dir=EPHEMERIS_DIR):
+    """Maneuvers of every satellite in `satcats`, detected in parallel worker processes.
+
+    Returns one event table sorted by NORAD ID and time; satellites without an
+    ephemeris are reported and skipped.
+    """
+    tables = [empty_events()]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(satellite_maneuvers, str(satcat), t1, t2, chunk_rows, ephemeris_dir): satcat
+                   for satcat in satcats}
+        for future in as_completed(futures):
+            try:
+                tables.append(future.result())
+            except FileNotFoundError:
+                print(f"No ephemeris for {futures[future]}")
+    events = pd.concat(tables, ignore_index=True)
+    events['KIND'] = pd.Categorical(events['KIND'], categories=KINDS)
+    return events.sort_values(['NORAD_CAT_ID', 'TIME'], ignore_index=True)
+
+
+def last_maneuvers(events, satcats, times):
+    """The latest maneuver of satcats[i] at or before times[i], e.g. each CDM's SAT1 at its TCA.
+
+    Returns a table aligned with the inputs with the event's TIME, KIND and DV
+    (NaT/NaN where the object has not maneuvered yet).
+    """
+    queries = pd.DataFrame({'NORAD_CAT_ID': np.asarray(satcats, dtype=np.int32),
+                            'AT': np.asarray(times, dtype='datetime64[us]'), 'ROW': np.arange(len(satcats))})
+    found = pd.merge_asof(queries.sort_values('AT'), events[['NORAD_CAT_ID', 'TIME', 'KIND', 'DV']].sort_values('TIME'),
+                          left_on='AT', right_on='TIME', by='NORAD_CAT_ID', direction='backward')
+    return found.sort_values('ROW').set_index('ROW')[['TIME', 'KIND', 'DV']].rename_axis(None)
+
+
+if __name__ == "__main__":
+    from ephemeris_generator import read_satcats, SATCAT_FILE
+
+    parser = argparse.ArgumentParser(description="Detect maneuvers in the history ephemerides of a fleet.")
+    parser.add_argument("satcats", nargs="*", help=f"NORAD IDs (default: every one in {SATCAT_FILE})")
+    parser.add_argument("--start", default=None, help="first time to examine, ISO format (UTC)")
+    parser.add_argument("--end", default=None, help="last time to examine, ISO format (UTC)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--output", default=EVENTS_FILE)
+    args = parser.parse_args()
+    events = fleet_maneuvers(args.satcats or read_satcats(), args.start, args.end, workers=args.workers)
+    events.to_parquet(args.output, index=False)
+    print(f"{len(events)} maneuvers of {events['NORAD_CAT_ID'].nunique()} objects written to {args.output}")
@@ -0,0 +1,251 @@
+import os
+import argparse
+import numpy as np
+from tle_archive import current_archive
+from tle_elements import CHUNK_ROWS, parse_lines
+
+OCCUPANCY_FILE = "../Data/occupancy.npz"
+
+# One period of the cube is `step` of this numpy datetime unit: 'M' months, 'W' weeks, 'D' days, 'Y' years
+PERIOD = 'M'
+
+# Perigees and apogees are histogrammed this many km apart, up to MAX_ALTITUDE
+RESOLUTION = 1.0  # km
+MAX_ALTITUDE = 2000.0  # km; anything higher is only counted as above it
+
+# An object drops out of the population this long after its last TLE (decay, or lost track)
+STALE_DAYS = 30
+
+# Catalog object types the cube is split by; anything else, or an object missing from the catalog, is 'OTHER'
+OBJECT_TYPES = ['PAYLOAD', 'ROCKET BODY', 'DEBRIS', 'OTHER']
+
+# One row per object and period: the last TLE of the object in that period
+STATE_DTYPE = np.dtype([('satcat', 'i4'), ('period', 'i8'), ('stale', 'i8'), ('perigee', 'f8'), ('apogee', 'f8')])
+
+
+def to_period(t, period=PERIOD):
+    """The period unit containing a date, datetime64 or ISO string."""
+    return np.datetime64(t, 'us').astype(f'datetime64[{period}]')
+
+
+def period_index(times, origin, period=PERIOD, step=1):
+    """Index of the period each time falls in, counting from the period starting at `origin` (may be negative)."""
+    periods = np.asarray(times, dtype='datetime64[us]').astype(f'datetime64[{period}]')
+    return (periods - to_period(origin, period)).astype(np.int64) // step
+
+
+def period_starts(origin, n_periods, period=PERIOD, step=1):
+    return to_period(origin, period) + np.arange(n_periods) * step
+
+
+def last_per_group(*keys):
+    """Mask of the last row of each run of equal keys."""
+    last = np.ones(len(keys[0]), dtype=bool)
+    if len(last) > 1:
+        last[:-1] = np.logical_or.reduce([key[1:] != key[:-1] for key in keys])
+    return last
+
+
+def period_states(elements, origin, period=PERIOD, step=1, stale_days=STALE_DAYS):
+    """Reduce TLEs sorted by object and epoch to the last one of each object in each period (STATE_DTYPE).
+
+    TLEs with bad checksums or no finite perigee are skipped, and so are TLEs
+    that go stale before the period at `origin`.
+    """
+    ok = elements['checksum_ok'] & np.isfinite(elements['perigee']) & np.isfinite(elements['apogee'])
+    elements = elements[ok]
+    stale = period_index(elements['epoch'] + np.timedelta64(stale_days, 'D'), origin, period, step)
+    elements, stale = elements[stale >= 0], stale[stale >= 0]
+    periods = period_index(elements['epoch'], origin, period, step)
+    last = last_per_group(elements['satcat'], periods)
+    states = np.zeros(int(last.sum()), dtype=STATE_DTYPE)
+    states['satcat'] = elements['satcat'][last]
+    states['period'] = periods[last]
+    states['stale'] = stale[last]
+    states['perigee'] = elements['perigee'][last]
+    states['apogee'] = elements['apogee'][last]
+    return states
+
+
+def type_codes(satcats, object_types, types=OBJECT_TYPES):
+    """Index into `types` of each satcat's catalog type; `object_types` maps NORAD ID -> OBJECT_TYPE."""
+    known = np.array(sorted(object_types), dtype=np.int64)
+    other = types.index('OTHER')
+    codes = np.array([types.index(object_types[s]) if object_types[s] in types else other for s in known],
+                     dtype=np.int64)
+    i = np.searchsorted(known, satcats)
+    found = i < len(known)
+    found[found] = known[i[found]] == satcats[found]
+    result = np.full(len(satcats), other, dtype=np.int64)
+    result[found] = codes[i[found]]
+    return result
+
+
+class OccupancyCube:
+    """Objects per period by the altitude of their perigee and of their apogee, split by object type.
+
+    `perigee[t, p, k]` counts the objects of type types[t] whose perigee was in
+    km bin k (RESOLUTION wide) during period p, according to their latest TLE,
+    with a last bin for everything above the altitude range; `apogee`
+    likewise. An object is in an altitude shell when its orbit spans
+    any of it, which both histograms together answer for shells of any width.
+    """
+
+    def __init__(self, periods, perigee, apogee, types=OBJECT_TYPES, resolution=RESOLUTION):
+        self.periods = periods
+        self.perigee = perigee
+        self.apogee = apogee
+        self.types = list(types)
+        self.resolution = resolution
+
+    @classmethod
+    def from_states(cls, states, origin, n_periods, object_types, period=PERIOD, step=1, resolution=RESOLUTION,
+                    max_altitude=MAX_ALTITUDE, types=OBJECT_TYPES):
+        """Rasterize object states (STATE_DTYPE, sorted by object and period) into the cube.
+
+        Each state holds from its period until the object's next state, or
+        until it goes stale. The start and end of every interval are marked in
+        a difference array over periods, and one cumulative sum turns them into
+        counts, so the cost does not grow with how long states last.
+        """
+        satcats = states['satcat']
+        same_object = np.zeros(len(states), dtype=bool)
+        same_object[:-1] = satcats[1:] == satcats[:-1]
+        following = np.append(states['period'][1:], 0)
+        end = np.where(same_object, np.minimum(following, states['stale'] + 1), states['stale'] + 1)
+        start = np.maximum(states['period'], 0)
+        end = np.minimum(end, n_periods)
+        held = end > start
+        states, start, end = states[held], start[held], end[held]
+
+        n_bins = int(np.ceil(max_altitude / resolution)) + 1
+        n_types = len(types)
+        codes = type_codes(states['satcat'].astype(np.int64), object_types, types)
+        cubes = []
+        for altitude in (states['perigee'], states['apogee']):
+            k = np.clip(np.floor(altitude / resolution), 0, n_bins - 1).astype(np.int64)
+            # One spare period row takes the ends of states that last to the end of the cube
+            cell = codes * (n_periods + 1) * n_bins + k
+            changes = np.bincount(np.concatenate([cell + start * n_bins, cell + end * n_bins]),
+                                  weights=np.concatenate([np.ones(len(k)), -np.ones(len(k))]),
+                                  minlength=n_types * (n_periods + 1) * n_bins)
+            counts = np.cumsum(changes.reshape(n_types, n_periods + 1, n_bins), axis=1)[:, :n_periods]
+            cubes.append(np.rint(counts).astype(np.int32))
+        return cls(period_starts(origin, n_periods, period, step), *cubes, types=types, resolution=resolution)
+
+    def save(self, filename=OCCUPANCY_FILE):
+        tmp = filename + ".tmp"
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, periods=self.periods, perigee=self.perigee, apogee=self.apogee,
+                                types=np.array(self.types), resolution=self.resolution)
+        os.replace(tmp, filename)
+
+    @classmethod
+    def load(cls, filename=OCCUPANCY_FILE):
+        with np.load(filename) as f:
+            return cls(f['periods'], f['perigee'], f['apogee'], list(f['types']), float(f['resolution']))
+
+    def _select(self, t1, t2, types):
+        rows = np.ones(len(self.periods), dtype=bool)
+        if t1 is not None:
+            rows &= self.periods >= np.datetime64(t1, 'D').astype(self.periods.dtype)
+        if t2 is not None:
+            rows &= self.periods < np.datetime64(t2, 'D').astype(self.periods.dtype)
+        types = self.types if types is None else list(types)
+        return rows, [self.types.index(t) for t in types]
+
+    def _below(self, histograms, altitudes):
+        """Objects with the histogrammed altitude below each of `altitudes`, per period: shape (periods, altitudes)."""
+        below = np.zeros((len(histograms), histograms.shape[1] + 1))
+        below[:, 1:] = np.cumsum(histograms, axis=1)
+        # Interpolated linearly between bin edges; the last bin has no top, so altitudes stop at its bottom
+        top = histograms.shape[1] - 1
+        x = np.clip(np.asarray(altitudes, dtype=float) / self.resolution, 0, top)
+        lo = np.floor(x).astype(np.int64)
+        hi = np.minimum(lo + 1, top)
+        return below[:, lo] + (below[:, hi] - below[:, lo]) * (x - lo)
+
+    def shell_counts(self, bins, t1=None, t2=None, types=None):
+        """Mean number of objects whose orbit crosses each shell [bins[i], bins[i+1]) over the periods
+        starting in [t1, t2), counting only `types` (all by default).
+
+        An orbit crosses a shell when its perigee is below the top and its
+        apogee is not below the bottom. Returns zeros if no period is selected.
+        """
+        rows, types = self._select(t1, t2, types)
+        bins = np.asarray(bins, dtype=float)
+        if not rows.any():
+            return np.zeros(len(bins) - 1)
+        perigee = self.perigee[types][:, rows].sum(axis=0)
+        apogee = self.apogee[types][:, rows].sum(axis=0)
+        counts = self._below(perigee, bins[1:]) - self._below(apogee, bins[:-1])
+        return counts.mean(axis=0)
+
+    def population(self, t1=None, t2=None, types=None):
+        """Objects in the cube in each period starting in [t1, t2)."""
+        rows, types = self._select(t1, t2, types)
+        return self.perigee[types][:, rows].sum(axis=(0, 2))
+
+
+def archive_states(archive, origin, period=PERIOD, step=1, stale_days=STALE_DAYS, chunk_rows=CHUNK_ROWS):
+    """Object states of every TLE in `archive`, decoded chunk_rows at a time in one pass over the archive."""
+    chunks = [np.zeros(0, dtype=STATE_DTYPE)]
+    for start in range(0, len(archive.lines), chunk_rows):
+        chunks.append(period_states(parse_lines(archive.lines[start:start + chunk_rows]), origin, period, step,
+                                    stale_days))
+    states = np.concatenate(chunks)
+    # An object and period split over two chunks keep only their later state
+    return states[last_per_group(states['satcat'], states['period'])]
+
+
+def build_occupancy(tle_dir, object_types, t1=None, t2=None, period=PERIOD, step=1, resolution=RESOLUTION,
+                    max_altitude=MAX_ALTITUDE, stale_days=STALE_DAYS, chunk_rows=CHUNK_ROWS):
+    """The OccupancyCube of every object in the TLE archive of `tle_dir`, from t1 to t2 (default: all epochs).
+
+    `object_types` maps NORAD ID -> catalog OBJECT_TYPE. An archive older than
+    the text files is brought up to date first. Returns None if the archive
+    has not been built.
+    """
+    archive = current_archive(tle_dir)
+    if archive is None or (len(archive.epochs) == 0 and (t1 is None or t2 is None)):
+        return None
+    origin = to_period(t1 if t1 is not None else archive.epochs.min(), period)
+    # t2 is where the cube ends, so the last period is the one just before it
+    last = to_period(np.datetime64(t2, 'us') - 1 if t2 is not None else archive.epochs.max(), period)
+    n_periods = max(int(period_index(last, origin, period, step)) + 1, 0)
+    states = archive_states(archive, origin, period, step, stale_days, chunk_rows)
+    return OccupancyCube.from_states(states, origin, n_periods, object_types, period, step, resolution, max_altitude)
+
+
+def load_occupancy(filename=OCCUPANCY_FILE):
+    """The saved OccupancyCube, or None if it has not been built."""
+    try:
+        return OccupancyCube.load(filename)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    from cdm_dataset import load_satellites
+    from tle_index import TLE_DIR
+
+    parser = argparse.ArgumentParser(description="Count the objects in each altitude shell per period from the "
+                                                 "TLE archive.")
+    parser.add_argument("--tle-dir", default=TLE_DIR)
+    parser.add_argument("--start", default=None, help="first period, ISO date (default: first TLE epoch)")
+    parser.add_argument("--end", default=None, help="end of the last period, ISO date (default: last TLE epoch)")
+    parser.add_argument("--period", default=PERIOD, help="numpy datetime unit of a period (default: %(default)s)")
+    parser.add_argument("--step", type=int, default=1, help="units per period, e.g. 3 with M for quarters")
+    parser.add_argument("--resolution", type=float, default=RESOLUTION, help="altitude bin width in km")
+    parser.add_argument("--max-altitude", type=float, default=MAX_ALTITUDE, help="top of the altitude range in km")
+    parser.add_argument("--output", default=OCCUPANCY_FILE)
+    args = parser.parse_args()
+
+    satellites = load_satellites(columns=['NORAD_CAT_ID', 'OBJECT_TYPE']).dropna()
+    object_types = dict(zip(satellites['NORAD_CAT_ID'].astype(int), satellites['OBJECT_TYPE'].astype(str)))
+    cube = build_occupancy(args.tle_dir, object_types, args.start, args.end, args.period, args.step,
+                           args.resolution, args.max_altitude)
+    if cube is None:
+        raise SystemExit(f"No TLE archive in {args.tle_dir}; build it with tle_archive.py first")
+    cube.save(args.output)
+    print(f"Occupancy of {len(cube.periods)} periods written to {args.output}")
@@ -1,48 +1,78 @@
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 from matplotlib.colors import LinearSegmentedColormap
 import matplotlib.patches as mpatches
 import matplotlib.colors as mcolors
+from altitude_cube import AltitudeCube, ALTITUDE_COLUMNS, VALUE_COLUMNS
+from cdm_dataset import load_cdms, load_satellites
+from occupancy import load_occupancy, OCCUPANCY_FILE
 
-# Load primary CDM dataset
+# Primary CDM dataset and satellite dataset
 cdm_file = "../Data/output.csv"
-data = pd.read_csv(cdm_file)
-
-# Load satellite dataset
 satellite_file = "../Data/space_track_satellites_filtered.csv"
-satellite_data = pd.read_csv(satellite_file)
-satellite_data['ALTITUDE'] = pd.to_numeric(satellite_data['ALTITUDE'], errors='coerce')
-
-# Convert SAT1_ALTITUDE_TCA and SAT2_ALTITUDE_TCA to numeric and kilometers
-data['SAT1_ALTITUDE_TCA'] = pd.to_numeric(data['SAT1_ALTITUDE_TCA'], errors='coerce') / 1000  # Convert to km
-data['SAT2_ALTITUDE_TCA'] = pd.to_numeric(data['SAT2_ALTITUDE_TCA'], errors='coerce') / 1000  # Convert to km
+plots_dir = "../Plots"
+occupancy_file = OCCUPANCY_FILE
 
-# Convert COLLISION_PROBABILITY to numeric
-data['COLLISION_PROBABILITY'] = pd.to_numeric(data['COLLISION_PROBABILITY'], errors='coerce')
+# Object types drawn as satellites and as debris
+PAYLOAD_TYPES = ['PAYLOAD']
+DEBRIS_TYPES = ['DEBRIS', 'ROCKET BODY']
 
-# Convert TCA column to datetime and extract year
-data['TCA'] = pd.to_datetime(data['TCA'], errors='coerce')
-data['Year'] = data['TCA'].dt.year
+YEARS = [2021, 2022, 2023]
 
 # Define histogram parameters
 bin_width = 10  # Width of each altitude bin in km
-bins = np.arange(data[['SAT1_ALTITUDE_TCA', 'SAT2_ALTITUDE_TCA']].min().min(),
-                 data[['SAT1_ALTITUDE_TCA', 'SAT2_ALTITUDE_TCA']].max().max() + bin_width, bin_width)
-
-# Define colormap for collision probability and miss distance
-collision_colors = LinearSegmentedColormap.from_list("collision_prob", ["mistyrose", "darkred"], N=256)
-miss_distance_colors = LinearSegmentedColormap.from_list("miss_distance", ["mistyrose", "darkred"], N=256)
 
-# Function to overlay satellite data
-def overlay_satellite_data(ax):
+def load_data(cdm_file=cdm_file, satellite_file=satellite_file):
+    """Load the columns the histograms use from the typed datasets (see cdm_dataset.py)."""
+    data = load_cdms(columns=['TCA'] + ALTITUDE_COLUMNS + VALUE_COLUMNS, csv_file=cdm_file)
+    satellite_data = load_satellites(columns=['OBJECT_TYPE', 'ALTITUDE'], csv_file=satellite_file)
+
+    # Convert SAT1_ALTITUDE_TCA and SAT2_ALTITUDE_TCA to kilometers
+    data['SAT1_ALTITUDE_TCA'] = data['SAT1_ALTITUDE_TCA'].astype(float) / 1000  # Convert to km
+    data['SAT2_ALTITUDE_TCA'] = data['SAT2_ALTITUDE_TCA'].astype(float) / 1000  # Convert to km
+
+    # Extract year
+    data['Year'] = data['TCA'].dt.year
+    return data, satellite_data
+
+def load_population(occupancy_file=occupancy_file):
+    """The altitude-shell occupancy cube built from the TLE history (see occupancy.py), or None if not built."""
+    return load_occupancy(occupancy_file)
+
+def study_period(years):
+    """[start, end) dates spanning `years`, for selecting periods of the occupancy cube."""
+    return f"{min(years)}-01-01", f"{max(years) + 1}-01-01"
+
+def population_counts(bins, satellite_data, population=None, years=None):
+    """Satellites and debris crossing each shell, as (payload counts, debris counts).
+
+    With the occupancy cube, these are the mean monthly population over
+    `years`; without it, the catalog snapshot's ALTITUDE column is binned.
+    """
+    if population is not None:
+        t1, t2 = study_period(years)
+        return (population.shell_counts(bins, t1, t2, types=PAYLOAD_TYPES),
+                population.shell_counts(bins, t1, t2, types=DEBRIS_TYPES))
     payload_altitudes = satellite_data[satellite_data['OBJECT_TYPE'] == 'PAYLOAD']['ALTITUDE']
     print(len(payload_altitudes))
-    debris_altitudes = satellite_data[satellite_data['OBJECT_TYPE'].isin(['DEBRIS', 'ROCKET BODY'])]['ALTITUDE']
+    debris_altitudes = satellite_data[satellite_data['OBJECT_TYPE'].isin(DEBRIS_TYPES)]['ALTITUDE']
     print(len(debris_altitudes))
     payload_counts, _ = np.histogram(payload_altitudes, bins=bins)
     debris_counts, _ = np.histogram(debris_altitudes, bins=bins)
+    return payload_counts, debris_counts
+
+def load_shells(data, bin_width=bin_width):
+    """Every CDM is assigned its year and altitude shells once; each figure reads its slice of the cube."""
+    return AltitudeCube.from_frame(data).shells(bin_width)
+
+# Define colormap for collision probability and miss distance
+collision_colors = LinearSegmentedColormap.from_list("collision_prob", ["mistyrose", "darkred"], N=256)
+miss_distance_colors = LinearSegmentedColormap.from_list("miss_distance", ["mistyrose", "darkred"], N=256)
+
+# Function to overlay satellite data
+def overlay_satellite_data(ax, satellite_data, bins, population=None, years=None):
+    payload_counts, debris_counts = population_counts(bins, satellite_data, population, years)
 
     # Add a secondary y-axis for satellite counts
     satellite_ax = ax.twinx()
@@ -65,16 +95,10 @@ def overlay_satellite_data(ax):
     satellite_ax.legend(loc='upper right')
 
 # Function to plot yearly histograms for collision probability
-def plot_yearly_collision_probability(year):
-    filtered_data = data[data['Year'] == year]
-    combined_altitudes = pd.concat([filtered_data['SAT1_ALTITUDE_TCA'], filtered_data['SAT2_ALTITUDE_TCA']]).dropna()
-    yearly_counts, _ = np.histogram(combined_altitudes, bins=bins)
-
-    avg_collision_probs = []
-    for i in range(len(bins) - 1):
-        bin_data = filtered_data[(filtered_data['SAT1_ALTITUDE_TCA'] >= bins[i]) & (filtered_data['SAT1_ALTITUDE_TCA'] < bins[i + 1]) |
-                                  (filtered_data['SAT2_ALTITUDE_TCA'] >= bins[i]) & (filtered_data['SAT2_ALTITUDE_TCA'] < bins[i + 1])]
-        avg_collision_probs.append(bin_data['COLLISION_PROBABILITY'].mean() if not bin_data.empty else 0)
+def plot_yearly_collision_probability(year, shells, show=True):
+    bins = shells.bins
+    yearly_counts = shells.histogram(year)
+    avg_collision_probs = shells.mean('COLLISION_PROBABILITY', year, empty=0)
 
     max_avg_prob = float(np.nanquantile(avg_collision_probs, 0.90))
 
@@ -92,19 +116,15 @@ def plot_yearly_collision_probability(year):
     cbar.ax.xaxis.get_major_formatter().set_scientific(True)
     cbar.ax.xaxis.get_major_formatter().set_powerlimits((-1, 1))
     plt.xlim(200, 1800)
-    plt.savefig(f'../Plots/CDM_collision_probability_{year}.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig(f'{plots_dir}/CDM_collision_probability_{year}.png', dpi=300, bbox_inches='tight')
+    if show:
+        plt.show()
 
 # Function to plot study period for collision probability
-def plot_study_period_collision_probability():
-    combined_altitudes = pd.concat([data['SAT1_ALTITUDE_TCA'], data['SAT2_ALTITUDE_TCA']]).dropna()
-    total_counts, _ = np.histogram(combined_altitudes, bins=bins)
-
-    avg_collision_probs = []
-    for i in range(len(bins) - 1):
-        bin_data = data[(data['SAT1_ALTITUDE_TCA'] >= bins[i]) & (data['SAT1_ALTITUDE_TCA'] < bins[i + 1]) |
-                        (data['SAT2_ALTITUDE_TCA'] >= bins[i]) & (data['SAT2_ALTITUDE_TCA'] < bins[i + 1])]
-        avg_collision_probs.append(bin_data['COLLISION_PROBABILITY'].mean() if not bin_data.empty else 0)
+def plot_study_period_collision_probability(shells, satellite_data, population=None, show=True):
+    bins = shells.bins
+    total_counts = shells.histogram()
+    avg_collision_probs = shells.mean('COLLISION_PROBABILITY', empty=0)
 
     max_avg_prob = float(np.nanquantile(avg_collision_probs, 0.90))
 
@@ -127,12 +147,43 @@ def plot_study_period_collision_probability():
     cbar.ax.xaxis.set_major_formatter(ticker.ScalarFormatter(useMathText=True))
     cbar.ax.xaxis.get_major_formatter().set_scientific(True)
     cbar.ax.xaxis.get_major_formatter().set_powerlimits((-1, 1))
-    overlay_satellite_data(ax)
+    overlay_satellite_data(ax, satellite_data, bins, population, shells.years)
     ax.set_xlim(200, 1800)
-    plt.savefig(f'../Plots/CDM_study_period_collision_probability.png', dpi=300, bbox_inches='tight')
-    plt.show()
+    plt.savefig(f'{plots_dir}/CDM_study_period_collision_probability.png', dpi=300, bbox_inches='tight')
+    if show:
+        plt.show()
+
+# Function to plot CDMs per object crossing each shell, for one year or (None) the study period
+def plot_cdms_per_object(year, shells, population, show=True):
+    bins = shells.bins
+    years = shells.years if year is None else [year]
+    counts = shells.histogram(year)
+    objects = population.shell_counts(bins, *study_period(years))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rates = np.where(objects > 0, counts / objects, 0)
 
-# Generate plots
-for year in [2021, 2022, 2023]:
-    plot_yearly_collision_probability(year)
-plot_study_period_collision_probability()
\ No newline at end of file
+    plt.figure(figsize=(12, 8))
+    plt.bar(bins[:-1], rates, width=np.diff(bins), color='darkred', alpha=0.5, align='edge')
+    plt.xlabel("Altitude (km)")
+    plt.ylabel("CDMs per Object in Altitude Shell")
+    plt.xlim(200, 1800)
+    label = 'study_period' if year is None else year
+    plt.savefig(f'{plots_dir}/CDM_per_object_{label}.png', dpi=300, bbox_inches='tight')
+    if show:
+        plt.show()
+
+def main():
+    data, satellite_data = load_data()
+    shells = load_shells(data)
+    population = load_population()
+    # Generate plots
+    for year in YEARS:
+        plot_yearly_collision_probability(year, shells)
+    plot_study_period_collision_probability(shells, satellite_data, population)
+    # CDM counts normalized by the population at the time need the occupancy cube
+    if population is not None:
+        for year in YEARS + [None]:
+            plot_cdms_per_object(year, shells, population)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+from sgp4.api import Satrec
+
+# WGS-84 ellipsoid
+WGS84_A = 6378.137  # Equatorial radius in km
+WGS84_F = 1 / 298.257223563  # Flattening
+WGS84_E2 = WGS84_F * (2 - WGS84_F)  # First eccentricity squared
+
+UNIX_EPOCH_JD = 2440587.5
+
+
+def julian_dates(times):
+    """Split UTC times into the (jd, fr) Julian date pair expected by sgp4."""
+    t = np.asarray(times, dtype='datetime64[us]')
+    days = (t - np.datetime64('1970-01-01T00:00:00', 'us')) / np.timedelta64(1, 'D')
+    whole = np.floor(days)
+    return whole + UNIX_EPOCH_JD, days - whole
+
+
+def geodetic_coordinates(r):
+    """WGS-84 geodetic latitude (radians) and altitude (km) of Earth-centred positions `r` with shape (..., 3)."""
+    r = np.asarray(r, dtype=float)
+    x, y, z = r[..., 0], r[..., 1], r[..., 2]
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - WGS84_E2))
+    for _ in range(4):
+        sin_lat = np.sin(lat)
+        n = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat**2)
+        alt = p * np.cos(lat) + z * sin_lat - WGS84_A * np.sqrt(1 - WGS84_E2 * sin_lat**2)
+        lat = np.arctan2(z, p * (1 - WGS84_E2 * n / (n + alt)))
+    sin_lat = np.sin(lat)
+    return lat, p * np.cos(lat) + z * sin_lat - WGS84_A * np.sqrt(1 - WGS84_E2 * sin_lat**2)
+
+
+def geodetic_altitude(r):
+    """WGS-84 geodetic altitude in km of Earth-centred positions `r` with shape (..., 3).
+
+    Altitude is invariant under rotations about the z axis, so TEME positions can be
+    used directly without rotating them into an Earth-fixed frame first.
+    """
+    return geodetic_coordinates(r)[1]
+
+
+def gmst(jd, fr):
+    """Greenwich mean sidereal time in radians (IAU-82, UT1 taken as UTC) at Julian dates jd + fr."""
+    t = ((jd - 2451545.0) + fr) / 36525.0
+    seconds = 67310.54841 + (876600.0 * 3600 + 8640184.812866) * t + 0.093104 * t**2 - 6.2e-6 * t**3
+    return np.mod(np.radians(seconds / 240.0), 2 * np.pi)
+
+
+def group_rows(keys):
+    """Yield (key, row indexes) for each distinct value in `keys`."""
+    unique_keys, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.flatnonzero(np.diff(inverse[order])) + 1
+    return zip(unique_keys, np.split(order, bounds))
+
+
+def propagate_positions(line1s, line2s, times):
+    """Propagate every (line1, line2, time) triple with SGP4 and return TEME positions in km.
+
+    Rows are grouped by TLE so each distinct element set is initialised once and
+    propagated over all of its times in a single vectorised sgp4 call. Rows with
+    a missing TLE or an SGP4 error come back as NaN.
+    """
+    n = len(times)
+    r = np.full((n, 3), np.nan)
+    if n == 0:
+        return r
+    jd, fr = julian_dates(times)
+    valid = np.array([bool(l1) and bool(l2) for l1, l2 in zip(line1s, line2s)])
+    rows = np.flatnonzero(valid)
+    if len(rows) == 0:
+        return r
+    keys = [line1s[i] + '\n' + line2s[i] for i in rows]
+    for key, group in group_rows(keys):
+        group = rows[group]
+        line1, line2 = key.split('\n')
+        try:
+            sat = Satrec.twoline2rv(line1, line2)
+        except ValueError:
+            continue
+        e, pos, _ = sat.sgp4_array(jd[group], fr[group])
+        ok = e == 0
+        r[group[ok]] = pos[ok]
+    return r
+
+
+def propagate_altitudes(line1s, line2s, times):
+    """WGS-84 altitude in km for each (line1, line2, time) triple; NaN where propagation fails."""
+    return geodetic_altitude(propagate_positions(line1s, line2s, times))
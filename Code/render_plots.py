@@ -0,0 +1,137 @@
+import matplotlib
+matplotlib.use("Agg")  # Headless: figures are only ever saved, never shown
+
+import os
+import json
+import hashlib
+import argparse
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib.pyplot as plt
+import pandas as pd
+import plotting_histogram
+import plotting_operator_piechart
+
+MANIFEST_FILE = "render_manifest.json"
+
+
+def file_digest(filename):
+    h = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def frame_digest(frame):
+    """Fingerprint of a DataFrame's column names and values."""
+    h = hashlib.sha1(pickle.dumps(list(frame.columns), protocol=4))
+    h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def figure_digest(source, *inputs):
+    """Fingerprint of a figure: the plotting module's code plus everything the figure is drawn from."""
+    h = hashlib.sha1(file_digest(source).encode())
+    for value in inputs:
+        h.update(pickle.dumps(value, protocol=4))
+    return h.hexdigest()
+
+
+def load_manifest(plots_dir):
+    try:
+        with open(os.path.join(plots_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(plots_dir, manifest):
+    tmp = os.path.join(plots_dir, MANIFEST_FILE + ".part")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(plots_dir, MANIFEST_FILE))
+
+
+def plan_figures(years):
+    """Every figure as (output file, digest, render function, arguments).
+
+    The CDM histograms are fingerprinted by the slice of the altitude cube they
+    draw, so a data refresh that only adds new CDMs re-renders just the years
+    it touches; the pie chart by the frames it is drawn from.
+    """
+    data, satellite_data = plotting_histogram.load_data()
+    shells = plotting_histogram.load_shells(data)
+    population = plotting_histogram.load_population()
+    histogram_source = plotting_histogram.__file__
+    plots_dir = plotting_histogram.plots_dir
+
+    figures = []
+    for year in years:
+        inputs = (year, shells.bins, shells.histogram(year), shells.mean('COLLISION_PROBABILITY', year, empty=0))
+        figures.append((f"{plots_dir}/CDM_collision_probability_{year}.png", figure_digest(histogram_source, *inputs),
+                        plotting_histogram.plot_yearly_collision_probability, (year, shells)))
+    altitudes = satellite_data[['OBJECT_TYPE', 'ALTITUDE']]
+    counts = plotting_histogram.population_counts(shells.bins, altitudes, population, shells.years)
+    inputs = (shells.bins, shells.histogram(), shells.mean('COLLISION_PROBABILITY', empty=0), counts)
+    figures.append((f"{plots_dir}/CDM_study_period_collision_probability.png",
+                    figure_digest(histogram_source, *inputs),
+                    plotting_histogram.plot_study_period_collision_probability, (shells, altitudes, population)))
+    # The per-object rates are drawn only once the occupancy cube has been built
+    if population is not None:
+        for year in list(years) + [None]:
+            span = shells.years if year is None else [year]
+            objects = population.shell_counts(shells.bins, *plotting_histogram.study_period(span))
+            inputs = (year, shells.bins, shells.histogram(year), objects)
+            label = 'study_period' if year is None else year
+            figures.append((f"{plots_dir}/CDM_per_object_{label}.png", figure_digest(histogram_source, *inputs),
+                            plotting_histogram.plot_cdms_per_object, (year, shells, population)))
+
+    pie_data = plotting_operator_piechart.load_data()
+    figures.append((f"{plotting_operator_piechart.plots_dir}/combined_pie_chart.png",
+                    figure_digest(plotting_operator_piechart.__file__, *[frame_digest(frame) for frame in pie_data]),
+                    plotting_operator_piechart.plot_operator_piechart, pie_data))
+    return figures
+
+
+def render(function, args):
+    """Worker: draw one figure with the non-interactive backend and free it."""
+    function(*args, show=False)
+    plt.close('all')
+
+
+def render_plots(years=plotting_histogram.YEARS, workers=None, force=False):
+    """Render every figure headlessly in a process pool, skipping figures whose inputs are unchanged."""
+    plots_dir = plotting_histogram.plots_dir
+    os.makedirs(plots_dir, exist_ok=True)
+    manifest = load_manifest(plots_dir)
+
+    todo = []
+    for filename, digest, function, args in plan_figures(years):
+        if not force and manifest.get(os.path.basename(filename)) == digest and os.path.exists(filename):
+            print(f"Unchanged: {filename}")
+            continue
+        todo.append((filename, digest, function, args))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(render, function, args): (filename, digest) for filename, digest, function, args in todo}
+        for future in as_completed(futures):
+            filename, digest = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Failed {filename}: {e}")
+                continue
+            # Recorded as each figure lands, so an interrupted batch keeps what it finished
+            manifest[os.path.basename(filename)] = digest
+            save_manifest(plots_dir, manifest)
+            print(f"Rendered {filename}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render every figure headlessly, skipping unchanged ones.")
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="re-render every figure")
+    parser.add_argument("--years", type=int, nargs="+", default=plotting_histogram.YEARS)
+    args = parser.parse_args()
+    render_plots(args.years, workers=args.workers, force=args.force)
@@ -0,0 +1,159 @@
+import csv
+import json
+import sqlite3
+import hashlib
+from datetime import date, datetime
+import pandas as pd
+
+CATALOG_DB = "../Data/satellite_catalog.sqlite"
+
+# SQLite caps the number of bound parameters per statement
+BATCH_SIZE = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS satellites (
+    norad_cat_id INTEGER PRIMARY KEY,
+    object_type TEXT,
+    country TEXT,
+    launch TEXT,
+    decay TEXT,
+    record TEXT NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS satellites_object_type ON satellites (object_type);
+CREATE INDEX IF NOT EXISTS satellites_country ON satellites (country);
+CREATE INDEX IF NOT EXISTS satellites_decay ON satellites (decay);
+CREATE TABLE IF NOT EXISTS columns (position INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+"""
+
+
+def iso_date(value):
+    """The YYYY-MM-DD date at the start of `value`, or None if it is empty or not a date."""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    try:
+        return date.fromisoformat(str(value).strip()[:10]).isoformat()
+    except ValueError:
+        return None
+
+
+class SatelliteCatalog:
+    """SATCAT records keyed by NORAD ID, indexed by object type, country and decay date.
+
+    Every record is stored whole (as JSON, in the catalog's column order) so
+    query results come back with the same columns as the Space-Track CSV.
+    """
+
+    def __init__(self, filename=CATALOG_DB):
+        self.db = sqlite3.connect(filename)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM satellites").fetchone()[0]
+
+    def column_names(self):
+        return [row['name'] for row in self.db.execute("SELECT name FROM columns ORDER BY position")]
+
+    def apply(self, records):
+        """Upsert SATCAT records (dicts with a NORAD_CAT_ID) and return (inserted, updated, unchanged).
+
+        Only records whose contents differ from the stored copy are written, so
+        applying a full catalog or just a diff of changed objects costs the same
+        per changed object.
+        """
+        inserted = updated = unchanged = 0
+        with self.db:
+            known = set(self.column_names())
+            for record in records:
+                for name in record:
+                    if name not in known:
+                        self.db.execute("INSERT INTO columns (position, name) VALUES "
+                                        "((SELECT COALESCE(MAX(position), -1) + 1 FROM columns), ?)", (name,))
+                        known.add(name)
+                text = json.dumps(record)
+                digest = hashlib.sha1(text.encode()).hexdigest()
+                norad_cat_id = int(record['NORAD_CAT_ID'])
+                stored = self.db.execute("SELECT digest FROM satellites WHERE norad_cat_id = ?",
+                                         (norad_cat_id,)).fetchone()
+                if stored is not None and stored['digest'] == digest:
+                    unchanged += 1
+                    continue
+                self.db.execute(
+                    "INSERT INTO satellites (norad_cat_id, object_type, country, launch, decay, record, digest) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (norad_cat_id) DO UPDATE SET "
+                    "object_type = excluded.object_type, country = excluded.country, launch = excluded.launch, "
+                    "decay = excluded.decay, record = excluded.record, digest = excluded.digest",
+                    (norad_cat_id, record.get('OBJECT_TYPE') or None, record.get('COUNTRY') or None,
+                     iso_date(record.get('LAUNCH')), iso_date(record.get('DECAY')), text, digest))
+                if stored is None:
+                    inserted += 1
+                else:
+                    updated += 1
+        return inserted, updated, unchanged
+
+    def apply_csv(self, csv_file):
+        """Upsert every row of a SATCAT CSV export; see apply()."""
+        with open(csv_file, newline='', encoding='utf-8-sig') as f:
+            return self.apply(csv.DictReader(f))
+
+    def _records(self, where="", params=()):
+        return [json.loads(row['record']) for row in
+                self.db.execute(f"SELECT record FROM satellites {where} ORDER BY norad_cat_id", params)]
+
+    def get(self, norad_cat_id):
+        """The record of one object, or None if it is not in the catalog."""
+        row = self.db.execute("SELECT record FROM satellites WHERE norad_cat_id = ?",
+                              (int(norad_cat_id),)).fetchone()
+        return json.loads(row['record']) if row is not None else None
+
+    def get_many(self, norad_cat_ids):
+        """{NORAD ID: record} for every ID in the catalog; missing IDs are left out."""
+        ids = sorted({int(i) for i in norad_cat_ids})
+        found = {}
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            rows = self.db.execute(f"SELECT norad_cat_id, record FROM satellites WHERE norad_cat_id IN "
+                                   f"({','.join('?' * len(batch))})", batch)
+            found.update((row['norad_cat_id'], json.loads(row['record'])) for row in rows)
+        return found
+
+    def by_type(self, object_type):
+        return self._records("WHERE object_type = ?", (object_type,))
+
+    def by_country(self, country):
+        return self._records("WHERE country = ?", (country,))
+
+    def decayed_between(self, start, end):
+        """Records of the objects that decayed on or after `start` and before `end`."""
+        return self._records("WHERE decay >= ? AND decay < ?", (iso_date(start), iso_date(end)))
+
+    def snapshot(self, as_of, object_type=None, launched=False):
+        """Records of the objects still in orbit on `as_of`: not decayed before that date.
+
+        With `launched`, objects launched after `as_of` (or with no launch date)
+        are left out too; `object_type` narrows the snapshot to one type.
+        """
+        day = iso_date(as_of)
+        where = "WHERE (decay IS NULL OR decay >= ?)"
+        params = [day]
+        if launched:
+            where += " AND launch <= ?"
+            params.append(day)
+        if object_type is not None:
+            where += " AND object_type = ?"
+            params.append(object_type)
+        return self._records(where, params)
+
+    def frame(self, records):
+        """Records as a DataFrame with the catalog's columns, in their original order."""
+        return pd.DataFrame.from_records(records, columns=self.column_names())
@@ -0,0 +1,326 @@
+import os
+import gzip
+import collections
+import json
+import hashlib
+import datetime
+import threading
+import time
+import requests
+
+# Point at a local stub server for testing, e.g. SPACETRACK_URL=http://127.0.0.1:8000
+BASE_URL = os.environ.get("SPACETRACK_URL", "https://www.space-track.org")
+
+# Space-Track's API throttles: requests per minute and per hour
+PER_MINUTE = 30
+PER_HOUR = 300
+
+# Retries for throttled (429) or failed (5xx / connection) requests, with exponential backoff
+MAX_RETRIES = 5
+BACKOFF = 15.0  # seconds before the first retry
+TIMEOUT = 300.0  # seconds to wait for a response
+
+# Responses kept on disk, shared by every script that queries Space-Track
+CACHE_DIR = os.environ.get("SPACETRACK_CACHE", "../Data/spacetrack_cache")
+# SPACETRACK_OFFLINE=1 serves every query from the cache and never contacts Space-Track
+OFFLINE = os.environ.get("SPACETRACK_OFFLINE", "") not in ("", "0")
+
+# How long (s) a cached response is served before it is fetched again, per request class
+TTLS = {'gp_history': 6 * 3600, 'gp': 3600, 'cdm_public': 3600, 'satcat': 24 * 3600}
+DEFAULT_TTL = 3600
+# gp_history over epochs older than this many days no longer changes, so it is cached for good
+IMMUTABLE_AFTER_DAYS = 30
+# Bytes at the start of a response checked for an error message sent in place of data
+ERROR_PEEK = 4096
+
+
+class RateLimiter:
+    """Sliding-window limits shared by every thread making Space-Track requests.
+
+    For each (capacity, period) limit the times of recent requests are kept,
+    and a request waits until fewer than `capacity` were made in the last
+    `period` seconds, so no window of that length ever holds more than
+    `capacity` requests, from the first request on.
+    """
+
+    def __init__(self, limits=((PER_MINUTE, 60.0), (PER_HOUR, 3600.0)), clock=time.monotonic, sleep=time.sleep):
+        self.limits = limits
+        self.requests = [collections.deque() for _ in limits]
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be made, then record it."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                wait = 0.0
+                for times, (capacity, period) in zip(self.requests, self.limits):
+                    while times and times[0] <= now - period:
+                        times.popleft()
+                    if len(times) >= capacity:
+                        wait = max(wait, times[0] + period - now)
+                if wait <= 0:
+                    for times in self.requests:
+                        times.append(now)
+                    return
+            self.sleep(wait)
+
+
+def format_predicate(value):
+    """Render a query predicate value: lists become comma-separated, (start, end) tuples become ranges."""
+    if isinstance(value, tuple):
+        return f"{value[0]}--{value[1]}"
+    if isinstance(value, (list, set)):
+        return ",".join(str(v) for v in value)
+    return str(value)
+
+
+class CacheMiss(LookupError):
+    """An offline query whose response is not in the cache."""
+
+
+class SpaceTrackError(requests.HTTPError):
+    """An error or throttling message Space-Track answered a query with instead of data (status 200)."""
+
+
+def error_message(head):
+    """The message of a Space-Track error body, given its first bytes, or None for a real response.
+
+    Errors come as {"error": "..."} (or a list of just that); a longer JSON
+    response cut off at ERROR_PEEK bytes does not parse and counts as data.
+    """
+    text = head.decode('utf-8', errors='replace').strip()
+    if not text.startswith(('{', '[')):
+        return None
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(body, list) and len(body) == 1:
+        body = body[0]
+    if isinstance(body, dict) and list(body) == ['error']:
+        return str(body['error'])
+    return None
+
+
+def normalize_predicate(value):
+    """Canonical form of a predicate value for cache keys: list order does not matter."""
+    if isinstance(value, (list, set)):
+        return ",".join(sorted({str(v) for v in value}))
+    return format_predicate(value)
+
+
+class ResponseCache:
+    """Gzipped Space-Track responses on disk, keyed on the normalized query.
+
+    Bodies are stored once under the SHA-256 of their contents
+    (objects/ab/abcd....gz); each query has a small entry naming its body and
+    when it was fetched (queries/<key>.json). Queries are keyed with the server's
+    base URL, so a stub server never shares entries with Space-Track. Entries
+    older than their request class's TTL are refetched, except in `offline`
+    mode, where every query is answered from the cache or raises CacheMiss.
+    Empty bodies and error messages are never stored.
+    """
+
+    def __init__(self, directory=CACHE_DIR, offline=OFFLINE, ttls=TTLS, clock=time.time):
+        self.directory = directory
+        self.offline = offline
+        self.ttls = ttls
+        self.clock = clock
+
+    def key(self, base_url, request_class, fmt, predicates):
+        query = {'url': base_url.rstrip("/"), 'class': request_class, 'format': fmt,
+                 'predicates': sorted((name, normalize_predicate(value)) for name, value in predicates.items())}
+        return hashlib.sha256(json.dumps(query, sort_keys=True).encode()).hexdigest(), query
+
+    def ttl(self, request_class, predicates):
+        """Seconds a response stays fresh, or None if it never changes."""
+        if request_class == 'gp_history' and 'epoch' in predicates:
+            epoch = predicates['epoch']
+            end = epoch[1] if isinstance(epoch, tuple) else str(epoch).split('--')[-1]
+            try:
+                end = datetime.date.fromisoformat(str(end)[:10])
+            except ValueError:
+                end = None
+            if end is not None and end < datetime.date.today() - datetime.timedelta(days=IMMUTABLE_AFTER_DAYS):
+                return None
+        return self.ttls.get(request_class, DEFAULT_TTL)
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, "queries", key + ".json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest + ".gz")
+
+    def lookup(self, base_url, request_class, fmt, predicates):
+        """Path of the cached body of a query, or None if it is missing or stale (stale is fine offline)."""
+        key, _ = self.key(base_url, request_class, fmt, predicates)
+        try:
+            with open(self._entry_path(key)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        path = self._object_path(entry['digest'])
+        if not os.path.exists(path):
+            return None
+        ttl = self.ttl(request_class, predicates)
+        if not self.offline and ttl is not None and self.clock() - entry['fetched'] > ttl:
+            return None
+        return path
+
+    def store(self, base_url, request_class, fmt, predicates, chunks):
+        """Save a response body arriving as byte `chunks` and return its path, or None if it is empty.
+
+        The body is compressed to a temporary file as it arrives and only
+        filed under its digest once complete, so a broken download leaves
+        nothing behind. A body holding an error message raises SpaceTrackError.
+        """
+        key, query = self.key(base_url, request_class, fmt, predicates)
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "queries"), exist_ok=True)
+        # Unique per process and thread, as several runs may share the cache
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp = os.path.join(self.directory, "objects", f"{key}.{suffix}")
+        digest = hashlib.sha256()
+        head = b""
+        try:
+            with gzip.open(tmp, 'wb') as f:
+                for chunk in chunks:
+                    if len(head) < ERROR_PEEK:
+                        head += chunk[:ERROR_PEEK - len(head)]
+                    digest.update(chunk)
+                    f.write(chunk)
+            if not head:
+                return None
+            message = error_message(head)
+            if message is not None:
+                raise SpaceTrackError(f"Space-Track error for {request_class} query: {message}")
+            path = self._object_path(digest.hexdigest())
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        entry_tmp = f"{self._entry_path(key)}.{suffix}"
+        with open(entry_tmp, 'w') as f:
+            json.dump({'query': query, 'digest': digest.hexdigest(), 'fetched': self.clock()}, f)
+        os.replace(entry_tmp, self._entry_path(key))
+        return path
+
+    @staticmethod
+    def read_text(path):
+        with gzip.open(path, 'rb') as f:
+            return f.read().decode('utf-8')
+
+    @staticmethod
+    def iter_lines(path):
+        with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+            for line in f:
+                yield line.rstrip('\r\n')
+
+
+class SpaceTrackSession:
+    """Logged-in Space-Track session that can be shared between threads."""
+
+    def __init__(self, identity, password, base_url=BASE_URL, limiter=None, cache=None):
+        self.identity = identity
+        self.password = password
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or RateLimiter()
+        self.session = requests.Session()
+        self.login_lock = threading.Lock()
+        self.logged_in = False
+        # With a ResponseCache, queries it can answer make no request at all
+        self.cache = cache
+
+    def login(self):
+        with self.login_lock:
+            if self.logged_in:
+                return
+            self.limiter.acquire()
+            response = self.session.post(f"{self.base_url}/ajaxauth/login",
+                                         data={'identity': self.identity, 'password': self.password})
+            if response.status_code != 200:
+                raise requests.HTTPError(f"Authentication failed. Status code: {response.status_code}",
+                                         response=response)
+            self.logged_in = True
+
+    def query_url(self, request_class, fmt, predicates):
+        parts = [f"{self.base_url}/basicspacedata/query/class/{request_class}"]
+        for name, value in predicates.items():
+            parts.append(f"{name}/{format_predicate(value)}")
+        parts.append(f"format/{fmt}")
+        return "/".join(parts)
+
+    def get(self, url, stream=False):
+        """GET `url` under the rate limiter, retrying throttled and failed requests.
+
+        With `stream`, only the headers have been read when the response is
+        returned; the body is read as it is iterated over.
+        """
+        self.login()
+        for attempt in range(MAX_RETRIES + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(url, timeout=TIMEOUT, stream=stream)
+            except requests.ConnectionError:
+                if attempt == MAX_RETRIES:
+                    raise
+            else:
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    return response
+                if attempt == MAX_RETRIES:
+                    response.raise_for_status()
+                response.close()
+            time.sleep(BACKOFF * 2**attempt)
+
+    def _cached(self, request_class, fmt, predicates):
+        if self.cache is None:
+            return None
+        path = self.cache.lookup(self.base_url, request_class, fmt, predicates)
+        if path is None and self.cache.offline:
+            raise CacheMiss(self.query_url(request_class, fmt, predicates))
+        return path
+
+    def query(self, request_class, fmt='json', **predicates):
+        """Run a basicspacedata query and return the response body as text."""
+        path = self._cached(request_class, fmt, predicates)
+        if path is not None:
+            return self.cache.read_text(path)
+        response = self.get(self.query_url(request_class, fmt, predicates))
+        message = error_message(response.content[:ERROR_PEEK])
+        if message is not None:
+            raise SpaceTrackError(f"Space-Track error for {request_class} query: {message}", response=response)
+        if self.cache is not None:
+            self.cache.store(self.base_url, request_class, fmt, predicates, [response.content])
+        return response.text
+
+    def query_lines(self, request_class, fmt='csv', **predicates):
+        """Run a basicspacedata query and yield the lines of the response body as they arrive.
+
+        With a cache, the body is streamed to disk first and the lines are read back from there.
+        """
+        path = self._cached(request_class, fmt, predicates)
+        if path is None and self.cache is not None:
+            with self.get(self.query_url(request_class, fmt, predicates), stream=True) as response:
+                path = self.cache.store(self.base_url, request_class, fmt, predicates,
+                                        response.iter_content(1 << 16))
+            if path is None:
+                return
+        if path is not None:
+            yield from self.cache.iter_lines(path)
+            return
+        with self.get(self.query_url(request_class, fmt, predicates), stream=True) as response:
+            response.encoding = response.encoding or 'utf-8'
+            lines = response.iter_lines(decode_unicode=True)
+            first = next(lines, None)
+            if first is None:
+                return
+            message = error_message(first.encode())
+            if message is not None:
+                raise SpaceTrackError(f"Space-Track error for {request_class} query: {message}", response=response)
+            yield first
+            yield from lines
@@ -0,0 +1,52 @@
+import os
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# The scripts import each other as top-level modules from Code/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers each request with the server's `respond(method, path)`: (status, body[, bytes to send])."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.reply(*self.server.respond('POST', urllib.parse.unquote(self.path)))
+
+    def do_GET(self):
+        self.reply(*self.server.respond('GET', urllib.parse.unquote(self.path)))
+
+    def reply(self, status, body, sent=None):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # A response cut short announces its full length but drops the connection part way
+        self.wfile.write(body if sent is None else body[:sent])
+        if sent is not None:
+            self.close_connection = True
+
+
+@pytest.fixture
+def stub_server():
+    """Start a local stand-in for Space-Track: call it with a `respond` function, get its base URL."""
+    servers = []
+
+    def start(respond):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        server.respond = respond
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,41 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from cdm_dataset import build_cdm_dataset, build_satellite_table, load_cdms
+
+HEADER = "CDM_ID,TCA,SAT1_OBJECT_DESIGNATOR,SAT2_OBJECT_DESIGNATOR,COLLISION_PROBABILITY\n"
+
+
+def test_unparseable_values_are_counted(tmp_path, capsys):
+    csv_file = tmp_path / "output.csv"
+    csv_file.write_text(HEADER +
+                        "1,2020-01-01 00:00:00.000,25544,5,0.001\n"
+                        "2,2020-01-02 00:00:00.000,25544,5,NULL\n"
+                        "3,not a date,25544,5,\n")
+    build_cdm_dataset(str(csv_file), str(tmp_path / "cdms"), chunk_rows=2)
+    assert "COLLISION_PROBABILITY: 1, TCA: 1" in capsys.readouterr().out
+
+    cdms = load_cdms(csv_file=str(csv_file), dataset_dir=str(tmp_path / "cdms")).sort_values('CDM_ID')
+    assert cdms['CDM_ID'].tolist() == [1, 2, 3]
+    assert cdms['COLLISION_PROBABILITY'].isna().tolist() == [False, True, True]
+
+
+@pytest.mark.parametrize("designator", ["25544A", "5.5"])
+def test_malformed_designators_raise(tmp_path, designator):
+    csv_file = tmp_path / "output.csv"
+    csv_file.write_text(HEADER +
+                        "1,2020-01-01 00:00:00.000,25544,5,0.001\n"
+                        f"2,2020-01-02 00:00:00.000,{designator},5,0.001\n")
+    with pytest.raises(ValueError, match=f"SAT1_OBJECT_DESIGNATOR '{designator}' on data row 2"):
+        build_cdm_dataset(str(csv_file), str(tmp_path / "cdms"), chunk_rows=1)
+    assert not (tmp_path / "cdms").exists()
+
+
+def test_blank_designators_are_missing(tmp_path, capsys):
+    csv_file = tmp_path / "satellites.csv"
+    csv_file.write_text("NORAD_CAT_ID,ALTITUDE\n25544,400\n,\n")
+    table_file = str(tmp_path / "satellites.parquet")
+    build_satellite_table(str(csv_file), table_file)
+    assert "Warning" not in capsys.readouterr().out
+    satellites = pq.read_table(table_file).to_pandas()
+    assert pd.isna(satellites['NORAD_CAT_ID'][1]) and satellites['NORAD_CAT_ID'][0] == 25544
@@ -0,0 +1,76 @@
+import csv
+import random
+from datetime import datetime, timedelta
+import cdm_dedupe
+from cdm_dedupe import DATE_FORMAT, dedupe_cdms
+
+HEADERS = ['CDM_ID', 'CREATION_DATE', 'TCA', 'COLLISION_PROBABILITY', 'SAT1_OBJECT_DESIGNATOR', 'SAT1_OBJECT_TYPE',
+           'SAT2_OBJECT_DESIGNATOR', 'SAT2_OBJECT_TYPE', 'NOTE']
+
+
+def write_cdms(filename, rows):
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+
+
+def read_ids(filename):
+    with open(filename, newline='', encoding='utf-8') as f:
+        return [row['CDM_ID'] for row in csv.DictReader(f)]
+
+
+def test_keeps_cdm_created_closest_to_tca(tmp_path):
+    tca = '2023-09-02 10:00:00.000000'
+    rows = [
+        ['1', '2023-09-01 00:00:00.000000', tca, '1e-5', '200', 'PAYLOAD', '100', 'DEBRIS', ''],
+        ['2', '2023-09-01 00:00:00.000000', '2023-09-05 00:00:00.000000', '1e-5', '300', 'PAYLOAD', '1', 'DEBRIS', ''],
+        # Same conjunction with the satellites swapped, created closer to TCA
+        ['3', '2023-09-02 06:00:00.000000', tca, '1e-4', '100', 'DEBRIS', '200', 'PAYLOAD', 'a, "quoted"\nnote'],
+        ['4', '2023-09-02 09:00:00.000000', tca, 'NULL', '100', 'DEBRIS', '200', 'PAYLOAD', ''],
+        ['5', '2023-09-02 09:30:00.000000', tca, '1e-5', '100', 'UNKNOWN', '200', 'PAYLOAD', ''],
+    ]
+    write_cdms(tmp_path / "cdms.csv", rows)
+    dedupe_cdms(str(tmp_path / "cdms.csv"), str(tmp_path / "out.csv"), str(tmp_path / "satcats.csv"))
+    assert read_ids(tmp_path / "out.csv") == ['3', '2']
+    with open(tmp_path / "satcats.csv") as f:
+        assert f.read().split() == ['1', '100', '200', '300']
+
+
+def test_spilled_output_matches_in_memory(tmp_path):
+    rows = [[str(i), f'2023-09-01 {i % 24:02d}:00:00.000000', f'2023-09-0{i % 3 + 2} 00:00:00.000000', '1e-5',
+             str(i % 7), 'PAYLOAD', str(i % 5 + 10), 'DEBRIS', 'x' * (i % 13)] for i in range(500)]
+    write_cdms(tmp_path / "cdms.csv", rows)
+    dedupe_cdms(str(tmp_path / "cdms.csv"), str(tmp_path / "a.csv"), str(tmp_path / "a_sat.csv"))
+    dedupe_cdms(str(tmp_path / "cdms.csv"), str(tmp_path / "b.csv"), str(tmp_path / "b_sat.csv"), max_row_bytes=2000)
+    assert (tmp_path / "a.csv").read_bytes() == (tmp_path / "b.csv").read_bytes()
+
+
+def scan_ids(rows):
+    # The original single-pass dictionary scan, on (id, created, tca, sat1, sat2) tuples
+    best = {}
+    for cdm_id, created, tca, sat1, sat2 in rows:
+        key = (frozenset([sat1, sat2]), tca.date())
+        incumbent = best.get(key)
+        if incumbent is None or (created and (incumbent[1] is None or abs(tca - created) < abs(tca - incumbent[1]))):
+            best[key] = (cdm_id, created)
+    return [cdm_id for cdm_id, _ in best.values()]
+
+
+def test_spilled_key_runs_match_dictionary_scan(tmp_path, monkeypatch):
+    rng = random.Random(3)
+    base = datetime(2023, 9, 1)
+    cdms = []
+    for i in range(3000):
+        sat1, sat2 = rng.sample(['1', '2', '3', '10', '25544'], 2)
+        # Few distinct TCAs per day, so stretches sharing a TCA are common; some CDMs come after TCA
+        tca = base + timedelta(days=rng.randrange(10), hours=rng.choice([1, 7, 13, 22]))
+        created = tca + timedelta(minutes=rng.randrange(-3000, 300)) if rng.random() > 0.05 else None
+        cdms.append((str(i), created, tca, sat1, sat2))
+    write_cdms(tmp_path / "cdms.csv", [[cdm_id, created.strftime(DATE_FORMAT) if created else 'garbage',
+                                        tca.strftime(DATE_FORMAT), '1e-5', sat1, 'PAYLOAD', sat2, 'DEBRIS', '']
+                                       for cdm_id, created, tca, sat1, sat2 in cdms])
+    monkeypatch.setattr(cdm_dedupe, 'RUN_BLOCK', 17)
+    dedupe_cdms(str(tmp_path / "cdms.csv"), str(tmp_path / "out.csv"), str(tmp_path / "satcats.csv"),
+                max_row_bytes=5000, max_key_bytes=4000, chunk_rows=250)
+    assert read_ids(tmp_path / "out.csv") == scan_ids(cdms)
@@ -0,0 +1,83 @@
+import csv
+import io
+import pytest
+import requests
+from cdm_public import COLUMNS, fetch_public_cdms, load_cursor
+from spacetrack_api import ResponseCache, SpaceTrackSession
+
+HEADER = ['CDM_ID', 'CREATED', 'EMERGENCY_REPORTABLE', 'TCA', 'MIN_RNG', 'PC', 'SAT_1_ID', 'SAT_1_NAME',
+          'SAT1_OBJECT_TYPE', 'SAT1_RCS', 'SAT_1_EXCL_VOL', 'SAT_2_ID', 'SAT_2_NAME', 'SAT2_OBJECT_TYPE', 'SAT2_RCS',
+          'SAT_2_EXCL_VOL']
+RECORDS = [[str(1000 + i), f'2023-09-{i % 28 + 1:02d} 03:13:06', 'N', f'2023-09-{i % 28 + 1:02d} 10:47:21.581000',
+            str(i), '' if i % 4 == 0 else '1e-5', str(i % 7), 'NAME, "X"', 'PAYLOAD', 'LARGE', '5.00',
+            str(i % 5 + 10), 'DEBRIS', 'DEBRIS', 'SMALL', '5.00'] for i in range(1, 26)]
+
+
+class CdmPublicStub:
+    """Serves RECORDS as cdm_public CSV pages by CDM_ID cursor; can cut one GET short mid-body."""
+
+    def __init__(self, cut=None):
+        self.cut = cut
+        self.queries = []
+
+    def __call__(self, method, path):
+        if method == 'POST':
+            return 200, b""
+        parts = path.split('/')
+        predicates = dict(zip(parts[5::2], parts[6::2]))
+        self.queries.append(predicates.get('CDM_ID'))
+        after = int(predicates.get('CDM_ID', '>0')[1:])
+        page = [record for record in RECORDS if int(record[0]) > after][:int(predicates['limit'])]
+        out = io.StringIO()
+        writer = csv.writer(out, quoting=csv.QUOTE_ALL)
+        writer.writerow(HEADER)
+        writer.writerows(page)
+        body = out.getvalue().encode()
+        if len(self.queries) == self.cut:
+            return 200, body, len(body) // 2
+        return 200, body
+
+
+def read_raw(filename):
+    with open(filename, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+def test_pages_resume_after_cut_page(tmp_path, stub_server):
+    raw_file = str(tmp_path / "cdm_public.csv")
+    stub = CdmPublicStub(cut=2)
+    session = SpaceTrackSession('user', 'pass', base_url=stub_server(stub))
+
+    with pytest.raises(requests.RequestException):
+        fetch_public_cdms(session, raw_file, page_size=10)
+    # Only the complete first page is committed to the cursor
+    assert load_cursor(raw_file)[0] == 1010
+
+    assert fetch_public_cdms(session, raw_file, page_size=10) == 15
+    assert stub.queries == [None, '>1010', '>1010', '>1020']
+    rows = read_raw(raw_file)
+    assert rows[0] == COLUMNS
+    assert [row[0] for row in rows[1:]] == [record[0] for record in RECORDS]
+    assert rows[2][COLUMNS.index('SAT1_OBJECT_NAME')] == 'NAME, "X"'
+    assert rows[4][COLUMNS.index('COLLISION_PROBABILITY')] == 'NULL'
+    assert rows[1][COLUMNS.index('CREATION_DATE')] == '2023-09-02 03:13:06.000000'
+
+    # Nothing new: one query past the cursor, and the file is unchanged
+    assert fetch_public_cdms(session, raw_file, page_size=10) == 0
+    assert stub.queries[-1] == '>1025'
+    assert read_raw(raw_file) == rows
+
+
+def test_offline_replay_ends_at_uncached_page(tmp_path, stub_server):
+    stub = CdmPublicStub()
+    online = SpaceTrackSession('user', 'pass', base_url=stub_server(stub), cache=ResponseCache(str(tmp_path / "cache")))
+    assert fetch_public_cdms(online, str(tmp_path / "online.csv"), page_size=10) == 25
+
+    # Replayed from the cache, without the server, into a fresh file; the page past its end was never fetched
+    offline = SpaceTrackSession(None, None, base_url=online.base_url,
+                                cache=ResponseCache(str(tmp_path / "cache"), offline=True))
+    stub.queries.clear()
+    assert fetch_public_cdms(offline, str(tmp_path / "replay.csv"), page_size=10) == 25
+    assert fetch_public_cdms(offline, str(tmp_path / "replay.csv"), page_size=10) == 0
+    assert stub.queries == []
+    assert read_raw(tmp_path / "replay.csv") == read_raw(tmp_path / "online.csv")
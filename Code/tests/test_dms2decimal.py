@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from dms2decimal import decimal_to_sexagesimal, dms, hms, sexagesimal_to_decimal
+
+
+def test_strings_match_scalar_path():
+    values = ['150:15:32.8', '-00:30:00', '7 49', '-7 49 12', '10:01']
+    expected = [dms(value) for value in values]
+    assert np.allclose(dms(np.array(values)), expected)
+    assert dms('-00:30:00') == -0.5
+
+
+def test_trailing_blanks_keep_their_rows():
+    result = dms(pd.Series(['1:2:3', '', '']))
+    assert len(result) == 3
+    assert result[0] == pytest.approx(1 + 2 / 60 + 3 / 3600)
+    assert np.isnan(result[1:]).all()
+
+
+def test_nan_and_none_are_nan():
+    result = hms(pd.Series(['10:01:03.5', np.nan, None, ' ', '-00:30:00']))
+    assert len(result) == 5
+    assert np.isnan(result[[1, 2, 3]]).all()
+    assert result[0] == pytest.approx(10.0176389) and result[4] == -0.5
+
+
+def test_numeric_array_is_one_value():
+    assert dms(np.array([7, 49])) == pytest.approx(7 + 49 / 60)
+    assert dms(pd.Series([7, 49])) == pytest.approx(dms([7, 49]))
+
+
+def test_component_rows():
+    result = sexagesimal_to_decimal(np.array([[7, 49, 0], [-0., 30, 0]]))
+    assert np.allclose(result, [7 + 49 / 60, -0.5])
+
+
+def test_round_trip():
+    values = np.array([18.235097, -0.5, 0.0])
+    strings = decimal_to_sexagesimal(values, output_string=True)
+    assert np.allclose(dms(strings), values, atol=1e-5)
+
+
+def test_malformed_components_raise():
+    with pytest.raises(ValueError):
+        sexagesimal_to_decimal(np.zeros((2, 4)))
+    with pytest.raises(ValueError):
+        sexagesimal_to_decimal(np.zeros((2, 3, 1)))
@@ -0,0 +1,68 @@
+import os
+from datetime import datetime
+import numpy as np
+import pytest
+from ephemeris_cache import EPHEMERIS_DIR, EPHEMERIS_DTYPE
+from ephemeris_generator import write_ephemeris
+from fleet import Fleet
+
+T1 = datetime(2021, 1, 1)
+T2 = datetime(2021, 1, 2)
+
+
+def write_satellite(satcat, first, step_minutes, n, lon0):
+    times = np.datetime64(first, 'us') + np.arange(n) * np.timedelta64(step_minutes, 'm')
+    records = np.zeros(n, dtype=EPHEMERIS_DTYPE)
+    records['time'] = times
+    records['epoch'] = np.datetime64('2021-01-01', 'us')
+    records['lon'] = lon0 + np.arange(n) * 0.01
+    epochs = np.full(n, "21001.00000000")
+    write_ephemeris(os.path.join(EPHEMERIS_DIR, f"{satcat}.csv"), records, epochs)
+    return times
+
+
+@pytest.fixture
+def ephemeris_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(EPHEMERIS_DIR)
+
+
+def test_staggered_grids_read_own_samples(ephemeris_dir):
+    # One satellite on the minute, one 20 s later, one hourly
+    write_satellite(1, '2021-01-01T00:00:00', 1, 600, 10.0)
+    write_satellite(2, '2021-01-01T00:00:20', 1, 600, 20.0)
+    write_satellite(3, '2021-01-01T00:00:00', 60, 10, 30.0)
+    fleet = Fleet([1, 2, 3], T1, T2, columns=('lon',), workers=1)
+    # One regular axis at the finest step, not the union of all sample times
+    assert len(fleet.times) == 24 * 60 + 1
+    assert (np.diff(fleet.times) == np.timedelta64(1, 'm')).all()
+    assert fleet['lon'].shape == (3, len(fleet.times))
+
+    lon = fleet.at(np.datetime64('2021-01-01T01:00:00'))
+    assert lon == pytest.approx([10.6, 20.6, 30.01])
+    # Snapped to the 00:31 grid time: the hourly satellite is nearer its 01:00 sample there
+    lon = fleet.at(np.datetime64('2021-01-01T00:30:40'))
+    assert lon == pytest.approx([10.31, 20.31, 30.01])
+    assert list(fleet.in_slot(19, 21, np.datetime64('2021-01-01T01:00:00'))) == ['2']
+
+    # Past a satellite's last sample by more than a step it has no value
+    lon = fleet.at(np.array(['2021-01-01T09:58:00', '2021-01-01T12:00:00'], dtype='datetime64[us]'))
+    assert lon.shape == (3, 2)
+    assert np.isfinite(lon[:, 0]).all()
+    assert np.isnan(lon[:2, 1]).all()
+
+
+def test_empty_fleet(ephemeris_dir):
+    fleet = Fleet([], T1, T2, columns=('lon',), workers=1)
+    assert fleet.at(np.datetime64('2021-01-01T01:00:00')).shape == (0,)
+    assert fleet.time_index(np.datetime64('2021-01-01T01:00:00')) == -1
+    assert len(fleet.in_slot(0, 10, np.datetime64('2021-01-01T01:00:00'))) == 0
+
+
+def test_coarser_grid(ephemeris_dir):
+    write_satellite(1, '2021-01-01T00:00:00', 1, 600, 10.0)
+    write_satellite(2, '2021-01-01T00:00:20', 1, 600, 20.0)
+    fleet = Fleet([1, 2], T1, T2, columns=('lon',), workers=1, step=np.timedelta64(10, 'm'))
+    assert fleet['lon'].shape == (2, 24 * 6 + 1)
+    assert fleet.at(np.datetime64('2021-01-01T01:02:00')) == pytest.approx([10.6, 20.6])
+    assert np.isnan(fleet.at(np.datetime64('2021-01-01T11:00:00'))).all()
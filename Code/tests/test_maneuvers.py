@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from ephemeris_cache import EPHEMERIS_DTYPE
+from ephemeris_generator import write_ephemeris
+from maneuvers import detect_maneuvers, noise_scales, satellite_maneuvers, switch_deltas
+
+
+def synthetic_ephemeris(n_tles=400, samples_per_tle=30, seed=0):
+    """A GEO-like ephemeris with TLE fit noise on every switch and two real maneuvers."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2021-01-01T00:00:00', 'us')
+    tle_epochs = start + np.arange(n_tles) * np.timedelta64(12, 'h')
+    a = 42164.0 + rng.normal(0, 5.0, n_tles)
+    inc = 0.05 + rng.normal(0, 1e-4, n_tles)
+    a[150:] += 100.0  # along-track burn
+    inc[300:] += 0.5  # plane change
+    rows = n_tles * samples_per_tle
+    which = np.arange(rows) // samples_per_tle
+    records = np.zeros(rows, dtype=EPHEMERIS_DTYPE)
+    records['time'] = start + np.arange(rows) * np.timedelta64(24, 'm')
+    records['epoch'] = tle_epochs[which]
+    records['a'] = a[which]
+    records['inc'] = inc[which]
+    records['raan'] = 80.0
+    days = (tle_epochs - np.datetime64('2021-01-01', 'us')) / np.timedelta64(1, 'D') + 1
+    epochs = np.array([f"21{day:012.8f}" for day in days])[which]
+    return records, epochs
+
+
+def test_chunking_does_not_change_detections(tmp_path):
+    records, epochs = synthetic_ephemeris()
+    write_ephemeris(str(tmp_path / "12345.csv"), records, epochs)
+    whole = satellite_maneuvers("12345", chunk_rows=len(records), ephemeris_dir=str(tmp_path))
+    # Chunks this short leave a tail with a single TLE switch
+    chunked = satellite_maneuvers("12345", chunk_rows=31, ephemeris_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(whole, chunked)
+    assert set(whole['TIME']) == {records['time'][150 * 30], records['time'][300 * 30]}
+
+
+def test_short_window_uses_satellite_scales():
+    records, _ = synthetic_ephemeris()
+    args = [records[name] for name in ('time', 'epoch', 'a', 'inc', 'raan')]
+    whole = detect_maneuvers(1, *args)
+    assert len(whole) == 2
+    # A window holding a single noisy switch measures no noise of its own
+    switch, _, dv_along, dv_cross = switch_deltas(*args[1:])
+    noisy = switch[(np.abs(dv_along) > 0.1) & (switch < 100 * 30)][0]
+    window = [column[noisy - 1:noisy + 1] for column in args]
+    assert len(detect_maneuvers(1, *window)) == 1
+    scales = noise_scales(dv_along, dv_cross)
+    assert len(detect_maneuvers(1, *window, scales=scales)) == 0
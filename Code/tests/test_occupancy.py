@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from occupancy import OBJECT_TYPES, STATE_DTYPE, OccupancyCube, period_index, period_states
+from tle_elements import ELEMENT_DTYPE
+
+N_PERIODS = 12
+ORIGIN = np.datetime64('2021-01-01')
+OBJECT_TYPE = {1: 'PAYLOAD', 2: 'DEBRIS', 3: 'ROCKET BODY', 4: 'TBA'}
+
+
+def random_states(rng, n_objects=40):
+    # Per object: distinct sorted periods from before the origin to past the end of the cube
+    states = []
+    for satcat in range(1, n_objects + 1):
+        for period in sorted(rng.choice(np.arange(-4, N_PERIODS + 3), size=rng.integers(1, 6), replace=False)):
+            perigee = rng.uniform(0, 60)
+            states.append((satcat, period, period + rng.integers(0, 5), perigee, perigee + rng.uniform(0, 40)))
+    return np.array(states, dtype=STATE_DTYPE)
+
+
+def brute_cube(states, field, resolution, max_altitude):
+    n_bins = int(np.ceil(max_altitude / resolution)) + 1
+    cube = np.zeros((len(OBJECT_TYPES), N_PERIODS, n_bins), dtype=np.int32)
+    for i, state in enumerate(states):
+        end = state['stale'] + 1
+        if i + 1 < len(states) and states[i + 1]['satcat'] == state['satcat']:
+            end = min(states[i + 1]['period'], end)
+        kind = OBJECT_TYPE.get(int(state['satcat']), 'OTHER')
+        t = OBJECT_TYPES.index(kind if kind in OBJECT_TYPES else 'OTHER')
+        k = min(int(state[field] // resolution), n_bins - 1)
+        for p in range(max(state['period'], 0), min(end, N_PERIODS)):
+            cube[t, p, k] += 1
+    return cube
+
+
+def test_from_states_matches_brute_force():
+    rng = np.random.default_rng(1)
+    states = random_states(rng)
+    # satcat 40 is missing from the catalog
+    cube = OccupancyCube.from_states(states, ORIGIN, N_PERIODS, OBJECT_TYPE, resolution=5.0, max_altitude=50.0)
+    assert len(cube.periods) == N_PERIODS and cube.periods[0] == np.datetime64('2021-01')
+    assert (cube.perigee == brute_cube(states, 'perigee', 5.0, 50.0)).all()
+    assert (cube.apogee == brute_cube(states, 'apogee', 5.0, 50.0)).all()
+
+
+def test_shell_counts_match_brute_force():
+    rng = np.random.default_rng(2)
+    states = random_states(rng)
+    cube = OccupancyCube.from_states(states, ORIGIN, N_PERIODS, OBJECT_TYPE, resolution=1.0, max_altitude=200.0)
+    bins = np.array([0, 7, 15, 30, 31, 50, 90])
+    # Objects whose [perigee, apogee] reaches into each shell, period by period
+    expected = np.zeros((N_PERIODS, len(bins) - 1))
+    for i, state in enumerate(states):
+        end = state['stale'] + 1
+        if i + 1 < len(states) and states[i + 1]['satcat'] == state['satcat']:
+            end = min(states[i + 1]['period'], end)
+        for p in range(max(state['period'], 0), min(end, N_PERIODS)):
+            expected[p] += (state['perigee'] < bins[1:]) & (state['apogee'] >= bins[:-1])
+    assert cube.shell_counts(bins) == pytest.approx(expected.mean(axis=0))
+    assert cube.shell_counts(bins, '2021-03-01', '2021-06-01') == pytest.approx(expected[2:5].mean(axis=0))
+    assert (cube.population() == (cube.apogee.sum(axis=(0, 2)))).all()
+
+
+def test_period_states_keep_last_tle_per_period():
+    rng = np.random.default_rng(3)
+    elements = np.zeros(300, dtype=ELEMENT_DTYPE)
+    elements['satcat'] = rng.integers(1, 8, len(elements))
+    elements['epoch'] = ORIGIN - np.timedelta64(90, 'D') + rng.integers(0, 400, len(elements)).astype('timedelta64[D]')
+    elements['perigee'] = rng.uniform(0, 100, len(elements))
+    elements['apogee'] = elements['perigee'] + 10
+    elements['checksum_ok'] = rng.random(len(elements)) > 0.1
+    elements['perigee'][rng.random(len(elements)) < 0.05] = np.nan
+    elements = elements[np.lexsort((elements['epoch'], elements['satcat']))]
+
+    states = period_states(elements, ORIGIN, stale_days=30)
+    expected = {}
+    for element in elements:
+        if not element['checksum_ok'] or not np.isfinite(element['perigee']):
+            continue
+        stale = int(period_index(element['epoch'] + np.timedelta64(30, 'D'), ORIGIN))
+        if stale < 0:
+            continue
+        period = int(period_index(element['epoch'], ORIGIN))
+        expected[int(element['satcat']), period] = (stale, element['perigee'])
+    assert [(int(s['satcat']), int(s['period'])) for s in states] == list(expected)
+    assert [int(s['stale']) for s in states] == [stale for stale, _ in expected.values()]
+    assert list(states['perigee']) == [perigee for _, perigee in expected.values()]
@@ -0,0 +1,104 @@
+import pytest
+import requests
+import spacetrack_api
+from spacetrack_api import CacheMiss, RateLimiter, ResponseCache, SpaceTrackError, SpaceTrackSession
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def busiest_window(times, period):
+    return max(sum(1 for u in times if t <= u < t + period) for t in times)
+
+
+def test_limiter_never_exceeds_caps_from_the_start():
+    clock = FakeClock()
+    limiter = RateLimiter(limits=((30, 60.0), (300, 3600.0)), clock=clock, sleep=clock.sleep)
+    times = []
+    for _ in range(700):
+        limiter.acquire()
+        times.append(clock.now)
+    assert times[29] == 0.0 and times[30] == pytest.approx(60.0)
+    assert busiest_window(times, 60.0) == 30
+    assert busiest_window(times, 3600.0) == 300
+    assert times[300] == pytest.approx(3600.0)
+
+
+def test_throttled_stub_requests(stub_server):
+    clock = FakeClock()
+    seen = []
+
+    def respond(method, path):
+        if method == 'GET':
+            seen.append(clock.now)
+        return 200, b"[]"
+
+    url = stub_server(respond)
+    limiter = RateLimiter(limits=((3, 10.0),), clock=clock, sleep=clock.sleep)
+    session = SpaceTrackSession('user', 'pass', base_url=url, limiter=limiter)
+    for _ in range(8):
+        assert session.query('gp', norad_cat_id=5) == "[]"
+    # The login takes the first slot
+    assert seen == pytest.approx([0, 0, 10, 10, 10, 20, 20, 20])
+
+
+def test_retries_throttled_and_failed_requests(stub_server, monkeypatch):
+    monkeypatch.setattr(spacetrack_api, 'BACKOFF', 0.001)
+    statuses = iter([429, 503, 200])
+    paths = []
+
+    def respond(method, path):
+        if method == 'POST':
+            return 200, b""
+        paths.append(path)
+        return next(statuses), b"1 00005U"
+
+    url = stub_server(respond)
+    session = SpaceTrackSession('user', 'pass', base_url=url)
+    assert session.query('gp_history', fmt='tle', norad_cat_id=[5, 7]) == "1 00005U"
+    assert paths == ["/basicspacedata/query/class/gp_history/norad_cat_id/5,7/format/tle"] * 3
+
+    statuses = iter([500] * (spacetrack_api.MAX_RETRIES + 1))
+    with pytest.raises(requests.HTTPError):
+        session.query('gp', norad_cat_id=5)
+
+
+def test_cache_never_stores_errors_or_empty_bodies(tmp_path, stub_server):
+    bodies = iter([b'{"error":"You\'ve violated your query rate limit."}', b"", b"1 00005U", b"unused"])
+    gets = []
+
+    def respond(method, path):
+        if method == 'POST':
+            return 200, b""
+        gets.append(path)
+        return 200, next(bodies)
+
+    session = SpaceTrackSession('user', 'pass', base_url=stub_server(respond), cache=ResponseCache(str(tmp_path)))
+    # Epochs long past are cached for good, so a stored error would never be refetched
+    old = {'norad_cat_id': 5, 'epoch': ('2020-01-01', '2020-02-01')}
+    with pytest.raises(SpaceTrackError):
+        list(session.query_lines('gp_history', fmt='tle', **old))
+    assert list(session.query_lines('gp_history', fmt='tle', **old)) == []
+    assert list(session.query_lines('gp_history', fmt='tle', **old)) == ["1 00005U"]
+    assert list(session.query_lines('gp_history', fmt='tle', **old)) == ["1 00005U"]
+    assert len(gets) == 3
+
+    offline = SpaceTrackSession(None, None, cache=ResponseCache(str(tmp_path), offline=True))
+    with pytest.raises(CacheMiss):
+        offline.query('gp_history', fmt='tle', norad_cat_id=5, epoch=('2020-02-01', '2020-03-01'))
+
+
+def test_cache_is_keyed_on_server(tmp_path, stub_server):
+    stub = stub_server(lambda method, path: (200, b"stub"))
+    other = stub_server(lambda method, path: (200, b"other"))
+    cache = ResponseCache(str(tmp_path))
+    assert SpaceTrackSession('user', 'pass', base_url=stub, cache=cache).query('gp', norad_cat_id=5) == "stub"
+    assert SpaceTrackSession('user', 'pass', base_url=other, cache=cache).query('gp', norad_cat_id=5) == "other"
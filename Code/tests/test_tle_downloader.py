@@ -0,0 +1,32 @@
+import datetime
+from tle_downloader import SETTLE_DAYS, download_histories, load_manifest, plan_downloads, plan_windows
+
+
+class EmptySession:
+    """Answers every gp_history query with no TLEs."""
+
+    def query(self, request_class, **predicates):
+        return ""
+
+
+def test_unsettled_tail_stays_missing(tmp_path):
+    today = datetime.date.today()
+    windows = plan_windows({'5': [today - datetime.timedelta(days=10)], '7': [today]}, today=today)
+    plan = plan_downloads(windows, str(tmp_path), {})
+    assert download_histories(EmptySession(), plan, str(tmp_path), workers=1) == []
+
+    settled = today - datetime.timedelta(days=SETTLE_DAYS)
+    manifest = load_manifest(str(tmp_path))
+    assert manifest['5']['covered'] == [[str(windows['5'][0][0]), str(settled)]]
+    assert manifest['7']['covered'] == [[str(windows['7'][0][0]), str(settled)]]
+    # The next run asks again for the days since the settling cutoff, and nothing older
+    assert plan_downloads(windows, str(tmp_path), manifest) == {(settled, today + datetime.timedelta(days=1)): ['5', '7']}
+
+
+def test_range_entirely_unsettled_is_not_covered(tmp_path):
+    today = datetime.date.today()
+    epoch_range = (today - datetime.timedelta(days=1), today + datetime.timedelta(days=1))
+    download_histories(EmptySession(), {epoch_range: ['5']}, str(tmp_path), workers=1)
+    manifest = load_manifest(str(tmp_path))
+    assert manifest['5']['covered'] == []
+    assert plan_downloads({'5': [epoch_range]}, str(tmp_path), manifest) == {epoch_range: ['5']}
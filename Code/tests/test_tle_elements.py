@@ -0,0 +1,34 @@
+import numpy as np
+from tle_archive import LINE_DTYPE, build_archive, open_archive
+from tle_elements import parse_lines, split_lines, tle_epochs
+from tle_index import read_tle_file
+
+ISS = ("1 25544U 98067A   20001.50000000  .00001264  00000-0  29621-4 0  9993",
+       "2 25544  51.6443 125.1458 0005222 139.9530 332.5428 15.49549140205882")
+
+
+def test_split_lines_empty_buffer():
+    lines = split_lines(b'')
+    assert lines.shape == (0, 2) and lines.dtype == np.dtype(LINE_DTYPE)
+    assert len(tle_epochs(lines)) == 0
+    assert len(parse_lines(lines)) == 0
+
+
+def test_split_lines_blank_lines_only():
+    assert split_lines(b'\n\n').shape == (0, 2)
+
+
+def test_read_empty_history_file(tmp_path):
+    (tmp_path / "99999.txt").write_text("")
+    epochs, lines = read_tle_file(str(tmp_path / "99999.txt"))
+    assert len(epochs) == 0 and lines.shape == (0, 2)
+
+
+def test_build_archive_with_empty_history(tmp_path):
+    (tmp_path / "25544.txt").write_text("\n".join(ISS) + "\n")
+    (tmp_path / "99999.txt").write_text("")
+    build_archive(str(tmp_path))
+    archive = open_archive(str(tmp_path / "archive"))
+    epochs, lines = archive.lookup("25544")
+    assert lines[0, 0].decode() == ISS[0]
+    assert len(archive.lookup("99999")[0]) == 0
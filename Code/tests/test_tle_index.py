@@ -0,0 +1,53 @@
+import os
+import numpy as np
+from tle_archive import INDEX_DTYPE, INDEX_FILE, build_archive, current_archive, open_archive
+from tle_index import get_tle_index
+
+ISS = ("1 25544U 98067A   20001.50000000  .00001264  00000-0  29621-4 0  9993",
+       "2 25544  51.6443 125.1458 0005222 139.9530 332.5428 15.49549140205882")
+LATER = (ISS[0].replace("20001.50000000", "20003.50000000"), ISS[1])
+
+
+def write_history(filename, pairs, mtime):
+    with open(filename, 'w') as f:
+        f.write("".join(f"{line1}\n{line2}\n" for line1, line2 in pairs))
+    os.utime(filename, ns=(mtime, mtime))
+
+
+def test_changed_history_is_read_past_stale_archive(tmp_path, capsys):
+    tle_dir = str(tmp_path)
+    write_history(tmp_path / "25544.txt", [ISS], 10**18)
+    write_history(tmp_path / "5.txt", [ISS], 10**18)
+    build_archive(tle_dir)
+    assert len(get_tle_index("25544", tle_dir)) == 1
+
+    # The downloader merges a new TLE into the text file after the archive was built
+    write_history(tmp_path / "25544.txt", [LATER, ISS], 10**18 + 10**9)
+    index = get_tle_index("25544", tle_dir)
+    assert len(index) == 2 and index.nearest(np.datetime64('2020-01-04'))[0] == LATER[0]
+
+    archive = open_archive(str(tmp_path / "archive"))
+    assert archive.stale(tle_dir) == ["25544"]
+    assert archive.lookup("25544", str(tmp_path / "25544.txt")) is None
+    capsys.readouterr()
+    archive = current_archive(tle_dir)
+    assert "(1 files read)" in capsys.readouterr().out
+    assert archive.stale(tle_dir) == []
+    assert len(archive.lookup("25544")[0]) == 2 and len(archive.lookup("5")[0]) == 1
+    assert len(get_tle_index("25544", tle_dir)) == 2
+
+
+def test_archive_without_stamps_is_never_current(tmp_path):
+    write_history(tmp_path / "25544.txt", [ISS], 10**18)
+    build_archive(str(tmp_path))
+    # An index as written before file stamps were recorded
+    index_file = str(tmp_path / "archive" / INDEX_FILE)
+    old_dtype = [(name, INDEX_DTYPE[name]) for name in ('satcat', 'start', 'count')]
+    old = np.load(index_file)[['satcat', 'start', 'count']].astype(old_dtype)
+    np.save(index_file, old)
+    os.utime(index_file, ns=(10**18 + 5, 10**18 + 5))
+
+    archive = open_archive(str(tmp_path / "archive"))
+    assert archive.lookup("25544") is not None
+    assert archive.lookup("25544", str(tmp_path / "25544.txt")) is None
+    assert archive.stale(str(tmp_path)) == ["25544"]
@@ -0,0 +1,164 @@
+import os
+import glob
+from functools import lru_cache
+import numpy as np
+
+# Files making up an archive directory
+EPOCHS_FILE = "epochs.npy"  # datetime64[us] epochs, sorted within each satellite
+LINES_FILE = "lines.npy"  # (n, 2) fixed-width TLE line pairs
+INDEX_FILE = "index.npy"  # per-satellite offset table, sorted by satcat
+
+LINE_DTYPE = 'S69'
+# Each satellite's rows, and the size and mtime (ns) of the text file they were read from
+INDEX_DTYPE = np.dtype([('satcat', 'U16'), ('start', 'i8'), ('count', 'i8'), ('size', 'i8'), ('mtime', 'i8')])
+
+
+def file_stamp(filename):
+    """(size, mtime in ns) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def archive_dir_for(tle_dir):
+    """Default archive location for a directory of per-satellite TLE text files."""
+    return os.path.join(tle_dir, "archive")
+
+
+def build_archive(tle_dir, archive_dir=None):
+    """Pack every <satcat>.txt in `tle_dir` into one columnar, memory-mappable archive.
+
+    Satellites whose text file is unchanged since the previous build are
+    copied from the old archive; only new or changed files are parsed again.
+    """
+    from tle_index import read_tle_file
+
+    archive_dir = archive_dir or archive_dir_for(tle_dir)
+    os.makedirs(archive_dir, exist_ok=True)
+    previous = open_archive(archive_dir)
+
+    filenames = sorted(glob.glob(os.path.join(tle_dir, "*.txt")))
+    index = np.zeros(len(filenames), dtype=INDEX_DTYPE)
+    all_epochs = []
+    all_lines = []
+    start = 0
+    parsed = 0
+    for i, filename in enumerate(filenames):
+        satcat = os.path.splitext(os.path.basename(filename))[0]
+        stamp = file_stamp(filename)
+        found = previous.lookup(satcat, filename) if previous is not None else None
+        if found is None:
+            found = read_tle_file(filename)
+            parsed += 1
+        epochs, lines = np.array(found[0]), np.array(found[1])
+        index[i] = (satcat, start, len(epochs)) + stamp
+        all_epochs.append(epochs)
+        all_lines.append(lines)
+        start += len(epochs)
+    index.sort(order='satcat')
+    # Let go of the old archive's memory maps before its files are replaced
+    previous = found = None
+    _open_archive.cache_clear()
+
+    epochs = np.concatenate(all_epochs) if all_epochs else np.zeros(0, dtype='datetime64[us]')
+    lines = np.concatenate(all_lines) if all_lines else np.zeros((0, 2), dtype=LINE_DTYPE)
+    # Write each column beside its final name and swap them in, so readers never see a torn archive
+    for name, array in [(EPOCHS_FILE, epochs), (LINES_FILE, lines), (INDEX_FILE, index)]:
+        tmp = os.path.join(archive_dir, name + ".tmp")
+        with open(tmp, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, os.path.join(archive_dir, name))
+    print(f"Archived {start} TLEs for {len(filenames)} satellites to {archive_dir} ({parsed} files read)")
+
+
+class TLEArchive:
+    """Read-only view of a TLE archive; all arrays are memory-mapped, lookups never copy."""
+
+    def __init__(self, archive_dir):
+        self.epochs = np.load(os.path.join(archive_dir, EPOCHS_FILE), mmap_mode='r')
+        self.lines = np.load(os.path.join(archive_dir, LINES_FILE), mmap_mode='r')
+        self.index = np.load(os.path.join(archive_dir, INDEX_FILE))
+
+    def __contains__(self, satcat):
+        return self._find(satcat) is not None
+
+    def _find(self, satcat):
+        satcat = str(satcat)
+        i = np.searchsorted(self.index['satcat'], satcat)
+        if i < len(self.index) and self.index['satcat'][i] == satcat:
+            return self.index[i]
+        return None
+
+    @property
+    def satcats(self):
+        return self.index['satcat']
+
+    def is_current(self, entry, filename):
+        # Archives built before the file stamps were recorded are never current
+        if 'mtime' not in entry.dtype.names:
+            return False
+        stamp = file_stamp(filename)
+        return stamp is None or stamp == (entry['size'], entry['mtime'])
+
+    def lookup(self, satcat, filename=None):
+        """Return (epochs, lines) views for `satcat`, or None if it is not archived.
+
+        Given the satellite's text file, None is also returned when that file
+        has changed since the archive was built, so the caller reads the file.
+        """
+        entry = self._find(satcat)
+        if entry is None or (filename is not None and not self.is_current(entry, filename)):
+            return None
+        rows = slice(entry['start'], entry['start'] + entry['count'])
+        return self.epochs[rows], self.lines[rows]
+
+    def stale(self, tle_dir):
+        """NORAD IDs whose <satcat>.txt in `tle_dir` is new or has changed since the archive was built."""
+        stale = []
+        for filename in glob.glob(os.path.join(tle_dir, "*.txt")):
+            satcat = os.path.splitext(os.path.basename(filename))[0]
+            entry = self._find(satcat)
+            if entry is None or not self.is_current(entry, filename):
+                stale.append(satcat)
+        return sorted(stale)
+
+
+@lru_cache(maxsize=8)
+def _open_archive(archive_dir, stamp):
+    # `stamp` is the index file's, so a rebuilt archive is opened afresh
+    return TLEArchive(archive_dir)
+
+
+def open_archive(archive_dir):
+    """Open the archive in `archive_dir`, or return None if it has not been built.
+
+    Opened archives are cached until the archive is rebuilt.
+    """
+    stamp = file_stamp(os.path.join(archive_dir, INDEX_FILE))
+    if stamp is None:
+        return None
+    try:
+        return _open_archive(archive_dir, stamp)
+    except FileNotFoundError:
+        return None
+
+
+def current_archive(tle_dir):
+    """Open the archive of `tle_dir`, first rebuilding it if any text file changed since it was built.
+
+    Returns None if no archive has been built.
+    """
+    archive = open_archive(archive_dir_for(tle_dir))
+    stale = archive.stale(tle_dir) if archive is not None else []
+    if stale:
+        print(f"TLE archive is out of date for {len(stale)} satellites; rebuilding it")
+        build_archive(tle_dir)
+        archive = open_archive(archive_dir_for(tle_dir))
+    return archive
+
+
+if __name__ == "__main__":
+    from tle_index import TLE_DIR
+    build_archive(TLE_DIR)
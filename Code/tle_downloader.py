@@ -0,0 +1,253 @@
+import os
+import json
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from tle_index import tle_epoch
+
+# Requests kept in flight at once; the shared rate limiter still caps the overall request rate
+WORKERS = 4
+
+# Objects per gp_history query: the first batch uses BATCH_SIZE, later ones are resized so a
+# response comes out near TARGET_BYTES, within [1, MAX_BATCH_SIZE]
+BATCH_SIZE = 20
+MAX_BATCH_SIZE = 200
+TARGET_BYTES = 20 * 2**20
+
+# Days of TLE history needed either side of each TCA
+PAD_DAYS = 14
+
+# TLEs can still be published for epochs this many days before a fetch, so the manifest only
+# records a fetched range as covered up to that long before it was fetched
+SETTLE_DAYS = 3
+
+MANIFEST_FILE = "manifest.json"
+
+
+def write_atomic(filename, text):
+    """Write `text` to a temporary file beside `filename` and rename it into place.
+
+    A crash mid-write leaves at most a stray .part file, never a truncated history.
+    """
+    tmp = filename + ".part"
+    with open(tmp, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def load_manifest(tle_dir):
+    """Return the download manifest of `tle_dir`: {satcat: {'covered': [[start, end], ...]}}."""
+    try:
+        with open(os.path.join(tle_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(tle_dir, manifest):
+    write_atomic(os.path.join(tle_dir, MANIFEST_FILE), json.dumps(manifest, indent=1, sort_keys=True))
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching [start, end) date intervals into a sorted, disjoint list."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, covered):
+    """Return the parts of sorted, disjoint `intervals` not inside sorted, disjoint `covered`."""
+    missing = []
+    for start, end in intervals:
+        for covered_start, covered_end in covered:
+            if covered_end <= start or covered_start >= end:
+                continue
+            if covered_start > start:
+                missing.append((start, covered_start))
+            start = max(start, covered_end)
+            if start >= end:
+                break
+        if start < end:
+            missing.append((start, end))
+    return missing
+
+
+def plan_windows(tcas, pad_days=PAD_DAYS, today=None):
+    """Merge the ±pad_days windows around each object's TCA dates: {satcat: [(start, end), ...]}.
+
+    Windows are [start, end) in whole days and stop at tomorrow, since no TLEs exist past now.
+    """
+    horizon = (today or datetime.date.today()) + datetime.timedelta(days=1)
+    pad = datetime.timedelta(days=pad_days)
+    windows = {}
+    for satcat, dates in tcas.items():
+        intervals = [(day - pad, min(day + pad + datetime.timedelta(days=1), horizon)) for day in set(dates)]
+        windows[satcat] = merge_intervals([(start, end) for start, end in intervals if start < end])
+    return windows
+
+
+def read_history(filename):
+    """Return the (line1, line2) pairs of a TLE history file, or [] if it does not exist."""
+    try:
+        with open(filename) as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+    return list(zip(lines[0::2], lines[1::2]))
+
+
+def covered_intervals(tle_dir, satcat, manifest):
+    """Date intervals already fetched for `satcat`.
+
+    Taken from the manifest when it has an entry; for history files written
+    before the manifest existed, the span of the epochs in the file is used.
+    """
+    entry = manifest.get(satcat)
+    if entry is not None:
+        covered = entry.get('covered', [entry['epoch']] if 'epoch' in entry else [])
+        return merge_intervals((datetime.date.fromisoformat(start), datetime.date.fromisoformat(end))
+                               for start, end in covered)
+    epochs = [tle_epoch(line1).date() for line1, _ in read_history(os.path.join(tle_dir, f"{satcat}.txt"))]
+    if not epochs:
+        return []
+    return [(min(epochs), max(epochs) + datetime.timedelta(days=1))]
+
+
+def plan_downloads(windows, tle_dir, manifest):
+    """Work out the epoch ranges still missing on disk: {(start, end): [satcat, ...]}.
+
+    Objects missing the same range are grouped so they can share batched queries;
+    after a daily CDM update most objects are missing the same last few days.
+    """
+    plan = {}
+    for satcat, intervals in windows.items():
+        for missing in subtract_intervals(intervals, covered_intervals(tle_dir, satcat, manifest)):
+            plan.setdefault(missing, []).append(satcat)
+    return plan
+
+
+def merge_history(filename, text):
+    """Add the TLEs in `text` to the history file, dropping duplicates and keeping epoch desc order."""
+    pairs = read_history(filename)
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    pairs += zip(lines[0::2], lines[1::2])
+    pairs = sorted(dict.fromkeys(pairs), key=lambda pair: tle_epoch(pair[0]), reverse=True)
+    write_atomic(filename, "".join(f"{line1}\n{line2}\n" for line1, line2 in pairs))
+
+
+def norad_key(satcat):
+    """Normalise a NORAD ID so '00005', ' 5' and 5 compare equal."""
+    satcat = str(satcat).strip()
+    return str(int(satcat)) if satcat.isdigit() else satcat
+
+
+def split_histories(text, satcats):
+    """Demultiplex a combined TLE response into {satcat: TLE text}, keeping each object's line order."""
+    keys = {norad_key(satcat): satcat for satcat in satcats}
+    lines = {satcat: [] for satcat in satcats}
+    text = [line for line in text.splitlines() if line.strip()]
+    for line1, line2 in zip(text[0::2], text[1::2]):
+        satcat = keys.get(norad_key(line1[2:7]))
+        if satcat is not None:
+            lines[satcat] += [line1, line2]
+    return {satcat: "".join(line + "\n" for line in object_lines) for satcat, object_lines in lines.items()}
+
+
+def fetch_histories(session, satcats, epoch_range):
+    """Download the gp_history TLEs of a batch of objects in one query, split per object."""
+    text = session.query('gp_history', fmt='tle', norad_cat_id=list(satcats), epoch=epoch_range,
+                         orderby='epoch desc')
+    return split_histories(text, satcats), len(text)
+
+
+class BatchSizer:
+    """Sizes the next batch from the bytes per object seen in the responses so far."""
+
+    def __init__(self, batch_size=BATCH_SIZE, max_batch_size=MAX_BATCH_SIZE, target_bytes=TARGET_BYTES):
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.target_bytes = target_bytes
+        self.objects = 0
+        self.bytes = 0
+
+    def update(self, objects, response_bytes):
+        self.objects += objects
+        self.bytes += response_bytes
+        per_object = max(self.bytes / self.objects, 1)
+        self.batch_size = int(min(self.max_batch_size, max(1, self.target_bytes // per_object)))
+
+
+def download_histories(session, plan, tle_dir, workers=WORKERS, batch_size=BATCH_SIZE, settle_days=SETTLE_DAYS):
+    """Fetch every missing epoch range in `plan` and merge it into <tle_dir>/<satcat>.txt.
+
+    `plan` maps (start, end) date ranges to the objects missing them (see
+    plan_downloads). Objects sharing a range are requested in batches of several
+    NORAD IDs per gp_history query, sized adaptively from earlier response sizes,
+    with `workers` queries in flight through the session's rate limiter. Each
+    merged range is recorded in the manifest, so an interrupted run resumes with
+    exactly the ranges that had not been written yet. Only the part older than
+    `settle_days` before the fetch is recorded; the recent tail stays missing and
+    is fetched again by later runs, which pick up TLEs published since.
+    """
+    os.makedirs(tle_dir, exist_ok=True)
+    manifest = load_manifest(tle_dir)
+    todo = [(epoch_range, satcat) for epoch_range, satcats in sorted(plan.items()) for satcat in satcats]
+    total = len(todo)
+    print(f"{total} object ranges to download for {len({satcat for _, satcat in todo})} objects")
+
+    sizer = BatchSizer(batch_size=batch_size)
+    # Several ranges of one object may be in flight at once; their merges into its file must not interleave
+    file_locks = {satcat: threading.Lock() for _, satcat in todo}
+
+    def next_batch():
+        epoch_range = todo[0][0]
+        size = 0
+        while size < min(sizer.batch_size, len(todo)) and todo[size][0] == epoch_range:
+            size += 1
+        batch = [satcat for _, satcat in todo[:size]]
+        del todo[:size]
+        return epoch_range, batch
+
+    def download(epoch_range, batch):
+        # Epochs up to `settled` were settled when the query was sent, so the response holds all their TLEs
+        settled = datetime.date.today() - datetime.timedelta(days=settle_days)
+        histories, response_bytes = fetch_histories(session, batch, epoch_range)
+        for satcat, text in histories.items():
+            with file_locks[satcat]:
+                merge_history(os.path.join(tle_dir, f"{satcat}.txt"), text)
+        return response_bytes, settled
+
+    failed = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        while todo or pending:
+            while todo and len(pending) < workers:
+                epoch_range, batch = next_batch()
+                pending[pool.submit(download, epoch_range, batch)] = (epoch_range, batch)
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                epoch_range, batch = pending.pop(future)
+                try:
+                    response_bytes, settled = future.result()
+                    sizer.update(len(batch), response_bytes)
+                except Exception as e:
+                    print(f"Failed {', '.join(batch)} over {epoch_range[0]}--{epoch_range[1]}: {e}")
+                    failed += batch
+                    continue
+                start, end = epoch_range[0], min(epoch_range[1], settled)
+                for satcat in batch:
+                    covered = covered_intervals(tle_dir, satcat, manifest) + ([(start, end)] if start < end else [])
+                    manifest[satcat] = {'covered': [[str(start), str(end)] for start, end in merge_intervals(covered)]}
+                save_manifest(tle_dir, manifest)
+                done += len(batch)
+                print(f"Merged {len(batch)} histories ({done}/{total})")
+    if failed:
+        print(f"{len(failed)} downloads failed; rerun to retry them: {', '.join(failed)}")
+    return failed
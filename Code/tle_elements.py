@@ -0,0 +1,273 @@
+import os
+import numpy as np
+from tle_archive import LINE_DTYPE, current_archive
+
+LINE_WIDTH = 69
+
+# Bytes of TLE text decoded per pass when reading a file
+CHUNK_BYTES = 64 << 20
+
+# Archived TLE pairs decoded per pass in archive_elements
+CHUNK_ROWS = 1000000
+
+# Rows per block when transposing character matrices; a block of them fits in the CPU cache
+TRANSPOSE_ROWS = 2048
+
+# WGS-72, the constants SGP4 mean elements are defined with (as Space-Track derives APOGEE/PERIGEE)
+MU = 398600.8  # Earth's gravitational parameter in km^3 s^-2
+RE = 6378.135  # Equatorial radius in km
+
+# One record per TLE; angles in degrees, mean motion in rev/day, derived values in km
+ELEMENT_DTYPE = np.dtype([
+    ('satcat', 'i4'),
+    ('classification', 'S1'),
+    ('designator', 'S8'),
+    ('epoch', 'datetime64[us]'),
+    ('mean_motion_dot', 'f8'),
+    ('mean_motion_ddot', 'f8'),
+    ('bstar', 'f8'),
+    ('element_set', 'i4'),
+    ('inclination', 'f8'),
+    ('raan', 'f8'),
+    ('eccentricity', 'f8'),
+    ('argp', 'f8'),
+    ('mean_anomaly', 'f8'),
+    ('mean_motion', 'f8'),
+    ('rev_number', 'i4'),
+    ('semi_major_axis', 'f8'),
+    ('perigee', 'f8'),
+    ('apogee', 'f8'),
+    ('checksum_ok', '?'),
+])
+
+# Alpha-5 catalog numbers: A-Z, skipping I and O, stand for 10-33 in the first digit
+ALPHA5 = np.zeros(256, dtype=np.int64)
+ALPHA5[np.frombuffer(b'0123456789', np.uint8)] = np.arange(10)
+ALPHA5[np.frombuffer(b'ABCDEFGHJKLMNPQRSTUVWXYZ', np.uint8)] = np.arange(10, 34)
+
+
+def split_lines(data):
+    """Pair up the TLE lines in a bytes buffer as an (n, 2) LINE_DTYPE array, in file order.
+
+    Lines are right-stripped as read_tle_file does, and blank lines skipped;
+    only a line starting with '1' followed by one starting with '2' makes a
+    pair, so title lines of three-line element sets are dropped too.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(buf) and buf[-1] != ord('\n'):
+        ends = np.append(ends, len(buf))
+    if len(ends) == 0:
+        # An empty history file, as tle_downloader writes for objects without TLEs
+        return np.zeros((0, 2), dtype=LINE_DTYPE)
+    starts = np.concatenate([[0], ends[:-1] + 1]).astype(np.int64)
+    padded = np.concatenate([buf, np.zeros(LINE_WIDTH, dtype=np.uint8)])
+
+    first = padded[starts]
+    kept = (first == ord('1')) | (first == ord('2'))
+    starts, ends, first = starts[kept], ends[kept], first[kept]
+    line1 = np.flatnonzero((first[:-1] == ord('1')) & (first[1:] == ord('2')))
+    rows = np.stack([line1, line1 + 1], axis=1).ravel()
+
+    # One row copy per line, then everything past the line's stripped end zeroed as in an S69 array
+    chars = np.lib.stride_tricks.sliding_window_view(padded, LINE_WIDTH)[starts[rows]]
+    columns = np.arange(LINE_WIDTH)
+    chars[columns >= (ends - starts)[rows, None]] = 0
+    text = chars > ord(' ')
+    length = LINE_WIDTH - np.argmax(text[:, ::-1], axis=1)
+    chars[columns >= length[:, None]] = 0
+    return chars.view(LINE_DTYPE).reshape(len(line1), 2)
+
+
+def _digits(columns):
+    """Unsigned integer of the digits in a fixed-width field, and how many of them follow a '.'.
+
+    Fields are (width, n) arrays, one row per character position.
+    """
+    value = np.zeros(columns.shape[1], dtype=np.int64)
+    decimals = np.zeros(columns.shape[1], dtype=np.int64)
+    seen_point = np.zeros(columns.shape[1], dtype=bool)
+    for column in columns:
+        digit = column - np.uint8(ord('0'))
+        is_digit = digit < 10
+        seen_point |= column == ord('.')
+        value *= np.where(is_digit, 10, 1)
+        value += np.where(is_digit, digit, 0)
+        decimals += is_digit & seen_point
+    return value, decimals
+
+
+def _negative(columns):
+    return (columns == ord('-')).any(axis=0)
+
+
+def _integer(columns):
+    value, _ = _digits(columns)
+    return np.where(_negative(columns), -value, value)
+
+
+def _decimal(columns):
+    """A field like ' -.00002182' or '15.48919103', exactly as float() would read it."""
+    value, decimals = _digits(columns)
+    value = value / 10.0 ** decimals
+    return np.where(_negative(columns), -value, value)
+
+
+def _exponential(columns):
+    """A field with an assumed leading decimal point and exponent, like ' 12345-3' for 0.12345e-3."""
+    mantissa, _ = _digits(columns[:-2])
+    exponent = (columns[-1] - np.uint8(ord('0'))).astype(np.int64)
+    exponent = np.where(exponent < 10, exponent, 0)
+    exponent = np.where(columns[-2] == ord('-'), -exponent, exponent)
+    shift = 5 - exponent
+    value = np.where(shift >= 0, mantissa / 10.0 ** np.maximum(shift, 0), mantissa * 10.0 ** np.maximum(-shift, 0))
+    return np.where(columns[0] == ord('-'), -value, value)
+
+
+def _satcat(columns):
+    return ALPHA5[columns[0]] * 10000 + _integer(columns[1:])
+
+
+def _epochs(columns):
+    """YYDDD.DDDDDDDD epochs (line 1 columns 19-32) as datetime64[us], rounded to the microsecond."""
+    year = _integer(columns[0:2])
+    year = np.where(year < 57, 2000 + year, 1900 + year)
+    value, decimals = _digits(columns[2:])
+    scale = 10 ** decimals
+    # Whole days and the fraction kept apart so the microseconds come out exact in int64
+    whole, fraction = np.divmod(value, scale)
+    micros = (whole - 1) * 86400000000 + (fraction * 86400000000 + scale // 2) // scale
+    start = (year - 1970).astype('datetime64[Y]').astype('datetime64[us]')
+    return start + micros.astype('timedelta64[us]')
+
+
+def _checksum_ok(columns):
+    # Modulo-10 sum of the digits, with each '-' counting as 1, against the last column
+    total = np.zeros(columns.shape[1], dtype=np.int64)
+    for column in columns[:LINE_WIDTH - 1]:
+        digit = column - np.uint8(ord('0'))
+        total += np.where(digit < 10, digit, column == ord('-'))
+    return total % 10 == columns[LINE_WIDTH - 1] - np.uint8(ord('0'))
+
+
+def _transpose(chars):
+    """Copy an (n, width) character matrix to (width, n), a block of rows at a time to stay in cache."""
+    columns = np.empty(chars.shape[::-1], dtype=np.uint8)
+    for start in range(0, len(chars), TRANSPOSE_ROWS):
+        columns[:, start:start + TRANSPOSE_ROWS] = chars[start:start + TRANSPOSE_ROWS].T
+    return columns
+
+
+def line_columns(lines):
+    """The (2, 69, n) character matrix of an (n, 2) LINE_DTYPE array: one contiguous row per character position."""
+    lines = np.asarray(lines, dtype=LINE_DTYPE)
+    return _transpose(lines.view(np.uint8).reshape(len(lines), 2 * LINE_WIDTH)).reshape(2, LINE_WIDTH, len(lines))
+
+
+def tle_epochs(lines):
+    """Epochs of an (n, 2) LINE_DTYPE array of TLEs as datetime64[us]."""
+    lines = np.asarray(lines, dtype=LINE_DTYPE)
+    return _epochs(_transpose(lines.view(np.uint8).reshape(len(lines), 2 * LINE_WIDTH)[:, 18:32]))
+
+
+def parse_lines(lines):
+    """Decode every field of an (n, 2) LINE_DTYPE array of TLEs into an ELEMENT_DTYPE array.
+
+    Each fixed-width field is decoded for all TLEs at once, one character
+    position at a time, so the cost is a few hundred array operations however
+    many TLEs there are.
+    """
+    line1, line2 = line_columns(lines)
+    elements = np.zeros(len(lines), dtype=ELEMENT_DTYPE)
+    elements['satcat'] = _satcat(line1[2:7])
+    elements['classification'] = line1[7].view('S1')
+    designator = np.where(line1[9:17] == ord(' '), 0, line1[9:17]).astype(np.uint8)
+    elements['designator'] = np.ascontiguousarray(designator.T).view('S8').ravel()
+    elements['epoch'] = _epochs(line1[18:32])
+    elements['mean_motion_dot'] = _decimal(line1[33:43])
+    elements['mean_motion_ddot'] = _exponential(line1[44:52])
+    elements['bstar'] = _exponential(line1[53:61])
+    elements['element_set'] = _integer(line1[64:68])
+    elements['inclination'] = _decimal(line2[8:16])
+    elements['raan'] = _decimal(line2[17:25])
+    elements['eccentricity'] = _digits(line2[26:33])[0] / 1e7
+    elements['argp'] = _decimal(line2[34:42])
+    elements['mean_anomaly'] = _decimal(line2[43:51])
+    elements['mean_motion'] = _decimal(line2[52:63])
+    elements['rev_number'] = _integer(line2[63:68])
+    elements['checksum_ok'] = _checksum_ok(line1) & _checksum_ok(line2)
+
+    with np.errstate(divide='ignore'):
+        n = elements['mean_motion'] * 2 * np.pi / 86400  # rad/s
+        a = np.cbrt(MU / n ** 2)
+    elements['semi_major_axis'] = a
+    elements['perigee'] = a * (1 - elements['eccentricity']) - RE
+    elements['apogee'] = a * (1 + elements['eccentricity']) - RE
+    return elements
+
+
+def iter_elements(filename, chunk_bytes=CHUNK_BYTES):
+    """Yield ELEMENT_DTYPE arrays for a TLE text file, decoded chunk_bytes of text at a time."""
+    with open(filename, 'rb') as f:
+        rest = b''
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            block = rest + block
+            # Carry the partial last line, and a line 1 whose line 2 may be in the next block
+            cut = block.rfind(b'\n') + 1
+            cut = block.rfind(b'\n1', 0, cut - 1) + 1 if cut > 0 else 0
+            if cut <= 0:
+                rest = block
+                continue
+            rest = block[cut:]
+            yield parse_lines(split_lines(block[:cut]))
+        if rest:
+            yield parse_lines(split_lines(rest))
+
+
+def read_elements(filename, chunk_bytes=CHUNK_BYTES):
+    """Decode every TLE of a text file (a <satcat>.txt history or a whole gp_history dump) into an ELEMENT_DTYPE array."""
+    chunks = list(iter_elements(filename, chunk_bytes))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=ELEMENT_DTYPE)
+
+
+def archive_elements(tle_dir, chunk_rows=CHUNK_ROWS):
+    """Decode every TLE in the archive of `tle_dir` into an ELEMENT_DTYPE array, in archive order.
+
+    The memory-mapped lines are decoded chunk_rows at a time, so only the
+    result has to fit in memory. An archive older than the text files is brought up to
+    date first. Returns None if the archive has not been built.
+    """
+    archive = current_archive(tle_dir)
+    if archive is None:
+        return None
+    elements = np.zeros(len(archive.lines), dtype=ELEMENT_DTYPE)
+    for start in range(0, len(elements), chunk_rows):
+        elements[start:start + chunk_rows] = parse_lines(archive.lines[start:start + chunk_rows])
+    return elements
+
+
+if __name__ == "__main__":
+    import argparse
+    import pandas as pd
+    from tle_index import TLE_DIR
+
+    parser = argparse.ArgumentParser(description="Decode TLEs into a table of orbital elements.")
+    parser.add_argument("source", nargs="?", default=TLE_DIR,
+                        help="a TLE text file, or a TLE directory whose archive is decoded (default: %(default)s)")
+    parser.add_argument("--output", default="../Data/tle_elements.parquet", help="Parquet or CSV file to write")
+    args = parser.parse_args()
+
+    elements = read_elements(args.source) if os.path.isfile(args.source) else archive_elements(args.source)
+    if elements is None:
+        raise SystemExit(f"No TLE archive in {args.source}; build it with tle_archive.py first")
+    frame = pd.DataFrame(elements)
+    for name in ('classification', 'designator'):
+        frame[name] = frame[name].str.decode('ascii')
+    if args.output.endswith(".csv"):
+        frame.to_csv(args.output, index=False)
+    else:
+        frame.to_parquet(args.output, index=False)
+    print(f"Decoded {len(frame)} TLEs ({(~frame['checksum_ok']).sum()} with bad checksums) to {args.output}")
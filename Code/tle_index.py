@@ -0,0 +1,131 @@
+import os
+import datetime
+from functools import lru_cache
+import numpy as np
+from tle_archive import INDEX_FILE, archive_dir_for, file_stamp, open_archive
+from tle_elements import split_lines, tle_epochs
+
+# Default location of the per-satellite TLE histories written by downloadTLEs.py
+TLE_DIR = "../Data/TLEs"
+
+# Maximum number of per-satellite indexes kept in memory at once
+CACHE_SIZE = 512
+
+
+def tle_epoch(line1):
+    """Parse the epoch of a TLE from its first line as a naive UTC datetime."""
+    year = int(line1[18:20])
+    year = 2000 + year if year < 57 else 1900 + year
+    day_of_year = float(line1[20:32])
+    return datetime.datetime(year, 1, 1) + datetime.timedelta(days=day_of_year - 1)
+
+
+def read_tle_file(filename):
+    """Read a TLE text file into (epochs, lines) arrays sorted by epoch.
+
+    Duplicate epochs keep the order they appear in the file.
+    """
+    with open(filename, 'rb') as tle_file:
+        lines = split_lines(tle_file.read())
+    epochs = tle_epochs(lines)
+    order = np.argsort(epochs, kind='stable')
+    return epochs[order], lines[order]
+
+
+class TLEIndex:
+    """Sorted epoch index over the TLE history of a single satellite.
+
+    Built once per satellite and queried with a binary search, so looking up
+    the TLE for a TCA costs O(log n) instead of a re-read of the whole file.
+    `epochs` and `lines` may be memory-mapped views into a TLE archive.
+    """
+
+    def __init__(self, epochs, lines):
+        self.epochs = epochs
+        self.lines = lines
+
+    @classmethod
+    def from_file(cls, filename):
+        """Build the index from a text file of TLE line pairs."""
+        return cls(*read_tle_file(filename))
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def pair(self, i):
+        """Return TLE `i` as a (line1, line2) pair of strings."""
+        line1, line2 = self.lines[i]
+        return line1.decode(), line2.decode()
+
+    def bracket_indices(self, times):
+        """Indexes of the TLEs at or before and after each time, -1 past either end.
+
+        An exact epoch match is returned on both sides, and duplicate epochs
+        resolve to the first copy read from the file.
+        """
+        t = np.asarray(times, dtype='datetime64[us]')
+        after = np.searchsorted(self.epochs, t, side='left')
+        before = np.searchsorted(self.epochs, self.epochs[np.maximum(after - 1, 0)], side='left')
+        before = np.where(after > 0, before, -1)
+        exact = after < len(self.epochs)
+        exact[exact] = self.epochs[after[exact]] == t[exact]
+        before = np.where(exact, after, before)
+        after = np.where(after < len(self.epochs), after, -1)
+        return before, after
+
+    def nearest_indices(self, times):
+        """Index of the TLE whose epoch is closest to each time (later epoch wins ties)."""
+        t = np.asarray(times, dtype='datetime64[us]')
+        before, after = self.bracket_indices(t)
+        use_before = (after < 0) | ((before >= 0) & (t - self.epochs[before] < self.epochs[after] - t))
+        return np.where(use_before, before, after)
+
+    def nearest(self, t):
+        """Return the (line1, line2) pair closest to `t`, or (None, None) if there are no TLEs."""
+        if len(self) == 0:
+            return None, None
+        return self.pair(self.nearest_indices([t])[0])
+
+    def bracket(self, t):
+        """Return the TLE pairs bracketing `t` as (before, after); either may be None."""
+        if len(self) == 0:
+            return None, None
+        before, after = self.bracket_indices([t])
+        return (self.pair(before[0]) if before[0] >= 0 else None,
+                self.pair(after[0]) if after[0] >= 0 else None)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _load_tle_index(satcat, tle_dir, stamp, archive_stamp):
+    # The stamps of the text file and the archive are part of the key, so changed data is reloaded
+    filename = f'{tle_dir}/{satcat}.txt'
+    archive = open_archive(archive_dir_for(tle_dir))
+    if archive is not None:
+        found = archive.lookup(satcat, filename)
+        if found is not None:
+            return TLEIndex(*found)
+    try:
+        return TLEIndex.from_file(filename)
+    except FileNotFoundError:
+        return None
+
+
+def get_tle_index(satcat, tle_dir=TLE_DIR):
+    """Return the cached TLEIndex for `satcat`, or None if it has no TLE history on disk.
+
+    Satellites in the TLE archive are served from it without reading their
+    text file, unless the file changed after the archive was built (say, the
+    downloader merged new TLEs into it); then, or when the satellite is not
+    archived, <satcat>.txt is read. A cached index is dropped when either changes.
+    """
+    stamp = file_stamp(f'{tle_dir}/{satcat}.txt')
+    archive_stamp = file_stamp(os.path.join(archive_dir_for(tle_dir), INDEX_FILE))
+    return _load_tle_index(satcat, tle_dir, stamp, archive_stamp)
+
+
+def get_closest_tle(satcat, tca, tle_dir=TLE_DIR):
+    """Get the TLE lines closest to the TCA for a given satellite."""
+    index = get_tle_index(satcat, tle_dir)
+    if index is None:
+        return None, None
+    return index.nearest(tca)
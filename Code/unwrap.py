@@ -0,0 +1,30 @@
+import numpy as np
+
+
+def unwrap_degrees(angles, period=360.0, carry=None):
+    """Remove the wraps from a series of angles so it changes continuously.
+
+    Every step larger than half a period is taken as a wrap and the cumulative
+    correction is carried forward, so a longitude drifting through several
+    revolutions keeps counting past ±180°. Returns (unwrapped, carry); pass
+    `carry` into the next call to unwrap a long series chunk by chunk.
+    """
+    angles = np.asarray(angles, dtype=float)
+    last, offset = carry if carry is not None else (angles[0] if len(angles) else 0.0, 0.0)
+    if len(angles) == 0:
+        return angles.copy(), (last, offset)
+    steps = np.diff(angles, prepend=last)
+    unwrapped = angles + (offset - period * np.cumsum(np.round(steps / period)))
+    return unwrapped, (angles[-1], unwrapped[-1] - angles[-1])
+
+
+class Unwrapper:
+    """Streaming unwrap_degrees: call it on consecutive chunks of one series."""
+
+    def __init__(self, period=360.0):
+        self.period = period
+        self.carry = None
+
+    def __call__(self, angles):
+        unwrapped, self.carry = unwrap_degrees(angles, self.period, self.carry)
+        return unwrapped